@@ -0,0 +1,286 @@
+"""Set-based batch operations behind the admin /bulk endpoints.
+
+Each operation validates its whole batch first. It then applies the valid
+items with a few UPDATE/DELETE/INSERT statements, never one statement per
+item, and returns one result per input item in input order. Nothing is
+committed here: the route commits once, so a batch is one transaction.
+These Core statements bypass the session's change tracking, so every
+operation marks the cache namespaces it touches as stale itself.
+"""
+from sqlalchemy import bindparam
+
+from cache import mark_stale, MODEL_NAMESPACES
+from company_regions import REGION_MODES, check_region_ids, set_company_regions
+from extensions import db
+from geo import GEO_FIELDS, parse_location
+from models import Company, Region, ServiceRequest, company_region
+
+# Editable company columns and their maximum lengths (None: unbounded text)
+COMPANY_FIELDS = {'name': 100, 'email': 120, 'phone': 20, 'description': None}
+
+
+class BulkError(ValueError):
+    """Raised when a bulk payload is malformed as a whole rather than per item."""
+
+
+# -----------------------------------
+# Payload parsing and results
+# -----------------------------------
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_ids(value, max_items, name='ids'):
+    """Return the distinct ids of ``value`` in first-seen order."""
+    if not isinstance(value, list) or not 0 < len(value) <= max_items or not all(map(_is_int, value)):
+        raise BulkError(f'{name} must be a list of 1 to {max_items} integers')
+    return list(dict.fromkeys(value))
+
+
+def parse_items(value, max_items, name='items'):
+    if not isinstance(value, list) or not 0 < len(value) <= max_items:
+        raise BulkError(f'{name} must be a list of 1 to {max_items} entries')
+    return value
+
+
+def _result(key, value, message=None, **extra):
+    result = {key: value, 'ok': message is None, **extra}
+    if message is not None:
+        result['message'] = message
+    return result
+
+
+def summarize(results):
+    succeeded = sum(1 for result in results if result['ok'])
+    return {'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded}
+
+
+def _existing_ids(column, ids):
+    return {row_id for row_id, in db.session.query(column).filter(column.in_(ids))} if ids else set()
+
+
+def _text_field(data, name, max_length):
+    """Return (value, error message) for a required, non-blank string field."""
+    value = data.get(name)
+    if not isinstance(value, str) or not value.strip():
+        return None, f'{name} must be a non-empty string'
+    value = value.strip()
+    if max_length is not None and len(value) > max_length:
+        return None, f'{name} must be at most {max_length} characters'
+    return value, None
+
+
+def _executemany_update(table, rows):
+    """UPDATE ``table`` by id from dicts that share one set of keys."""
+    columns = sorted(key for key in rows[0] if key != 'id')
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam('row_id'))
+        .values({column: bindparam('new_' + column) for column in columns}),
+        [{'row_id': row['id'], **{'new_' + column: row[column] for column in columns}} for row in rows]
+    )
+
+
+def _apply_updates(table, rows):
+    # One executemany per distinct set of patched columns
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for group in groups.values():
+        _executemany_update(table, group)
+
+
+# -----------------------------------
+# Companies
+# -----------------------------------
+def approve_companies(data, max_items):
+    """{"ids": [...], "approved": true|false}; approved defaults to true."""
+    ids = parse_ids(data.get('ids'), max_items)
+    approved = data.get('approved', True)
+    if not isinstance(approved, bool):
+        raise BulkError('approved must be true or false')
+
+    found = _existing_ids(Company.id, ids)
+    if found:
+        Company.query.filter(Company.id.in_(sorted(found))).update({'approved': approved}, synchronize_session=False)
+        mark_stale(db.session, *MODEL_NAMESPACES['Company'])
+    return [_result('id', i) if i in found else _result('id', i, 'Company not found') for i in ids]
+
+
+def _company_patch(item, seen):
+    if not isinstance(item, dict):
+        return None, 'Expected a JSON object'
+    company_id = item.get('id')
+    if not _is_int(company_id):
+        return None, 'id must be an integer'
+    if company_id in seen:
+        return None, 'Duplicate id'
+    unknown = set(item) - set(COMPANY_FIELDS) - set(GEO_FIELDS) - {'id', 'approved'}
+    if unknown:
+        return None, f"Unknown field(s): {', '.join(sorted(unknown))}"
+    if len(item) == 1:
+        return None, 'Nothing to update'
+
+    patch = {'id': company_id}
+    for name, max_length in COMPANY_FIELDS.items():
+        if name in item:
+            patch[name], error = _text_field(item, name, max_length)
+            if error:
+                return None, error
+    if 'approved' in item:
+        if not isinstance(item['approved'], bool):
+            return None, 'approved must be true or false'
+        patch['approved'] = item['approved']
+    location, error = parse_location(item)
+    if error:
+        return None, error
+    patch.update(location)
+    return patch, None
+
+
+def update_companies(data, max_items):
+    """{"items": [{"id": 1, "name": ..., "approved": ..., "latitude": ...}, ...]}; each item is a partial patch."""
+    items = parse_items(data.get('items'), max_items)
+    patches, errors, seen = {}, {}, set()
+    for index, item in enumerate(items):
+        patch, error = _company_patch(item, seen)
+        if error:
+            errors[index] = error
+        else:
+            patches[index] = patch
+            seen.add(patch['id'])
+
+    found = _existing_ids(Company.id, list(seen))
+    valid = [patch for patch in patches.values() if patch['id'] in found]
+    if valid:
+        _apply_updates(Company.__table__, valid)
+        mark_stale(db.session, *MODEL_NAMESPACES['Company'])
+
+    results = []
+    for index, item in enumerate(items):
+        item_id = item.get('id') if isinstance(item, dict) else None
+        if index in errors:
+            results.append(_result('id', item_id, errors[index], index=index))
+        elif item_id not in found:
+            results.append(_result('id', item_id, 'Company not found', index=index))
+        else:
+            results.append(_result('id', item_id, index=index))
+    return results
+
+
+def delete_companies(data, max_items):
+    """{"ids": [...]}; also removes their region links and service requests."""
+    ids = parse_ids(data.get('ids'), max_items)
+    found = _existing_ids(Company.id, ids)
+    if found:
+        # The same rows the ORM cascade removes for a single DELETE /companies/<id>
+        ServiceRequest.query.filter(ServiceRequest.company_id.in_(sorted(found))).delete(synchronize_session=False)
+        db.session.execute(company_region.delete().where(company_region.c.company_id.in_(sorted(found))))
+        Company.query.filter(Company.id.in_(sorted(found))).delete(synchronize_session=False)
+        mark_stale(db.session, *MODEL_NAMESPACES['Company'])
+    return [_result('id', i) if i in found else _result('id', i, 'Company not found') for i in ids]
+
+
+def assign_company_regions(data, max_items):
+    """{"ids": [...], "region_ids": [...], "mode": "replace"|"add"|"remove"}."""
+    ids = parse_ids(data.get('ids'), max_items)
+    # An empty list is allowed: with mode=replace it clears every link
+    region_ids = data.get('region_ids')
+    region_ids = [] if region_ids == [] else parse_ids(region_ids, max_items, 'region_ids')
+    mode = data.get('mode', 'replace')
+    if mode not in REGION_MODES:
+        raise BulkError(f"mode must be one of: {', '.join(REGION_MODES)}")
+    # Raises UnknownRegions, reported like the single company routes do
+    check_region_ids(region_ids)
+
+    found = _existing_ids(Company.id, ids)
+    set_company_regions({company_id: region_ids for company_id in found}, mode)
+    return [_result('id', i) if i in found else _result('id', i, 'Company not found') for i in ids]
+
+
+# -----------------------------------
+# Regions
+# -----------------------------------
+def create_regions(data, max_items):
+    """{"names": [...]}; existing and repeated names are reported, not created."""
+    names = parse_items(data.get('names'), max_items, 'names')
+    cleaned, errors = {}, {}
+    for index, name in enumerate(names):
+        value, error = _text_field({'name': name}, 'name', 100)
+        if error:
+            errors[index] = error
+        elif value in cleaned.values():
+            errors[index] = 'Duplicate name'
+        else:
+            cleaned[index] = value
+
+    taken = {name for name, in db.session.query(Region.name).filter(Region.name.in_(list(cleaned.values())))}
+    new = [name for name in cleaned.values() if name not in taken]
+    if new:
+        db.session.execute(Region.__table__.insert(), [{'name': name} for name in new])
+        mark_stale(db.session, *MODEL_NAMESPACES['Region'])
+    ids = dict(db.session.query(Region.name, Region.id).filter(Region.name.in_(new))) if new else {}
+
+    results = []
+    for index, name in enumerate(names):
+        if index in errors:
+            results.append(_result('name', name, errors[index], index=index))
+        elif cleaned[index] in taken:
+            results.append(_result('name', cleaned[index], 'Region already exists', index=index))
+        else:
+            results.append(_result('name', cleaned[index], index=index, id=ids[cleaned[index]]))
+    return results
+
+
+def rename_regions(data, max_items):
+    """{"items": [{"id": 1, "name": "..."}, ...]}."""
+    items = parse_items(data.get('items'), max_items)
+    renames, errors, seen_ids, seen_names = {}, {}, set(), set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not _is_int(item.get('id')):
+            errors[index] = 'id must be an integer'
+            continue
+        name, error = _text_field(item, 'name', 100)
+        if error:
+            errors[index] = error
+        elif item['id'] in seen_ids:
+            errors[index] = 'Duplicate id'
+        elif name in seen_names:
+            errors[index] = 'Duplicate name'
+        else:
+            renames[index] = {'id': item['id'], 'name': name}
+            seen_ids.add(item['id'])
+            seen_names.add(name)
+
+    found = _existing_ids(Region.id, list(seen_ids))
+    # A name held by any other region is rejected, even one renamed in this batch
+    owners = {}
+    if seen_names:
+        owners = dict(db.session.query(Region.name, Region.id).filter(Region.name.in_(list(seen_names))))
+    for index, rename in renames.items():
+        if rename['id'] not in found:
+            errors[index] = 'Region not found'
+        elif owners.get(rename['name'], rename['id']) != rename['id']:
+            errors[index] = 'Region already exists'
+    valid = [rename for index, rename in renames.items() if index not in errors]
+    if valid:
+        _apply_updates(Region.__table__, valid)
+        mark_stale(db.session, *MODEL_NAMESPACES['Region'])
+
+    return [
+        _result('id', item.get('id') if isinstance(item, dict) else None, errors.get(index), index=index)
+        for index, item in enumerate(items)
+    ]
+
+
+def delete_regions(data, max_items):
+    """{"ids": [...]}; companies lose the link and service requests keep no region."""
+    ids = parse_ids(data.get('ids'), max_items)
+    found = _existing_ids(Region.id, ids)
+    if found:
+        db.session.execute(company_region.delete().where(company_region.c.region_id.in_(sorted(found))))
+        ServiceRequest.query.filter(ServiceRequest.region_id.in_(sorted(found))).update(
+            {'region_id': None}, synchronize_session=False)
+        Region.query.filter(Region.id.in_(sorted(found))).delete(synchronize_session=False)
+        mark_stale(db.session, *MODEL_NAMESPACES['Region'])
+    return [_result('id', i) if i in found else _result('id', i, 'Region not found') for i in ids]
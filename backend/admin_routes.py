@@ -1,8 +1,25 @@
-from flask import Blueprint, request, jsonify
-from models import Company, Region, User
-from helpers import token_required, admin_required, format_company, format_region
+import heapq
+
+from flask import Blueprint, request, jsonify, current_app
+from models import Company, Region, User, ServiceRequest, ServiceRequestArchive
+from helpers import token_required, admin_required, format_company, format_companies, company_rows, format_region
 from extensions import db
+from pagination import is_paginated_request, paginate_companies, filter_companies, PaginationError
 from flask_login import login_user
+from principal_cache import principal_cache
+from stats import dashboard_stats
+from admin_bulk import (
+    BulkError, summarize, approve_companies, update_companies, delete_companies,
+    assign_company_regions, create_regions, rename_regions, delete_regions,
+)
+from geo import parse_location
+from company_regions import UnknownRegions, parse_region_ids, check_region_ids, set_company_regions
+from archive import archive_needed
+from exports import (
+    ExportError, EXPORT_CHUNK_SIZE, parse_format, parse_date_range, wants_gzip, export_response,
+    company_records, region_records, service_request_records,
+    COMPANY_EXPORT_COLUMNS, REGION_EXPORT_COLUMNS, SERVICE_REQUEST_EXPORT_COLUMNS,
+)
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -26,7 +43,10 @@ def add_region(current_user):
         return jsonify({'message': 'Region name is required'}), 400
     if Region.query.filter_by(name=data['name']).first():
         return jsonify({'message': 'Region already exists'}), 400
-    region = Region(name=data['name'])
+    location, error = parse_location(data, with_radius=False)
+    if error:
+        return jsonify({'message': error}), 400
+    region = Region(name=data['name'], **location)
     db.session.add(region)
     db.session.commit()
     return jsonify(format_region(region)), 201
@@ -39,8 +59,13 @@ def update_region(current_user, region_id):
     if not region:
         return jsonify({'message': 'Region not found'}), 404
     data = request.get_json()
+    location, error = parse_location(data, with_radius=False)
+    if error:
+        return jsonify({'message': error}), 400
     if 'name' in data:
         region.name = data['name']
+    for name, value in location.items():
+        setattr(region, name, value)
     db.session.commit()
     return jsonify(format_region(region))
 
@@ -63,8 +88,17 @@ def delete_region(current_user, region_id):
 @token_required
 @admin_required
 def get_all_companies(current_user):
-    companies = Company.query.all()
-    return jsonify([format_company(company) for company in companies])
+    if is_paginated_request(request.args):
+        try:
+            rows, next_cursor = paginate_companies(company_rows(Company.query), request.args)
+        except PaginationError as e:
+            return jsonify({'message': str(e)}), 400
+        return jsonify({
+            'items': format_companies(rows),
+            'nextCursor': next_cursor
+        })
+
+    return jsonify(format_companies(company_rows(Company.query).order_by(Company.id)))
 
 @admin_bp.route('/companies/<int:company_id>', methods=['PUT'])
 @token_required
@@ -74,11 +108,27 @@ def update_company(current_user, company_id):
     if not company:
         return jsonify({'message': 'Company not found'}), 404
     data = request.get_json()
+    region_ids = data.get('region_ids')
+    if region_ids is not None:
+        try:
+            region_ids = parse_region_ids(region_ids)
+            check_region_ids(region_ids)
+        except UnknownRegions as e:
+            return jsonify({'message': str(e), 'unknownRegionIds': e.ids}), 400
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+    location, error = parse_location(data)
+    if error:
+        return jsonify({'message': error}), 400
     company.name = data.get('name', company.name)
     company.email = data.get('email', company.email)
     company.phone = data.get('phone', company.phone)
-    company.region_id = data.get('region_id', company.region_id)
     company.approved = data.get('approved', company.approved)
+    for name, value in location.items():
+        setattr(company, name, value)
+    if region_ids is not None:
+        set_company_regions({company.id: region_ids})
+        db.session.expire(company, ['regions'])
     db.session.commit()
     return jsonify(format_company(company))
 
@@ -97,23 +147,17 @@ def delete_company(current_user, company_id):
 @token_required
 @admin_required
 def admin_stats(current_user):
-    total_companies = Company.query.count()
-    total_regions = Region.query.count()
-    
-    # Group companies by region
-    companies_by_region = db.session.query(
-        Region.name, db.func.count(Company.id)
-    ).join(Company, Company.region_id == Region.id).group_by(Region.name).all()
+    # Reads the trigger-maintained summary tables; see stats.py
+    trend = request.args.get('trend', 'day')
+    if trend not in ('day', 'week'):
+        return jsonify({'message': 'trend must be day or week'}), 400
+    try:
+        periods = int(request.args.get('periods', 30))
+    except ValueError:
+        return jsonify({'message': 'periods must be an integer'}), 400
+    periods = max(1, min(periods, 366))
 
-    companies_per_region = [
-        {"regionName": name, "count": count} for name, count in companies_by_region
-    ]
-
-    return jsonify({
-        "totalCompanies": total_companies,
-        "totalRegions": total_regions,
-        "companiesPerRegion": companies_per_region
-    })
+    return jsonify(dashboard_stats(trend, periods))
 
 
 @admin_bp.route('/companies/<int:company_id>/approve', methods=['POST'])
@@ -126,3 +170,156 @@ def approve_company(current_user, company_id):
     company.approved = True
     db.session.commit()
     return jsonify({'message': f'Company {company.name} approved'}), 200
+
+
+# ---------------------------
+# 📦 BULK OPERATIONS
+# ---------------------------
+# Up to ADMIN_BULK_MAX_ITEMS ids or items per call, applied in one transaction
+# with set-based statements. Responds {"results": [...], "succeeded", "failed"},
+# one result per input item; a malformed payload as a whole is a 400.
+
+def _bulk_response(operation):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'message': 'Expected a JSON object'}), 400
+    try:
+        results = operation(data, current_app.config['ADMIN_BULK_MAX_ITEMS'])
+    except UnknownRegions as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), 'unknownRegionIds': e.ids}), 400
+    except BulkError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    db.session.commit()
+    return jsonify(summarize(results)), 200
+
+@admin_bp.route('/companies/bulk/approve', methods=['POST'])
+@token_required
+@admin_required
+def bulk_approve_companies(current_user):
+    return _bulk_response(approve_companies)
+
+@admin_bp.route('/companies/bulk', methods=['PATCH'])
+@token_required
+@admin_required
+def bulk_update_companies(current_user):
+    return _bulk_response(update_companies)
+
+@admin_bp.route('/companies/bulk', methods=['DELETE'])
+@token_required
+@admin_required
+def bulk_delete_companies(current_user):
+    return _bulk_response(delete_companies)
+
+@admin_bp.route('/companies/bulk/regions', methods=['PUT'])
+@token_required
+@admin_required
+def bulk_assign_company_regions(current_user):
+    return _bulk_response(assign_company_regions)
+
+@admin_bp.route('/regions/bulk', methods=['POST'])
+@token_required
+@admin_required
+def bulk_create_regions(current_user):
+    return _bulk_response(create_regions)
+
+@admin_bp.route('/regions/bulk', methods=['PATCH'])
+@token_required
+@admin_required
+def bulk_rename_regions(current_user):
+    return _bulk_response(rename_regions)
+
+@admin_bp.route('/regions/bulk', methods=['DELETE'])
+@token_required
+@admin_required
+def bulk_delete_regions(current_user):
+    return _bulk_response(delete_regions)
+
+
+@admin_bp.route('/auth-cache', methods=['GET'])
+@token_required
+@admin_required
+def auth_cache_stats(current_user):
+    return jsonify(principal_cache.stats())
+
+
+# ---------------------------
+# 📤 STREAMING EXPORTS
+# ---------------------------
+# `format=ndjson|csv`; gzip follows Accept-Encoding unless `gzip=1|0` is given.
+# Unlike GET /companies these never hold more than one chunk of rows.
+
+def _export_options():
+    return parse_format(request.args), wants_gzip(request.args, request.accept_encodings)
+
+@admin_bp.route('/export/companies', methods=['GET'])
+@token_required
+@admin_required
+def export_companies(current_user):
+    try:
+        fmt, gzip = _export_options()
+        query = filter_companies(company_rows(Company.query), request.args)
+    except (ExportError, PaginationError) as e:
+        return jsonify({'message': str(e)}), 400
+    rows = query.order_by(Company.id).yield_per(EXPORT_CHUNK_SIZE)
+    return export_response('companies', fmt, company_records(rows, fmt), COMPANY_EXPORT_COLUMNS, gzip)
+
+@admin_bp.route('/export/regions', methods=['GET'])
+@token_required
+@admin_required
+def export_regions(current_user):
+    try:
+        fmt, gzip = _export_options()
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+    rows = Region.query.with_entities(
+        Region.id, Region.name, Region.latitude, Region.longitude
+    ).order_by(Region.id).yield_per(EXPORT_CHUNK_SIZE)
+    return export_response('regions', fmt, region_records(rows), REGION_EXPORT_COLUMNS, gzip)
+
+# Filters: `status`, `region`, `company`, `from`/`to` (ISO dates, on the request timestamp).
+# Rows come in id order, or in timestamp order when filtered by status.
+# Archived requests are merged in when the filters can match them.
+@admin_bp.route('/export/service-requests', methods=['GET'])
+@token_required
+@admin_required
+def export_service_requests(current_user):
+    try:
+        fmt, gzip = _export_options()
+        start, end = parse_date_range(request.args)
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+
+    filters = {}
+    for arg in ('region', 'company'):
+        value = request.args.get(arg)
+        if value:
+            if not value.isdigit():
+                return jsonify({'message': f'{arg} must be an integer'}), 400
+            filters[f'{arg}_id'] = int(value)
+    status = request.args.get('status')
+
+    def export_query(model):
+        query = model.query.filter_by(**filters).with_entities(
+            model.id, model.description, model.status, model.timestamp, model.region_id,
+            model.company_id, model.contact_name, model.contact_email, model.contact_phone
+        )
+        if status:
+            query = query.filter(model.status == status)
+        if start is not None:
+            query = query.filter(model.timestamp >= start)
+        if end is not None:
+            query = query.filter(model.timestamp < end)
+        # Follow an index so the first chunk streams without sorting the whole result
+        if status:
+            query = query.order_by(model.timestamp, model.id)
+        else:
+            query = query.order_by(model.id)
+        return query.yield_per(EXPORT_CHUNK_SIZE)
+
+    rows = export_query(ServiceRequest)
+    if archive_needed(status, start):
+        key = (lambda row: (row.timestamp, row.id)) if status else (lambda row: row.id)
+        rows = heapq.merge(rows, export_query(ServiceRequestArchive), key=key)
+    return export_response('service-requests', fmt, service_request_records(rows), SERVICE_REQUEST_EXPORT_COLUMNS, gzip)
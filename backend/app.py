@@ -5,7 +5,20 @@ from auth_routes import auth_bp
 from companies_routes import companies_bp
 from admin_routes import admin_bp
 from regions_routes import regions_bp
+from service_requests_routes import service_requests_bp
 from flask_cors import CORS
+from principal_cache import principal_cache
+from database import init_database, init_schema
+from importer import import_companies_command
+from stats import rebuild_stats_command
+from dispatch import dispatcher, dispatch_requests_command
+from instrumentation import instrumentation
+from json_provider import init_json_provider
+from compression import compression
+from passwords import password_hasher
+from replicas import sync_replicas_command
+from archive import archive_requests_command
+from ratelimit import limiter
 
 
 def create_app():
@@ -16,14 +29,30 @@ def create_app():
     CORS(app, supports_credentials=True, origins=["http://localhost:3000"])
     
     init_extensions(app)
+    init_database(app)
+    principal_cache.init_app(app)
+    dispatcher.init_app(app)
+    init_json_provider(app)
+    # After the JSON provider, whose encoder it times; before compression so
+    # its after_request hook (run in reverse order) sees the encoded size
+    instrumentation.init_app(app)
+    compression.init_app(app)
+    password_hasher.init_app(app)
+    limiter.init_app(app)
     
-    with app.app_context():
-        db.create_all()
+    init_schema(app)
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(companies_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(regions_bp)  # ← Add this
+    app.register_blueprint(service_requests_bp)
+
+    app.cli.add_command(import_companies_command)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(dispatch_requests_command)
+    app.cli.add_command(sync_replicas_command)
+    app.cli.add_command(archive_requests_command)
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,207 @@
+"""Archival and retention of closed service requests.
+
+`flask archive-requests` moves requests that are closed (completed or
+cancelled) and older than SERVICE_REQUEST_ARCHIVE_DAYS from service_request
+into service_request_archive. That way the hot table and its indexes only
+hold active and recent requests. Each batch is picked from the hot table,
+copied and deleted in its own transaction. An interrupted run therefore
+loses nothing; running the command again resumes it. When
+SERVICE_REQUEST_RETENTION_DAYS is set, archived requests older than that
+are then purged.
+
+On PostgreSQL the archive is partitioned by month. Partitions are created
+as batches need them, and purges drop whole expired partitions. Triggers
+on the archive (see stats.py) keep archived requests in the dashboard
+statistics.
+
+The service request listing and export check archive_needed() and read
+the archive only when their filters can reach it, so queries for active
+requests never touch it.
+"""
+import re
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, text
+
+from extensions import db
+from models import ServiceRequest, ServiceRequestArchive
+from pagination import encode_cursor
+
+CLOSED_STATUSES = ('completed', 'cancelled')
+COLUMNS = ('id', 'description', 'status', 'timestamp', 'region_id',
+           'contact_name', 'contact_email', 'contact_phone', 'company_id')
+PARTITION_NAME = re.compile(r'^service_request_archive_(\d{4})_(\d{2})$')
+
+
+# -----------------------------------
+# Reads
+# -----------------------------------
+def archive_needed(status=None, start=None):
+    """True if archived requests can match ``status`` and a range from ``start``."""
+    if status and status not in CLOSED_STATUSES:
+        return False
+    newest = db.session.query(func.max(ServiceRequestArchive.timestamp)).scalar()
+    return newest is not None and (start is None or start <= newest)
+
+
+def merge_pages(pages, args, limit):
+    """Combine keyset pages of the same id-sorted listing, one per table.
+
+    ``pages`` holds (items, next_cursor) pairs from keyset_paginate(); the
+    result is the first ``limit`` items overall and the cursor after them.
+    """
+    sort = args.get('sort', 'id')
+    items = sorted((item for page, _ in pages for item in page),
+                   key=lambda item: item.id, reverse=sort.startswith('-'))
+    more = len(items) > limit or any(cursor for _, cursor in pages)
+    items = items[:limit]
+    next_cursor = None
+    if more and items:
+        next_cursor = encode_cursor({'s': sort, 'v': items[-1].id, 'id': items[-1].id})
+    return items, next_cursor
+
+
+# -----------------------------------
+# PostgreSQL monthly partitions
+# -----------------------------------
+def _month(day):
+    return date(day.year, day.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def ensure_partitions(connection, first, last):
+    """Create the monthly partitions covering ``first``..``last``."""
+    month, last = _month(first), _month(last)
+    while month <= last:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS service_request_archive_{month:%Y_%m} "
+            f"PARTITION OF service_request_archive FOR VALUES FROM ('{month}') TO ('{_next_month(month)}')"
+        ))
+        month = _next_month(month)
+
+
+def _partitions(connection):
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'service_request_archive'::regclass"
+    ))
+    partitions = {}
+    for name, in rows:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = date(int(match.group(1)), int(match.group(2)), 1)
+    return partitions
+
+
+def drop_expired_partitions(connection, cutoff):
+    """Drop partitions entirely older than ``cutoff``; returns the rows removed.
+
+    DROP TABLE fires no row triggers, so the statistics are decremented from
+    one aggregate over the partition first.
+    """
+    removed = 0
+    for name, month in sorted(_partitions(connection).items(), key=lambda item: item[1]):
+        if datetime.combine(_next_month(month), datetime.min.time()) > cutoff:
+            continue
+        removed += connection.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+        connection.execute(text(
+            "INSERT INTO stat_counter (name, value) "
+            f"SELECT 'requests:' || status, -COUNT(*) FROM {name} GROUP BY status "
+            "ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value"
+        ))
+        connection.execute(text(
+            "INSERT INTO request_daily_stats (day, status, count) "
+            f"SELECT CAST(timestamp AS DATE), status, -COUNT(*) FROM {name} GROUP BY CAST(timestamp AS DATE), status "
+            "ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count"
+        ))
+        connection.execute(text(f"DROP TABLE {name}"))
+    return removed
+
+
+# -----------------------------------
+# Jobs
+# -----------------------------------
+def archive_batch(connection, cutoff, batch_size):
+    """Move up to ``batch_size`` closed requests older than ``cutoff``; returns how many."""
+    hot, archive = ServiceRequest.__table__, ServiceRequestArchive.__table__
+    query = select([hot.c.id]).where(hot.c.status.in_(CLOSED_STATUSES), hot.c.timestamp < cutoff)
+    if connection.dialect.name == 'sqlite':
+        # SQLite hands out max(rowid) + 1, so moving the newest row would let
+        # new requests reuse ids already in the archive
+        query = query.where(hot.c.id < select([func.max(hot.c.id)]).scalar_subquery())
+    # No ORDER BY: moved rows leave the index, so each batch takes the next
+    # ones off the (status, timestamp) range scan
+    ids = [request_id for request_id, in connection.execute(
+        query.limit(batch_size).with_for_update(skip_locked=True)
+    )]
+    if not ids:
+        return 0
+    if connection.dialect.name == 'postgresql':
+        first, last = connection.execute(
+            select([func.min(hot.c.timestamp), func.max(hot.c.timestamp)]).where(hot.c.id.in_(ids))
+        ).one()
+        ensure_partitions(connection, first, last)
+    connection.execute(archive.insert().from_select(
+        COLUMNS, select([hot.c[name] for name in COLUMNS]).where(hot.c.id.in_(ids))
+    ))
+    connection.execute(hot.delete().where(hot.c.id.in_(ids)))
+    return len(ids)
+
+
+def archive_requests(cutoff, batch_size=1000, max_batches=None):
+    """Archive closed requests older than ``cutoff``, one transaction per batch."""
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        with db.engine.begin() as connection:
+            count = archive_batch(connection, cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return moved
+
+
+def purge_archive(cutoff, batch_size=1000):
+    """Delete archived requests older than ``cutoff``; returns how many."""
+    archive = ServiceRequestArchive.__table__
+    purged = 0
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as connection:
+            purged += drop_expired_partitions(connection, cutoff)
+    # Leftovers in the partition straddling the cutoff, or everything on SQLite
+    while True:
+        with db.engine.begin() as connection:
+            ids = [request_id for request_id, in connection.execute(
+                select([archive.c.id]).where(archive.c.timestamp < cutoff).limit(batch_size)
+            )]
+            if ids:
+                connection.execute(archive.delete().where(archive.c.id.in_(ids)))
+        if not ids:
+            return purged
+        purged += len(ids)
+
+
+@click.command('archive-requests')
+@click.option('--older-than-days', type=int, help='Defaults to SERVICE_REQUEST_ARCHIVE_DAYS.')
+@click.option('--batch-size', type=int, help='Defaults to SERVICE_REQUEST_ARCHIVE_BATCH_SIZE.')
+@click.option('--max-batches', type=int, help='Stop after this many batches; run again to resume.')
+@with_appcontext
+def archive_requests_command(older_than_days, batch_size, max_batches):
+    """Archive closed service requests and purge expired archived ones."""
+    config = current_app.config
+    days = config['SERVICE_REQUEST_ARCHIVE_DAYS'] if older_than_days is None else older_than_days
+    batch_size = batch_size or config['SERVICE_REQUEST_ARCHIVE_BATCH_SIZE']
+    now = datetime.utcnow()
+
+    moved = archive_requests(now - timedelta(days=days), batch_size, max_batches)
+    click.echo(f'Archived {moved} service request(s) closed and older than {days} day(s).')
+    retention = config['SERVICE_REQUEST_RETENTION_DAYS']
+    if retention:
+        purged = purge_archive(now - timedelta(days=retention), batch_size)
+        click.echo(f'Purged {purged} archived request(s) older than {retention} day(s).')
@@ -1,14 +1,23 @@
 from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from models import User  # Update to match your actual User model import
 from extensions import db  # ✅ Correct way to avoid circular import
  # Update to match your app
 from flask_login import login_user
+from passwords import password_hasher, HashingBusy
+from ratelimit import limiter
 
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+def _busy():
+    response = jsonify({'error': 'Server busy, please retry'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
 @auth_bp.route('/register', methods=['POST'])
+@limiter.limit('auth', account_field='email')
 def register():
     data = request.get_json()
     email = data.get('email')
@@ -22,9 +31,14 @@ def register():
     if existing_user:
         return jsonify({'error': 'Email already exists'}), 409
 
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    # Hashed on the bounded pool so a registration burst can't starve other requests
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HashingBusy:
+        return _busy()
 
-    new_user = User(email=email, username=username, password=hashed_password)
+    # User has no username column; the email doubles as the username
+    new_user = User(email=email, password=hashed_password)
     db.session.add(new_user)
     db.session.commit()
 
@@ -32,6 +46,7 @@ def register():
 
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit('auth', account_field='email')
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -39,9 +54,22 @@ def login():
 
     user = User.query.filter_by(email=email).first()
 
-    if not user or not check_password_hash(user.password, password):
+    try:
+        verified = bool(user and password) and password_hasher.verify(user.password, password)
+    except HashingBusy:
+        return _busy()
+    if not verified:
         return jsonify({'error': 'Invalid credentials'}), 401
 
+    # Upgrade hashes made with an older method or work factor; when the pool
+    # is busy the upgrade waits for a later login
+    if password_hasher.needs_rehash(user.password):
+        try:
+            user.password = password_hasher.hash(password)
+            db.session.commit()
+        except HashingBusy:
+            pass
+
 # register the user with Flask-Login
     login_user(user)
 
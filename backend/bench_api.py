@@ -0,0 +1,340 @@
+"""Latency/throughput benchmark for every API blueprint.
+
+Seeds a synthetic dataset (see synthetic_data.py) into a throwaway SQLite
+database, or uses --database-url, then drives each endpoint below through
+the Flask test client and/or a real threaded WSGI server. For every endpoint
+it reports p50/p95/p99 latency, throughput, SQL statements per request and
+peak Python memory allocated by a single request.
+
+    python bench_api.py --companies 10000 --requests 200 --concurrency 8 \\
+        --mode both --output bench-results.json [--compare previous.json]
+
+With --compare the run exits non-zero when any endpoint's p95 latency is
+more than --threshold percent slower than in the previous results file.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import jwt
+from sqlalchemy import event
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+import config
+
+# (name, method, path, role, json body, largest dataset it is run against)
+# Paths may use {region_id}, {cursor} and {n} (a per-call counter).
+ENDPOINTS = [
+    ('regions.list', 'GET', '/api/regions', None, None, None),
+    ('companies.list', 'GET', '/api/companies', None, None, 50000),
+    ('companies.by_region', 'GET', '/api/companies?region={region_id}', None, None, 50000),
+    ('companies.page', 'GET', '/api/companies?limit=20', None, None, None),
+    ('companies.page_cursor', 'GET', '/api/companies?limit=20&sort=name&cursor={cursor}', None, None, None),
+    ('companies.page_region', 'GET', '/api/companies?limit=20&region={region_id}', None, None, None),
+    ('companies.search', 'GET', '/api/companies/search?q=compost&limit=20', None, None, None),
+    ('companies.nearby', 'GET', '/api/companies/nearby?lat=-1.29&lon=36.82&limit=20', None, None, None),
+    ('companies.nearby_serving', 'GET', '/api/companies/nearby?lat=-1.29&lon=36.82&serving=true&limit=20',
+     None, None, None),
+    ('companies.profile', 'GET', '/api/companies/profile', 'company', None, None),
+    ('companies.profile_update', 'PUT', '/api/companies/profile', 'company',
+     {'description': 'Recycling and composting services', 'region_ids': [1, 2]}, None),
+    ('auth.login', 'POST', '/api/auth/login', None,
+     {'email': 'company1@example.com', 'password': 'benchpass'}, None),
+    ('auth.register', 'POST', '/api/auth/register', None,
+     {'email': 'bench{n}@example.com', 'username': 'bench{n}', 'password': 'benchpass'}, None),
+    ('admin.regions', 'GET', '/api/admin/regions', 'admin', None, None),
+    ('admin.companies', 'GET', '/api/admin/companies', 'admin', None, 50000),
+    ('admin.companies_page', 'GET', '/api/admin/companies?limit=20', 'admin', None, None),
+    ('admin.stats', 'GET', '/api/admin/stats', 'admin', None, None),
+    ('admin.bulk_approve', 'POST', '/api/admin/companies/bulk/approve', 'admin',
+     {'ids': list(range(1, 501))}, None),
+    ('admin.bulk_update', 'PATCH', '/api/admin/companies/bulk', 'admin',
+     {'items': [{'id': i, 'phone': '0700000000'} for i in range(1, 501)]}, None),
+    ('admin.export_companies', 'GET', '/api/admin/export/companies?gzip=0', 'admin', None, 100000),
+    ('admin.export_companies_csv_gzip', 'GET', '/api/admin/export/companies?format=csv&gzip=1', 'admin', None, 100000),
+    ('service_requests.submit', 'POST', '/api/service-requests', None,
+     {'description': 'Bin collection {n}', 'region_id': 1, 'contact_email': 'resident{n}@example.com'}, None),
+    ('service_requests.submit_batch', 'POST', '/api/service-requests', None,
+     [{'description': 'Bulk pickup {n}', 'region_id': 2, 'contact_phone': '0700000000'}] * 50, None),
+    ('service_requests.list', 'GET', '/api/service-requests?limit=20&status=pending', 'company', None, None),
+]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _format(template, context, n):
+    if isinstance(template, dict):
+        return {key: _format(value, context, n) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_format(value, context, n) for value in template]
+    if isinstance(template, str):
+        return template.format(n=n, **context)
+    return template
+
+
+def drive(send, n_requests, concurrency):
+    """Call ``send(i)`` n_requests times across a thread pool."""
+    latencies, errors = [], 0
+
+    def timed(i):
+        start = time.perf_counter()
+        status = send(i)
+        return time.perf_counter() - start, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, status in pool.map(timed, range(n_requests)):
+            latencies.append(latency)
+            errors += status >= 400
+    elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def client_sender(app, method, path, headers, body, context, counter):
+    local = threading.local()
+
+    def send(i):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        n = next(counter)
+        response = local.client.open(_format(path, context, n), method=method, headers=headers,
+                                     json=_format(body, context, n))
+        response.get_data()
+        return response.status_code
+
+    return send
+
+
+def server_sender(base_url, method, path, headers, body, context, counter):
+    def send(i):
+        n = next(counter)
+        data = json.dumps(_format(body, context, n)).encode() if body is not None else None
+        request = urllib.request.Request(base_url + _format(path, context, n), data=data, method=method,
+                                         headers={**headers, 'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    return send
+
+
+def peak_memory(app, method, path, headers, body, context, counter):
+    client = app.test_client()
+    n = next(counter)
+    tracemalloc.start()
+    try:
+        client.open(_format(path, context, n), method=method, headers=headers,
+                    json=_format(body, context, n)).get_data()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(latencies, errors, elapsed, queries, n_requests):
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': n_requests,
+        'errors': errors,
+        'throughput': round(n_requests / elapsed, 1) if elapsed else None,
+        'p50Ms': ms(percentile(latencies, 50)),
+        'p95Ms': ms(percentile(latencies, 95)),
+        'p99Ms': ms(percentile(latencies, 99)),
+        'queriesPerRequest': round(queries / n_requests, 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous_path, threshold):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    if previous['meta'].get('companies') != results['meta']['companies']:
+        print(f"warning: comparing against a run with {previous['meta'].get('companies')} companies")
+
+    regressions = 0
+    print(f"\nComparison with {previous_path} ({previous['meta'].get('commit')})")
+    for name, modes in results['endpoints'].items():
+        for mode, stats in modes.items():
+            old = previous['endpoints'].get(name, {}).get(mode)
+            if not old or not old.get('p95Ms') or not stats.get('p95Ms'):
+                continue
+            change = (stats['p95Ms'] - old['p95Ms']) / old['p95Ms'] * 100
+            flag = ''
+            if change > threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f'  {name:28} {mode:6} p95 {old["p95Ms"]:9.2f} -> {stats["p95Ms"]:9.2f} ms ({change:+6.1f}%){flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--companies', type=int, default=1000, help='synthetic companies (10 to 1000000)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint and mode')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both')
+    parser.add_argument('--only', help='comma-separated endpoint names or blueprint prefixes')
+    parser.add_argument('--database-url', help='benchmark an existing, already seeded database')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response and principal caches')
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', help='previous results file to compare p95 latencies against')
+    parser.add_argument('--threshold', type=float, default=20.0, help='allowed p95 regression in percent')
+    args = parser.parse_args()
+    if not 10 <= args.companies <= 1000000:
+        parser.error('--companies must be between 10 and 1000000')
+
+    db_path = None
+    if args.database_url:
+        config.Config.SQLALCHEMY_DATABASE_URI = args.database_url
+    else:
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        config.Config.AUTO_CREATE_TABLES = True
+    # Measure what the auth endpoints cost, not how fast the limiter rejects them
+    config.Config.RATELIMIT_ENABLED = False
+    if args.no_cache:
+        config.Config.CACHE_ENABLED = False
+        config.Config.AUTH_CACHE_ENABLED = False
+
+    from app import create_app
+    from extensions import db
+    from models import User
+    from synthetic_data import seed_synthetic
+
+    app = create_app()
+    # Failing endpoints are counted as errors; don't print every traceback
+    app.logger.setLevel(logging.CRITICAL)
+    modes = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    endpoints = ENDPOINTS
+    if args.only:
+        wanted = args.only.split(',')
+        endpoints = [e for e in ENDPOINTS if any(e[0] == w or e[0].startswith(w + '.') for w in wanted)]
+
+    server = None
+    try:
+        with app.app_context():
+            if db_path:
+                started = time.perf_counter()
+                counts = seed_synthetic(args.companies)
+                print(f'Seeded {counts} in {time.perf_counter() - started:.1f}s')
+
+            secret = app.config['SECRET_KEY']
+            admin = User.query.filter_by(role='admin').first()
+            company_user = User.query.filter_by(email='company1@example.com').first()
+            tokens = {
+                'admin': jwt.encode({'user_id': admin.id}, secret, algorithm='HS256'),
+                'company': jwt.encode({'user_id': company_user.id}, secret, algorithm='HS256'),
+            }
+            db.session.remove()
+
+            context = {'region_id': 1}
+            context['cursor'] = app.test_client().get('/api/companies?limit=20&sort=name').get_json()['nextCursor'] or ''
+            counter = QueryCounter(db.engine)
+            calls = itertools.count()
+
+            base_url = None
+            if 'server' in modes:
+                server = make_server('127.0.0.1', 0, app, threaded=True,
+                                     request_handler=QuietRequestHandler)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                base_url = f'http://127.0.0.1:{server.server_port}'
+
+            results = {
+                'meta': {
+                    'commit': git_commit(),
+                    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'companies': args.companies if db_path else None,
+                    'database': db.engine.dialect.name,
+                    'requests': args.requests,
+                    'concurrency': args.concurrency,
+                    'cache': not args.no_cache,
+                    'python': platform.python_version(),
+                },
+                'endpoints': {},
+            }
+
+            for name, method, path, role, body, max_companies in endpoints:
+                if max_companies and db_path and args.companies > max_companies:
+                    print(f'{name:28} skipped (more than {max_companies} companies)')
+                    continue
+                headers = {'Authorization': f'Bearer {tokens[role]}'} if role else {}
+                stats = results['endpoints'][name] = {}
+                for mode in modes:
+                    if mode == 'client':
+                        send = client_sender(app, method, path, headers, body, context, calls)
+                    else:
+                        send = server_sender(base_url, method, path, headers, body, context, calls)
+                    send(-1)  # warm-up
+                    queries_before = counter.count
+                    latencies, errors, elapsed = drive(send, args.requests, args.concurrency)
+                    stats[mode] = summarize(latencies, errors, elapsed,
+                                            counter.count - queries_before, args.requests)
+                    print(f"{name:28} {mode:6} p50 {stats[mode]['p50Ms']:8.2f} ms  "
+                          f"p95 {stats[mode]['p95Ms']:8.2f} ms  p99 {stats[mode]['p99Ms']:8.2f} ms  "
+                          f"{stats[mode]['throughput']:8.1f} req/s  "
+                          f"{stats[mode]['queriesPerRequest']:5.1f} queries  {errors} errors")
+                peak = peak_memory(app, method, path, headers, body, context, calls)
+                for mode in modes:
+                    stats[mode]['peakMemoryKb'] = round(peak / 1024, 1)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if db_path:
+            os.unlink(db_path)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f'{regressions} regression(s) above {args.threshold}%')
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
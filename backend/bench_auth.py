@@ -0,0 +1,127 @@
+"""Latency of unrelated endpoints during a password hashing storm.
+
+Seeds a synthetic dataset into a throwaway SQLite database and serves it
+from a real threaded WSGI server. It then measures a probe endpoint in three
+phases:
+- idle
+- while --storm-concurrency clients hammer POST /api/auth/login with hashing
+  inline on the request threads (PASSWORD_HASH_WORKERS=0)
+- the same storm with the bounded hashing pool (--workers, --queue-size)
+
+Rate limiting is off, so every login really hashes. Logins beyond the
+pool's capacity get 503, and storm clients then wait out Retry-After. With
+the pool, the probe's p99 should stay close to idle.
+
+    python bench_auth.py --companies 1000 --requests 300 --storm-concurrency 16 --output bench-auth.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from werkzeug.serving import make_server
+
+import config
+from bench_api import QuietRequestHandler, drive, server_sender, summarize
+
+
+def storm(base_url, email, password, concurrency, stop):
+    """Log in from ``concurrency`` threads until ``stop`` is set; returns status counts."""
+    statuses = Counter()
+    lock = threading.Lock()
+    send = server_sender(base_url, 'POST', '/api/auth/login', {}, {'email': email, 'password': password},
+                         {}, itertools.count())
+
+    def run():
+        while not stop.is_set():
+            status = send(0)
+            with lock:
+                statuses[status] += 1
+            if status in (429, 503):
+                stop.wait(1)  # honour Retry-After like a well-behaved client
+
+    threads = [threading.Thread(target=run, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    return threads, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--companies', type=int, default=1000)
+    parser.add_argument('--probe', default='/api/companies?limit=20', help='unrelated GET endpoint to measure')
+    parser.add_argument('--requests', type=int, default=300, help='probe requests per phase')
+    parser.add_argument('--concurrency', type=int, default=2, help='concurrent probe clients')
+    parser.add_argument('--storm-concurrency', type=int, default=16, help='concurrent login clients')
+    parser.add_argument('--workers', type=int, default=1, help='PASSWORD_HASH_WORKERS for the pooled phase')
+    parser.add_argument('--queue-size', type=int, default=4, help='PASSWORD_HASH_QUEUE_SIZE for the pooled phase')
+    parser.add_argument('--output', default='bench-auth.json')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+    config.Config.AUTO_CREATE_TABLES = True
+    config.Config.CACHE_ENABLED = False
+    config.Config.RATELIMIT_ENABLED = False
+
+    from app import create_app
+    from passwords import password_hasher
+    from synthetic_data import seed_synthetic, SYNTHETIC_PASSWORD
+
+    app = create_app()
+    app.logger.setLevel(logging.CRITICAL)
+    phases = [
+        ('idle', None),
+        ('storm_inline', {'PASSWORD_HASH_WORKERS': 0}),
+        ('storm_pooled', {'PASSWORD_HASH_WORKERS': args.workers, 'PASSWORD_HASH_QUEUE_SIZE': args.queue_size}),
+    ]
+    results = {'meta': {'companies': args.companies, 'probe': args.probe, 'requests': args.requests,
+                        'stormConcurrency': args.storm_concurrency, 'workers': args.workers,
+                        'queueSize': args.queue_size, 'cpus': os.cpu_count()},
+               'phases': {}}
+    server = None
+    try:
+        with app.app_context():
+            seed_synthetic(args.companies)
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        probe = server_sender(base_url, 'GET', args.probe, {}, None, {}, itertools.count())
+        probe(-1)  # warm-up
+
+        for name, overrides in phases:
+            app.config.update(overrides or {})
+            password_hasher.init_app(app)
+            stop = threading.Event()
+            threads, statuses = storm(base_url, 'company1@example.com', SYNTHETIC_PASSWORD,
+                                      args.storm_concurrency, stop) if overrides else ([], Counter())
+            time.sleep(0.5 if overrides else 0)  # let the storm build up
+            latencies, errors, elapsed = drive(probe, args.requests, args.concurrency)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+            stats = summarize(latencies, errors, elapsed, 0, args.requests)
+            del stats['queriesPerRequest']
+            stats['logins'] = {str(status): count for status, count in sorted(statuses.items())}
+            results['phases'][name] = stats
+            print(f"{name:14} p50 {stats['p50Ms']:8.2f} ms  p95 {stats['p95Ms']:8.2f} ms  "
+                  f"p99 {stats['p99Ms']:8.2f} ms  {stats['throughput']:7.1f} req/s  logins {stats['logins']}")
+    finally:
+        if server is not None:
+            server.shutdown()
+        os.unlink(db_path)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
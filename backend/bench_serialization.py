@@ -0,0 +1,114 @@
+"""Bytes on the wire and serialization CPU per endpoint.
+
+Seeds a synthetic dataset into a throwaway SQLite database, fetches the
+JSON payload of every GET endpoint in bench_api.ENDPOINTS once, then
+measures it offline. The measurements are:
+- CPU time to encode the payload with the stdlib encoder and with orjson
+- the body size as identity, gzip (dynamic level), gzip -9 (the
+  precompressed cache level) and brotli
+- CPU time to gzip the payload per request
+
+    python bench_serialization.py --companies 10000 --repeat 20 --output serialization.json
+"""
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+
+import jwt
+
+import config
+
+
+def cpu_ms(fn, repeat):
+    fn()  # warm-up
+    started = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return round((time.process_time() - started) / repeat * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--companies', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20, help='encodings timed per endpoint')
+    parser.add_argument('--output', default='bench-serialization.json')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+    config.Config.AUTO_CREATE_TABLES = True
+    config.Config.CACHE_ENABLED = False
+    config.Config.COMPRESS_ENABLED = False
+
+    from flask.json import JSONEncoder
+    from app import create_app
+    from bench_api import ENDPOINTS
+    from compression import brotli
+    from json_provider import OrjsonEncoder
+    from models import User
+    from synthetic_data import seed_synthetic
+
+    app = create_app()
+    results = {'meta': {'companies': args.companies, 'repeat': args.repeat,
+                        'orjson': OrjsonEncoder is not None, 'brotli': brotli is not None},
+               'endpoints': {}}
+    try:
+        with app.app_context():
+            seed_synthetic(args.companies, requests_per_company=1)
+            secret = app.config['SECRET_KEY']
+            tokens = {
+                'admin': jwt.encode({'user_id': User.query.filter_by(role='admin').first().id}, secret,
+                                    algorithm='HS256'),
+                'company': jwt.encode({'user_id': User.query.filter_by(email='company1@example.com').first().id},
+                                      secret, algorithm='HS256'),
+            }
+            client = app.test_client()
+
+            print(f"{'endpoint':30} {'stdlib ms':>10} {'orjson ms':>10} {'identity B':>11} "
+                  f"{'gzip B':>9} {'gzip-9 B':>9} {'br B':>9} {'gzip ms':>8}")
+            for name, method, path, role, body, max_companies in ENDPOINTS:
+                if method != 'GET' or '{' in path or (max_companies and args.companies > max_companies):
+                    continue
+                headers = {'Authorization': f'Bearer {tokens[role]}'} if role else {}
+                response = client.get(path, headers=headers)
+                response.get_data()  # finish streamed responses (exports) before moving on
+                if response.status_code != 200 or not response.is_json:
+                    continue
+                payload = response.get_json()
+
+                def stdlib():
+                    return json.dumps(payload, cls=JSONEncoder, sort_keys=True, separators=(',', ':'))
+
+                def fast():
+                    return json.dumps(payload, cls=OrjsonEncoder, sort_keys=True, separators=(',', ':'))
+
+                data = stdlib().encode('utf-8')
+                stats = {
+                    'stdlibMs': cpu_ms(stdlib, args.repeat),
+                    'orjsonMs': cpu_ms(fast, args.repeat) if OrjsonEncoder else None,
+                    'identityBytes': len(data),
+                    'gzipBytes': len(gzip.compress(data, app.config['COMPRESS_GZIP_LEVEL'])),
+                    'gzip9Bytes': len(gzip.compress(data, 9)),
+                    'brotliBytes': len(brotli.compress(data, quality=app.config['COMPRESS_BROTLI_QUALITY']))
+                    if brotli else None,
+                    'gzipMs': cpu_ms(lambda: gzip.compress(data, app.config['COMPRESS_GZIP_LEVEL']), args.repeat),
+                }
+                results['endpoints'][name] = stats
+                fmt = lambda value: '-' if value is None else value
+                print(f"{name:30} {stats['stdlibMs']:>10} {fmt(stats['orjsonMs']):>10} "
+                      f"{stats['identityBytes']:>11} {stats['gzipBytes']:>9} {stats['gzip9Bytes']:>9} "
+                      f"{fmt(stats['brotliBytes']):>9} {stats['gzipMs']:>8}")
+    finally:
+        os.unlink(db_path)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Concurrent reader/writer benchmark for the SQLite engine configuration.
+
+Runs the same mixed workload against two fresh SQLite files: one with
+SQLite's defaults (rollback journal, synchronous=FULL) and one with the
+pragmas from config.SQLITE_PRAGMAS (WAL, synchronous=NORMAL, busy_timeout,
+mmap). Each reader/writer is a separate process, like gunicorn workers.
+
+    python bench_sqlite.py [--readers 8] [--writers 2] [--seconds 10] [--companies 5000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+import config
+from config import _sqlite_pragmas
+from database import apply_sqlite_pragmas
+from extensions import db
+from models import company_region
+
+READ_SQL = text(
+    'SELECT company.id, company.name, region.name FROM company '
+    'JOIN company_region ON company_region.company_id = company.id '
+    'JOIN region ON region.id = company_region.region_id '
+    'WHERE company_region.region_id = :region_id ORDER BY company.id LIMIT 20'
+)
+WRITE_SQL = text(
+    'INSERT INTO service_request (description, status, company_id) '
+    "VALUES (:description, 'pending', :company_id)"
+)
+
+
+def make_engine(path, pragmas):
+    engine = create_engine('sqlite:///' + path)
+    if pragmas:
+        event.listen(engine, 'connect', lambda conn, record: apply_sqlite_pragmas(conn, pragmas))
+    return engine
+
+
+def build_database(path, n_companies, n_regions=50):
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    config.Config.SQLITE_PRAGMAS = {}
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(text('INSERT INTO region (id, name) VALUES (:id, :name)'),
+                           [{'id': i, 'name': f'Region {i}'} for i in range(1, n_regions + 1)])
+        db.session.execute(text("INSERT INTO user (id, email, password, role) VALUES (:id, :email, 'x', 'company')"),
+                           [{'id': i, 'email': f'c{i}@example.com'} for i in range(1, n_companies + 1)])
+        db.session.execute(text(
+            "INSERT INTO company (id, user_id, name, phone, email, description) "
+            "VALUES (:id, :id, :name, '0700000000', :email, 'recycling')"),
+            [{'id': i, 'name': f'Company {i}', 'email': f'c{i}@example.com'} for i in range(1, n_companies + 1)])
+        db.session.execute(company_region.insert(), [
+            {'company_id': i, 'region_id': r}
+            for i in range(1, n_companies + 1)
+            for r in {i % n_regions + 1, (i * 7) % n_regions + 1}
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def worker(kind, path, pragmas, seconds, n_companies, results):
+    engine = make_engine(path, pragmas)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if kind == 'read':
+                    conn.execute(READ_SQL, {'region_id': random.randint(1, 50)}).fetchall()
+                else:
+                    conn.execute(WRITE_SQL, {'description': 'pickup',
+                                             'company_id': random.randint(1, n_companies)})
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    results.put((kind, latencies, errors))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(label, template, pragmas, args):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'bench.db')
+    shutil.copy(template, path)
+    if pragmas.get('journal_mode'):
+        make_engine(path, pragmas).connect().close()
+
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=worker, args=(kind, path, pragmas, args.seconds, args.companies, results))
+        for kind in ['read'] * args.readers + ['write'] * args.writers
+    ]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    shutil.rmtree(workdir)
+
+    print(f'\n{label}: {pragmas or "SQLite defaults"}')
+    for kind in ('read', 'write'):
+        latencies = [l for k, ls, _ in collected if k == kind for l in ls]
+        errors = sum(e for k, _, e in collected if k == kind)
+        print(f'  {kind:5} {len(latencies) / args.seconds:9.1f} ops/s  '
+              f'p50 {percentile(latencies, 50) * 1000:7.2f} ms  '
+              f'p95 {percentile(latencies, 95) * 1000:7.2f} ms  '
+              f'p99 {percentile(latencies, 99) * 1000:7.2f} ms  '
+              f'locked errors {errors}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--companies', type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    template = os.path.join(workdir, 'template.db')
+    try:
+        build_database(template, args.companies)
+        run('default', template, {}, args)
+        run('tuned', template, _sqlite_pragmas(), args)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
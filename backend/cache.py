@@ -0,0 +1,258 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from compression import compression
+from replicas import db_router
+
+
+# -----------------------------------
+# Backends
+# -----------------------------------
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL.
+
+    Only invalidates entries within the current process; use the Redis
+    backend when several workers must see each other's invalidations.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    # Counters live outside the LRU so a namespace generation is never evicted
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+def _encode_bytes(value):
+    if isinstance(value, bytes):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode_bytes(obj):
+    if len(obj) == 1 and '__bytes__' in obj:
+        return base64.b64decode(obj['__bytes__'])
+    return obj
+
+
+class RedisCache:
+    """Cache backed by any client exposing the redis-py get/set/delete/incr API.
+
+    Values are stored as JSON, with bytes base64-encoded. Pass ``client`` to
+    inject a stand-in (e.g. a fakeredis instance in tests); otherwise one is
+    built from ``url``.
+    """
+
+    def __init__(self, client=None, url=None, prefix='ecowaste:', default_ttl=300):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw, object_hook=_decode_bytes)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value, default=_encode_bytes), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def get_counter(self, key):
+        raw = self.client.get(self.prefix + 'counter:' + key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + 'counter:' + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+# -----------------------------------
+# Flask extension
+# -----------------------------------
+# Models whose changes make a cached namespace stale. Region names are
+# embedded in every company payload, so region writes also hit 'companies'.
+MODEL_NAMESPACES = {
+    'Region': ('regions', 'companies'),
+    'Company': ('companies',),
+}
+
+
+class Cache:
+    """Namespaced response cache.
+
+    Each namespace has a generation counter that is part of every key, so
+    invalidating a namespace is a single increment and stale entries simply
+    age out of the LRU/TTL.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        if backend == 'redis':
+            self.backend = RedisCache(url=app.config.get('CACHE_REDIS_URL'), default_ttl=ttl)
+        elif backend == 'memory':
+            self.backend = MemoryCache(app.config.get('CACHE_MAX_ENTRIES', 1024), ttl)
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND: {backend}')
+        app.extensions['cache'] = self
+
+    def key(self, namespace, key):
+        """Versioned key for ``key`` under the namespace's current generation.
+
+        Compute it once per miss and pass it to both get() and set(): reading
+        the generation again after rendering would file a body rendered
+        before a concurrent write under the generation that write created.
+        """
+        generation = self.backend.get_counter('ns:' + namespace)
+        return f'{namespace}:{generation}:{key}'
+
+    def get(self, versioned_key):
+        return self.backend.get(versioned_key)
+
+    def set(self, versioned_key, value, ttl=None):
+        self.backend.set(versioned_key, value, ttl)
+
+    def invalidate(self, *namespaces):
+        if self.backend is None:
+            return
+        for namespace in namespaces:
+            self.backend.incr('ns:' + namespace)
+
+
+cache = Cache()
+
+
+# -----------------------------------
+# Automatic invalidation on commit
+# -----------------------------------
+def mark_stale(session, *namespaces):
+    """Invalidate ``namespaces`` when ``session`` commits.
+
+    For Core UPDATE/DELETE statements, which the flush hook below never sees.
+    """
+    session.info.setdefault('stale_cache_namespaces', set()).update(namespaces)
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_stale_namespaces(session, flush_context, instances):
+    stale = session.info.setdefault('stale_cache_namespaces', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        stale.update(MODEL_NAMESPACES.get(type(obj).__name__, ()))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stale_namespaces(session):
+    stale = session.info.pop('stale_cache_namespaces', None)
+    if stale:
+        cache.invalidate(*stale)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_namespaces(session):
+    session.info.pop('stale_cache_namespaces', None)
+
+
+# -----------------------------------
+# Cached, conditional GET responses
+# -----------------------------------
+def cached_response(namespace, ttl=None):
+    """Serve a GET view from the cache, with ETag/Last-Modified revalidation."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if cache.backend is None or not current_app.config.get('CACHE_ENABLED', True):
+                return f(*args, **kwargs)
+
+            key = cache.key(namespace, request.full_path)
+            entry = cache.get(key)
+            if entry is None:
+                # Filled from the primary: the entry is stored under the current
+                # generation, so a lagging replica would keep it stale for the TTL
+                db_router.pin_primary()
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data(as_text=True)
+                entry = {
+                    'body': body,
+                    'mimetype': response.mimetype,
+                    'etag': hashlib.sha1(body.encode()).hexdigest(),
+                    'last_modified': time.time(),
+                    # Compressed once here instead of on every hit
+                    'encoded': compression.precompress(body.encode()),
+                }
+                cache.set(key, entry, ttl)
+
+            response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            response.cache_control.no_cache = True
+            response.precompressed = entry.get('encoded')
+            return response.make_conditional(request)
+
+        return decorated
+
+    return decorator
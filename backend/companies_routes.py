@@ -1,25 +1,80 @@
 from flask import Blueprint, request, jsonify
 from models import Company, Region
 from extensions import db
-from helpers import token_required, format_company
+from cache import cached_response
+from helpers import token_required, format_company, format_companies, company_rows
+from pagination import is_paginated_request, filter_companies, paginate_companies, PaginationError
+from search import search_company_ids
+from geo import nearby_company_ids, parse_location
+from company_regions import UnknownRegions, parse_region_ids, check_region_ids, set_company_regions
 
 # Blueprint with plural naming
 companies_bp = Blueprint('companies', __name__, url_prefix='/api/companies')
 
 # GET all companies or filter by region
+# Passing `limit` or `cursor` switches to the paginated listing, which also
+# accepts `sort`, `name` (prefix) and `q` (description search).
 @companies_bp.route('', methods=['GET'])
+@cached_response('companies')
 def get_companies():
+    if is_paginated_request(request.args):
+        try:
+            rows, next_cursor = paginate_companies(company_rows(Company.query), request.args)
+        except PaginationError as e:
+            return jsonify({'message': str(e)}), 400
+        return jsonify({
+            'items': format_companies(rows),
+            'nextCursor': next_cursor
+        }), 200
+
+    query = company_rows(Company.query)
     region_id = request.args.get('region')
     
     if region_id:
         region = Region.query.get(region_id)
         if not region:
             return jsonify([]), 200
-        companies = region.companies
-    else:
-        companies = Company.query.all()
+        query = filter_companies(query, {'region': region.id})
     
-    return jsonify([format_company(company) for company in companies]), 200
+    return jsonify(format_companies(query.order_by(Company.id))), 200
+
+# GET ranked full-text search over name, description and region names
+# (`q`, optional `region`, `limit` and `cursor`)
+@companies_bp.route('/search', methods=['GET'])
+@cached_response('companies')
+def search_companies():
+    try:
+        matches, next_cursor = search_company_ids(request.args)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+
+    ids = [company_id for company_id, _ in matches]
+    rows = {row.id: row for row in company_rows(Company.query).filter(Company.id.in_(ids))}
+    return jsonify({
+        'items': format_companies([rows[company_id] for company_id in ids if company_id in rows]),
+        'nextCursor': next_cursor
+    }), 200
+
+# GET companies nearest to a point (`lat`, `lon`), with their distance.
+# `serving=true` keeps those whose service area covers the point; `radius_km`,
+# `region`, `limit` and `cursor` as for the other listings.
+@companies_bp.route('/nearby', methods=['GET'])
+@cached_response('companies')
+def nearby_companies():
+    try:
+        matches, next_cursor = nearby_company_ids(request.args)
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+
+    distances = dict(matches)
+    rows = {row.id: row for row in company_rows(Company.query).filter(Company.id.in_(list(distances)))}
+    items = format_companies([rows[company_id] for company_id, _ in matches if company_id in rows])
+    for item in items:
+        item['distanceKm'] = round(distances[item['id']], 3)
+    return jsonify({
+        'items': items,
+        'nextCursor': next_cursor
+    }), 200
 
 # GET current user's company profile
 @companies_bp.route('/profile', methods=['GET'])
@@ -39,21 +94,31 @@ def update_company_profile(current_user):
     
     data = request.get_json()
     company = current_user.company
+    location, error = parse_location(data)
+    if error:
+        return jsonify({'message': error}), 400
+    region_ids = None
+    if 'region_ids' in data:
+        try:
+            region_ids = parse_region_ids(data['region_ids'])
+            check_region_ids(region_ids)
+        except UnknownRegions as e:
+            return jsonify({'message': str(e), 'unknownRegionIds': e.ids}), 400
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
 
     # Update basic fields
     company.name = data.get('name', company.name)
     company.phone = data.get('phone', company.phone)
     company.email = data.get('email', company.email)
     company.description = data.get('description', company.description)
+    for name, value in location.items():
+        setattr(company, name, value)
 
-    # Update region relationships if provided
-    if 'region_ids' in data:
-        regions = []
-        for region_id in data['region_ids']:
-            region = Region.query.get(region_id)
-            if region:
-                regions.append(region)
-        company.regions = regions
+    # Update region relationships if provided; only changed links are written
+    if region_ids is not None:
+        set_company_regions({company.id: region_ids})
+        db.session.expire(company, ['regions'])
 
     db.session.commit()
 
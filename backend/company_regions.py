@@ -0,0 +1,95 @@
+"""Diff-based assignment of regions to companies.
+
+Shared by the profile update, the admin company routes (single and bulk)
+and the importer. Region ids are validated with batched IN queries, and only
+the company_region rows that actually change are deleted or inserted. So an
+unchanged assignment writes nothing, and the stats and search triggers fire
+once per changed link. These Core statements bypass the session: callers
+holding a Company must expire its ``regions``, and the company cache
+namespaces are marked stale here.
+"""
+from sqlalchemy import and_, bindparam
+
+from cache import mark_stale, MODEL_NAMESPACES
+from extensions import db
+from models import Region, company_region
+
+REGION_MODES = ('replace', 'add', 'remove')
+# Keeps IN (...) lists under SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+
+class UnknownRegions(ValueError):
+    """Raised when some region ids do not exist; ``ids`` lists them."""
+
+    def __init__(self, ids):
+        self.ids = sorted(ids)
+        super().__init__(f"Unknown region id(s): {', '.join(map(str, self.ids))}")
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def parse_region_ids(value, name='region_ids'):
+    """Return the distinct ids of ``value`` in first-seen order, or raise ValueError."""
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise ValueError(f'{name} must be a list of integers')
+    return list(dict.fromkeys(value))
+
+
+def check_region_ids(region_ids):
+    """Raise UnknownRegions unless every id in ``region_ids`` exists."""
+    wanted = set(region_ids)
+    found = set()
+    for batch in _batches(sorted(wanted)):
+        found.update(region_id for region_id, in db.session.query(Region.id).filter(Region.id.in_(batch)))
+    if wanted - found:
+        raise UnknownRegions(wanted - found)
+
+
+def _current_links(company_ids):
+    links = {company_id: set() for company_id in company_ids}
+    for batch in _batches(company_ids):
+        rows = db.session.query(company_region.c.company_id, company_region.c.region_id).filter(
+            company_region.c.company_id.in_(batch))
+        for company_id, region_id in rows:
+            links[company_id].add(region_id)
+    return links
+
+
+def set_company_regions(assignments, mode='replace'):
+    """Apply {company_id: region_ids}; returns (links added, links removed).
+
+    ``replace`` makes each company's links exactly ``region_ids``, ``add``
+    and ``remove`` only add or only remove them. The companies and regions
+    must exist (see check_region_ids).
+    """
+    if mode not in REGION_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(REGION_MODES)}")
+    if not assignments:
+        return 0, 0
+
+    current = _current_links(sorted(assignments))
+    added, removed = [], []
+    for company_id in sorted(assignments):
+        wanted, present = set(assignments[company_id]), current[company_id]
+        if mode != 'remove':
+            added += [{'company_id': company_id, 'region_id': r} for r in sorted(wanted - present)]
+        if mode == 'replace':
+            removed += [{'link_company_id': company_id, 'link_region_id': r} for r in sorted(present - wanted)]
+        elif mode == 'remove':
+            removed += [{'link_company_id': company_id, 'link_region_id': r} for r in sorted(present & wanted)]
+
+    if removed:
+        db.session.execute(company_region.delete().where(and_(
+            company_region.c.company_id == bindparam('link_company_id'),
+            company_region.c.region_id == bindparam('link_region_id'),
+        )), removed)
+    if added:
+        db.session.execute(company_region.insert(), added)
+    if added or removed:
+        mark_stale(db.session, *MODEL_NAMESPACES['Company'])
+    return len(added), len(removed)
@@ -0,0 +1,99 @@
+"""Content-Encoding negotiation for API responses.
+
+An after_request hook compresses response bodies of COMPRESS_MIN_SIZE
+bytes or more with the best encoding the client accepts: brotli when the
+optional ``brotli`` package is installed, else gzip. Small, streamed or
+already-encoded responses are left alone. Views can attach precomputed
+encodings as ``response.precompressed`` ({encoding: bytes}).
+cached_response does this, so a cached catalog is compressed once per
+cache fill rather than once per request.
+
+Compressed responses get a weak ETag, so revalidation against the cached
+identity ETag still yields 304s.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli  # optional dependency, only needed for 'br'
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html',
+}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.min_size = 500
+        self.levels = {'gzip': 6, 'br': 5}
+        self.precompress_levels = {'gzip': 9, 'br': 9}
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESS_ENABLED', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.levels = {
+            'gzip': app.config.get('COMPRESS_GZIP_LEVEL', 6),
+            'br': app.config.get('COMPRESS_BROTLI_QUALITY', 5),
+        }
+        if self.enabled:
+            app.after_request(self._after_request)
+        app.extensions['compression'] = self
+
+    def precompress(self, data):
+        """Every available encoding of ``data`` at the slower, denser levels."""
+        if not self.enabled or len(data) < self.min_size:
+            return {}
+        return {
+            encoding: compress(data, encoding, self.precompress_levels[encoding])
+            for encoding in available_encodings()
+        }
+
+    def negotiate(self, request):
+        encoding = request.accept_encodings.best_match(available_encodings())
+        return encoding if encoding in available_encodings() else None
+
+    def _after_request(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or not 200 <= response.status_code < 300 or response.status_code == 204
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate(request)
+        if encoding is None:
+            return response
+
+        precompressed = getattr(response, 'precompressed', None) or {}
+        data = precompressed.get(encoding)
+        if data is None:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            data = compress(body, encoding, self.levels[encoding])
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
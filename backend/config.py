@@ -3,10 +3,141 @@ import os
 # Get the absolute path to the backend directory
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+
+def _env_flag(name, default):
+    return os.environ.get(name, default) not in ('0', 'false', 'False', '')
+
+
+def _normalize_url(url):
+    # Some hosts still hand out the pre-SQLAlchemy-1.4 scheme
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _database_url():
+    # Defaults to the SQLite file inside the instance folder
+    return _normalize_url(os.environ.get('DATABASE_URL') or
+                          'sqlite:///' + os.path.join(basedir, 'instance', 'ecowaste.db'))
+
+
+def _replica_urls():
+    urls = os.environ.get('DATABASE_REPLICA_URLS', '')
+    return [_normalize_url(url.strip()) for url in urls.split(',') if url.strip()]
+
+
+def _engine_options(url):
+    options = {'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', '1')}
+    # SQLite connections are cheap and SQLAlchemy picks its own pool for them
+    if not url.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        })
+    return options
+
+
+def _sqlite_pragmas():
+    if not _env_flag('SQLITE_TUNED', '1'):
+        return {}
+    return {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'super-secret-key'
     
-    # Point to the correct SQLite file inside the instance folder
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'instance', 'ecowaste.db')
+    # SQLite by default; set DATABASE_URL for PostgreSQL
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Read replicas (see replicas.py): comma-separated DATABASE_REPLICA_URLS;
+    # none keeps every query on the primary
+    SQLALCHEMY_REPLICA_URIS = _replica_urls()
+    SQLALCHEMY_REPLICA_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_REPLICA_URIS[0]) if SQLALCHEMY_REPLICA_URIS else {}
+    # After a write, the client's requests stay on the primary this long; keep it above the replica lag
+    DB_STICKY_SECONDS = float(os.environ.get('DB_STICKY_SECONDS', 5))
+    DB_STICKY_COOKIE = os.environ.get('DB_STICKY_COOKIE', 'db_primary_until')
+    DB_STICKY_MAX_CLIENTS = int(os.environ.get('DB_STICKY_MAX_CLIENTS', 10000))
+    DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5))  # 0 disables checks
+    DB_REPLICA_HEALTH_QUERY = os.environ.get('DB_REPLICA_HEALTH_QUERY', 'SELECT 1')
+
+    # Applied on every new SQLite connection (see database.py)
+    SQLITE_PRAGMAS = _sqlite_pragmas()
+
+    # The schema is managed with `flask db upgrade`. db.create_all() builds an
+    # unversioned schema that migrations cannot upgrade, for throwaway
+    # databases such as the tests'
+    AUTO_CREATE_TABLES = _env_flag('AUTO_CREATE_TABLES', '0')
+
+    # Response cache for the public region/company catalogs
+    CACHE_ENABLED = _env_flag('CACHE_ENABLED', '1')
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # 'memory' or 'redis'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+
+    # Verified JWT principals cached by token_required
+    AUTH_CACHE_ENABLED = _env_flag('AUTH_CACHE_ENABLED', '1')
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 60))
+    AUTH_CACHE_NEGATIVE_TTL = int(os.environ.get('AUTH_CACHE_NEGATIVE_TTL', 10))
+    AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 4096))
+
+    # Service request routing (see dispatch.py)
+    DISPATCH_BACKEND = os.environ.get('DISPATCH_BACKEND', 'thread')  # 'thread' or 'sync'
+    DISPATCH_WORKERS = int(os.environ.get('DISPATCH_WORKERS', 2))
+    DISPATCH_BATCH_SIZE = int(os.environ.get('DISPATCH_BATCH_SIZE', 100))
+    DISPATCH_QUEUE_SIZE = int(os.environ.get('DISPATCH_QUEUE_SIZE', 10000))
+
+    # Closed service requests older than this move to the archive table
+    # (`flask archive-requests`, see archive.py); archived ones older than
+    # the retention period are purged, 0 keeps them forever
+    SERVICE_REQUEST_ARCHIVE_DAYS = int(os.environ.get('SERVICE_REQUEST_ARCHIVE_DAYS', 90))
+    SERVICE_REQUEST_ARCHIVE_BATCH_SIZE = int(os.environ.get('SERVICE_REQUEST_ARCHIVE_BATCH_SIZE', 1000))
+    SERVICE_REQUEST_RETENTION_DAYS = int(os.environ.get('SERVICE_REQUEST_RETENTION_DAYS', 0))
+
+    # Per-request metrics served at /metrics (see instrumentation.py)
+    METRICS_ENABLED = _env_flag('METRICS_ENABLED', '1')
+    METRICS_PATH = os.environ.get('METRICS_PATH', '/metrics')
+    METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+    # Sampling profiler: requests slower than this many ms dump collapsed stacks; 0 disables it
+    PROFILE_SLOW_REQUEST_MS = int(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'instance', 'profiles'))
+
+    # 'auto' uses orjson when it is installed (see json_provider.py)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')  # 'auto', 'orjson' or 'stdlib'
+
+    # Response compression (see compression.py); brotli needs the optional `brotli` package
+    COMPRESS_ENABLED = _env_flag('COMPRESS_ENABLED', '1')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+    # Largest batch accepted by the admin /bulk endpoints (see admin_bulk.py)
+    ADMIN_BULK_MAX_ITEMS = int(os.environ.get('ADMIN_BULK_MAX_ITEMS', 1000))
+
+    # Password hashing pool for the auth routes (see passwords.py); existing
+    # hashes made with other parameters are upgraded at login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 260000))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0 hashes inline
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 16))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    PASSWORD_HASH_NICE = int(os.environ.get('PASSWORD_HASH_NICE', 10))  # worker thread niceness (Linux)
+
+    # Token buckets on login/register, "<tokens>/<seconds>" (see ratelimit.py)
+    RATELIMIT_ENABLED = _env_flag('RATELIMIT_ENABLED', '1')
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'memory')  # 'memory' or 'redis'
+    RATELIMIT_REDIS_URL = os.environ.get('RATELIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    RATELIMIT_MAX_KEYS = int(os.environ.get('RATELIMIT_MAX_KEYS', 100000))
+    RATELIMIT_AUTH_PER_IP = os.environ.get('RATELIMIT_AUTH_PER_IP', '30/60')
+    RATELIMIT_AUTH_PER_ACCOUNT = os.environ.get('RATELIMIT_AUTH_PER_ACCOUNT', '10/300')
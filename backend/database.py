@@ -0,0 +1,79 @@
+import logging
+
+import click
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask import current_app
+from sqlalchemy import event
+
+from extensions import db
+from geo import register_sqlite_functions
+from replicas import db_router
+
+logger = logging.getLogger(__name__)
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+
+def _configure_sqlite_engine(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def configure_sqlite_connection(dbapi_connection, connection_record):
+        if pragmas:
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+        register_sqlite_functions(dbapi_connection)
+
+
+def init_database(app):
+    """Register the configured SQLite pragmas, and the SQL functions the
+    geo.py triggers need, on every new connection of the primary and of
+    SQLite replicas."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        engine = db.engine
+
+    if engine.url.get_backend_name() == 'sqlite':
+        _configure_sqlite_engine(engine, pragmas)
+    # The journal mode belongs to the database file, which replicas only read
+    replica_pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    for replica in db_router.engines:
+        if replica.url.get_backend_name() == 'sqlite':
+            _configure_sqlite_engine(replica, replica_pragmas)
+
+
+def _running_migrations():
+    """True inside a `flask db ...` command, where Alembic owns the schema."""
+    ctx = click.get_current_context(silent=True)
+    while ctx is not None:
+        if ctx.info_name == 'db':
+            return True
+        ctx = ctx.parent
+    return False
+
+
+def check_schema_version():
+    """Log a warning unless the database is at the latest migration."""
+    config = current_app.extensions['migrate'].migrate.get_config()
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    with db.engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    if current != heads:
+        logger.warning('Database schema is at revision %s, the latest is %s: run `flask db upgrade`',
+                       ', '.join(sorted(current)) or 'none', ', '.join(sorted(heads)))
+
+
+def init_schema(app):
+    """Build a throwaway schema with db.create_all() if AUTO_CREATE_TABLES is
+    set; otherwise `flask db upgrade` manages it, and serving a database it
+    has not brought up to date logs a warning."""
+    if _running_migrations():
+        return
+    if app.config['AUTO_CREATE_TABLES']:
+        with app.app_context():
+            db.create_all()
+    else:
+        app.before_first_request(check_schema_version)
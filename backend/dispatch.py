@@ -0,0 +1,298 @@
+"""Asynchronous routing of new service requests to companies.
+
+Intake only inserts rows with status 'queued' and hands their ids to the
+dispatcher, so submission latency does not depend on matching or
+notification. Each batch of ids is matched to the least loaded company
+serving the request's region with a few set-based queries and a single
+executemany UPDATE, then the notifiers run after the commit.
+
+The queue has two backends: 'thread' (an in-process queue drained by a pool
+of worker threads) and 'sync' (route inline, for the CLI and tests). The
+row, not the queue entry, is the source of truth. Anything still 'queued'
+after a restart or a full queue is routed by `flask dispatch-requests`.
+"""
+import heapq
+import logging
+import queue
+import threading
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, func, select
+
+from extensions import db
+from models import ServiceRequest, company_region
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+PENDING = 'pending'
+UNMATCHED = 'unmatched'
+# Statuses that count towards a company's current workload
+OPEN_STATUSES = ('pending', 'accepted')
+
+
+# -----------------------------------
+# Matching
+# -----------------------------------
+def _region_candidates(region_ids):
+    rows = db.session.query(
+        company_region.c.region_id, company_region.c.company_id
+    ).filter(company_region.c.region_id.in_(region_ids))
+    candidates = {}
+    for region_id, company_id in rows:
+        candidates.setdefault(region_id, []).append(company_id)
+    return candidates
+
+
+def _open_workload(region_ids):
+    serving = select([company_region.c.company_id]).where(company_region.c.region_id.in_(region_ids))
+    rows = db.session.query(
+        ServiceRequest.company_id, func.count()
+    ).filter(
+        ServiceRequest.company_id.in_(serving),
+        ServiceRequest.status.in_(OPEN_STATUSES)
+    ).group_by(ServiceRequest.company_id)
+    return dict(rows)
+
+
+def _least_loaded(heap, workload):
+    # A company serving several regions sits in several heaps, so an entry
+    # goes stale when another region's request is assigned to it
+    while heap:
+        load, company_id = heapq.heappop(heap)
+        current = workload.get(company_id, 0)
+        if load == current:
+            return company_id
+        heapq.heappush(heap, (current, company_id))
+    return None
+
+
+def route_requests(ids):
+    """Assign queued requests to companies; returns {company_id: [request ids]}.
+
+    Requests whose region has no company become 'unmatched'. The caller
+    commits.
+    """
+    waiting = db.session.query(
+        ServiceRequest.id, ServiceRequest.region_id
+    ).filter(
+        ServiceRequest.id.in_(ids), ServiceRequest.status == QUEUED
+    ).order_by(ServiceRequest.id).all()
+    if not waiting:
+        return {}
+
+    region_ids = {region_id for _, region_id in waiting if region_id is not None}
+    candidates = _region_candidates(region_ids) if region_ids else {}
+    workload = _open_workload(region_ids) if region_ids else {}
+
+    heaps, assignments, unmatched = {}, {}, []
+    for request_id, region_id in waiting:
+        heap = heaps.get(region_id)
+        if heap is None:
+            heap = heaps[region_id] = [(workload.get(c, 0), c) for c in candidates.get(region_id, ())]
+            heapq.heapify(heap)
+        company_id = _least_loaded(heap, workload)
+        if company_id is None:
+            unmatched.append(request_id)
+            continue
+        workload[company_id] = workload.get(company_id, 0) + 1
+        heapq.heappush(heap, (workload[company_id], company_id))
+        assignments.setdefault(company_id, []).append(request_id)
+
+    table = ServiceRequest.__table__
+    if assignments:
+        # The status guard makes routing the same id twice harmless
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam('request_id'))
+            .where(table.c.status == QUEUED)
+            .values(company_id=bindparam('assigned_company'), status=PENDING),
+            [
+                {'request_id': request_id, 'assigned_company': company_id}
+                for company_id, request_ids in assignments.items()
+                for request_id in request_ids
+            ]
+        )
+    if unmatched:
+        db.session.execute(
+            table.update()
+            .where(table.c.id.in_(unmatched))
+            .where(table.c.status == QUEUED)
+            .values(status=UNMATCHED)
+        )
+    return assignments
+
+
+def log_assignments(assignments):
+    for company_id, request_ids in assignments.items():
+        logger.info('Company %s was assigned service request(s) %s', company_id, request_ids)
+
+
+# -----------------------------------
+# Queue backends
+# -----------------------------------
+class InProcessQueue:
+    """Bounded queue drained by a pool of daemon worker threads.
+
+    Workers start on the first ``put`` (after any pre-fork). Each worker takes
+    up to ``batch_size`` ids per round, so a burst of single submissions is
+    still routed with a few statements.
+    """
+
+    def __init__(self, handler, workers=2, batch_size=100, max_size=10000):
+        self.handler = handler
+        self.workers = workers
+        self.batch_size = batch_size
+        self._queue = queue.Queue(max_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def put(self, ids):
+        """Enqueue ids without blocking; returns False if the queue is full."""
+        self._start()
+        try:
+            for request_id in ids:
+                self._queue.put_nowait(request_id)
+        except queue.Full:
+            return False
+        return True
+
+    def join(self):
+        """Block until every enqueued id has been handled."""
+        self._queue.join()
+
+    def size(self):
+        return self._queue.qsize()
+
+    def _start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'dispatch-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.handler(batch)
+            except Exception:
+                logger.exception('Dispatching %d service request(s) failed', len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+class SynchronousQueue:
+    """Routes ids immediately, in the caller's application context."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def put(self, ids):
+        self.handler(list(ids))
+        return True
+
+    def join(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+# -----------------------------------
+# Flask extension
+# -----------------------------------
+class Dispatcher:
+    """Hands committed service requests to the configured queue backend.
+
+    ``notifiers`` are called with the {company_id: [request ids]} of every
+    routed batch after it is committed; failures are logged and ignored.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self.notifiers = [log_assignments]
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        backend = app.config.get('DISPATCH_BACKEND', 'thread')
+        if backend == 'thread':
+            self.backend = InProcessQueue(
+                self._dispatch_in_context,
+                workers=app.config.get('DISPATCH_WORKERS', 2),
+                batch_size=app.config.get('DISPATCH_BATCH_SIZE', 100),
+                max_size=app.config.get('DISPATCH_QUEUE_SIZE', 10000),
+            )
+        elif backend == 'sync':
+            self.backend = SynchronousQueue(self.dispatch)
+        else:
+            raise ValueError(f'Unknown DISPATCH_BACKEND: {backend}')
+        app.extensions['dispatcher'] = self
+
+    def submit(self, ids):
+        """Queue newly committed request ids for routing."""
+        if ids and not self.backend.put(ids):
+            logger.warning('Dispatch queue is full; %d request(s) wait for `flask dispatch-requests`', len(ids))
+
+    def dispatch(self, ids):
+        """Route ``ids`` in the current application context and notify companies."""
+        try:
+            assignments = route_requests(ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for notify in self.notifiers:
+            try:
+                notify(assignments)
+            except Exception:
+                logger.exception('Service request notifier %r failed', notify)
+        return assignments
+
+    def join(self):
+        self.backend.join()
+
+    def _dispatch_in_context(self, ids):
+        with self.app.app_context():
+            self.dispatch(ids)
+
+
+dispatcher = Dispatcher()
+
+
+@click.command('dispatch-requests')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--retry-unmatched', is_flag=True, help='Also retry requests no company served before.')
+@with_appcontext
+def dispatch_requests_command(batch_size, retry_unmatched):
+    """Route service requests still queued in the database."""
+    if retry_unmatched:
+        ServiceRequest.query.filter_by(status=UNMATCHED).update({'status': QUEUED}, synchronize_session=False)
+        db.session.commit()
+
+    routed = total = last_id = 0
+    while True:
+        ids = [request_id for request_id, in db.session.query(ServiceRequest.id).filter(
+            ServiceRequest.status == QUEUED, ServiceRequest.id > last_id
+        ).order_by(ServiceRequest.id).limit(batch_size)]
+        if not ids:
+            break
+        last_id = ids[-1]
+        assignments = dispatcher.dispatch(ids)
+        routed += sum(len(request_ids) for request_ids in assignments.values())
+        total += len(ids)
+    click.echo(f'Routed {routed} of {total} queued request(s); {total - routed} unmatched.')
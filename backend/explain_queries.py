@@ -0,0 +1,214 @@
+"""Run EXPLAIN QUERY PLAN over every statement the API routes issue.
+
+Builds a throwaway SQLite database from the models, seeds a small dataset,
+drives each probe below through the Flask test client and explains every
+statement it executed. Exits non-zero if any statement falls back to a full
+table scan on a table the probe is not explicitly allowed to scan.
+
+    python explain_queries.py [-v]
+"""
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+
+import jwt
+from sqlalchemy import event
+
+import config
+
+# (method, path, role, json body, tables the route may legitimately scan)
+PROBES = [
+    # Full catalog listings read every row by design
+    ('GET', '/api/regions', None, None, {'region'}),
+    ('GET', '/api/companies', None, None, {'company'}),
+    ('GET', '/api/companies?region=1', None, None, set()),
+    # First page in rowid order stops after LIMIT rows
+    ('GET', '/api/companies?limit=10', None, None, {'company'}),
+    ('GET', '/api/companies?limit=10&cursor={cursor}', None, None, set()),
+    ('GET', '/api/companies?limit=10&sort=name', None, None, set()),
+    ('GET', '/api/companies?limit=10&sort=-name&cursor={name_cursor}', None, None, set()),
+    ('GET', '/api/companies?limit=10&sort=-email', None, None, set()),
+    ('GET', '/api/companies?limit=10&region=2&sort=name', None, None, set()),
+    # Case-insensitive prefix/substring matching cannot use a b-tree index
+    ('GET', '/api/companies?limit=10&name=Co', None, None, {'company'}),
+    ('GET', '/api/companies?limit=10&q=compost', None, None, {'company'}),
+    ('GET', '/api/companies/search?q=compost&limit=10', None, None, set()),
+    ('GET', '/api/companies/search?q=e-waste+region&region=2&limit=10', None, None, set()),
+    ('GET', '/api/companies/nearby?lat=0.5&lon=36.5&limit=10', None, None, set()),
+    ('GET', '/api/companies/nearby?lat=0.5&lon=36.5&serving=true&region=2&limit=10', None, None, set()),
+    ('GET', '/api/admin/regions', 'admin', None, {'region'}),
+    ('GET', '/api/admin/companies', 'admin', None, {'company'}),
+    ('GET', '/api/admin/companies?limit=10&sort=name', 'admin', None, set()),
+    # Moderation queue: rowid order, stops after LIMIT rows
+    ('GET', '/api/admin/companies?limit=10&approved=false', 'admin', None, {'company'}),
+    # Summary tables are O(counters + regions + days) by construction
+    ('GET', '/api/admin/stats?trend=week', 'admin', None, {'stat_counter', 'region_stats'}),
+    ('GET', '/api/companies/profile', 'company', None, set()),
+    ('PUT', '/api/companies/profile', 'company', {'name': 'Renamed', 'region_ids': [1, 2, 3]}, set()),
+    # Large region lists: see STATEMENT_BUDGETS
+    ('POST', '/api/admin/regions/bulk', 'admin', {'names': [f'Region {i}' for i in range(10, 1000)]}, set()),
+    ('PUT', '/api/companies/profile', 'company', {'region_ids': list(range(1, 1001))}, set()),
+    ('PUT', '/api/companies/profile', 'company', {'region_ids': list(range(400, 1001))}, set()),
+    ('PUT', '/api/admin/companies/2', 'admin', {'region_ids': list(range(1, 1001, 2))}, set()),
+    ('PUT', '/api/admin/regions/3', 'admin', {'name': 'Renamed region'}, set()),
+    # Intake plus inline routing (DISPATCH_BACKEND=sync below)
+    ('POST', '/api/service-requests', None,
+     [{'description': 'Skip pickup', 'region_id': 2, 'contact_email': 'a@example.com'}] * 3, set()),
+    ('GET', '/api/service-requests?limit=10', 'company', None, set()),
+    ('GET', '/api/service-requests?limit=10&status=pending', 'company', None, set()),
+    ('GET', '/api/service-requests?limit=10&status=completed&from=2019-01-01', 'company', None, set()),
+    ('PATCH', '/api/service-requests/status', 'company', {'ids': [6, 7, 8], 'status': 'accepted'}, set()),
+    # Streaming exports; a full export reads every row by design
+    ('GET', '/api/admin/export/companies', 'admin', None, {'company'}),
+    ('GET', '/api/admin/export/companies?region=2&format=csv', 'admin', None, set()),
+    ('GET', '/api/admin/export/regions', 'admin', None, {'region'}),
+    ('GET', '/api/admin/export/service-requests?status=pending&from=2020-01-01&to=2030-12-31', 'admin', None, set()),
+    ('GET', '/api/admin/export/service-requests?status=completed&from=2019-01-01&to=2030-12-31', 'admin', None, set()),
+    # Bulk admin operations; destructive ones last
+    ('POST', '/api/admin/companies/bulk/approve', 'admin', {'ids': [1, 2, 3]}, set()),
+    ('PATCH', '/api/admin/companies/bulk', 'admin',
+     {'items': [{'id': 1, 'name': 'Bulk 1'}, {'id': 2, 'name': 'Bulk 2', 'approved': False}]}, set()),
+    ('PUT', '/api/admin/companies/bulk/regions', 'admin', {'ids': [4, 5], 'region_ids': [1, 2]}, set()),
+    ('POST', '/api/admin/regions/bulk', 'admin', {'names': ['Bulk region A', 'Bulk region B']}, set()),
+    ('PATCH', '/api/admin/regions/bulk', 'admin', {'items': [{'id': 4, 'name': 'Bulk renamed'}]}, set()),
+    ('DELETE', '/api/admin/companies/bulk', 'admin', {'ids': [6, 7]}, set()),
+    ('DELETE', '/api/admin/regions/bulk', 'admin', {'ids': [5]}, set()),
+]
+
+# Most statements a probe on (method, path) may issue, whatever its payload
+# size; executemany calls count once
+STATEMENT_BUDGETS = {
+    ('PUT', '/api/companies/profile'): 10,
+    ('PUT', '/api/admin/companies/2'): 10,
+    ('POST', '/api/admin/regions/bulk'): 5,
+}
+
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def scanned_table(detail):
+    """Return the table a plan step fully scans, or None if it uses an index."""
+    match = SCAN_RE.match(detail)
+    if not match:
+        return None
+    return re.sub(r'_\d+$', '', match.group(1))
+
+
+def seed(db, n_companies=200, n_regions=10):
+    from models import User, Company, Region, ServiceRequest
+    from archive import archive_requests
+
+    regions = [Region(name=f'Region {i}') for i in range(n_regions)]
+    db.session.add_all(regions)
+    db.session.add(User(email='admin@example.com', password='x', role='admin'))
+    for i in range(n_companies):
+        user = User(email=f'company{i}@example.com', password='x', role='company')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Company(
+            user_id=user.id,
+            name=f'Company {i:04d}',
+            phone='0700000000',
+            email=f'company{i}@example.com',
+            description='composting and recycling' if i % 2 else 'e-waste collection',
+            regions=[regions[i % n_regions], regions[(i + 3) % n_regions]],
+            latitude=(i % 20) * 0.1,
+            longitude=36 + (i // 20) * 0.1,
+            service_radius_km=5 + i % 30,
+        ))
+    db.session.commit()
+
+    # Archived history (ids 1-5), so the service request probes read the archive too
+    db.session.add_all([
+        ServiceRequest(description='Old pickup', status='completed', timestamp=datetime(2020, 1, day),
+                       company_id=1, region_id=1)
+        for day in range(1, 6)
+    ])
+    db.session.commit()
+    archive_requests(datetime(2021, 1, 1))
+
+
+def main(verbose=False):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+    config.Config.AUTO_CREATE_TABLES = True
+    config.Config.CACHE_ENABLED = False
+    config.Config.AUTH_CACHE_ENABLED = False
+    config.Config.DISPATCH_BACKEND = 'sync'
+
+    from app import create_app
+    from extensions import db
+    from models import User
+
+    app = create_app()
+    failures = 0
+    try:
+        with app.app_context():
+            seed(db)
+            secret = app.config['SECRET_KEY']
+            tokens = {
+                role: jwt.encode({'user_id': User.query.filter_by(role=role).first().id},
+                                 secret, algorithm='HS256')
+                for role in ('admin', 'company')
+            }
+            db.session.remove()
+
+            statements = []
+
+            def capture(conn, cursor, statement, parameters, context, executemany):
+                if not statement.lstrip().upper().startswith(('PRAGMA', 'EXPLAIN')):
+                    statements.append((statement, parameters, executemany))
+
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            client = app.test_client()
+            cursor_token = client.get('/api/companies?limit=10').get_json()['nextCursor']
+            name_cursor = client.get('/api/companies?limit=10&sort=-name').get_json()['nextCursor']
+
+            for method, url, role, body, allowed in PROBES:
+                url = url.format(cursor=cursor_token, name_cursor=name_cursor)
+                headers = {'Authorization': f'Bearer {tokens[role]}'} if role else {}
+                statements.clear()
+                response = client.open(url, method=method, headers=headers, json=body)
+                response.get_data()  # streamed responses query while the body is read
+                issued = list(statements)
+                print(f'{method} {url} -> {response.status_code}, {len(issued)} statement(s)')
+                if response.status_code >= 400:
+                    print(f'  FAIL: unexpected status {response.status_code}')
+                    failures += 1
+                budget = STATEMENT_BUDGETS.get((method, url))
+                if budget is not None and len(issued) > budget:
+                    print(f'  FAIL: {len(issued)} statements, budget {budget}')
+                    failures += 1
+
+                raw = db.engine.raw_connection()
+                try:
+                    for statement, parameters, executemany in issued:
+                        if executemany:
+                            continue  # EXPLAIN takes a single parameter set
+                        plan = raw.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+                        details = [row[3] for row in plan]
+                        scans = {scanned_table(d) for d in details} - {None}
+                        bad = scans - allowed
+                        if bad or verbose:
+                            print('  ' + ' '.join(statement.split())[:160])
+                            for detail in details:
+                                print('    ' + detail)
+                        if bad:
+                            print(f"  FAIL: full scan of {', '.join(sorted(bad))}")
+                            failures += 1
+                finally:
+                    raw.close()
+
+            event.remove(db.engine, 'before_cursor_execute', capture)
+    finally:
+        os.unlink(path)
+
+    print(f'{failures} failure(s)')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(verbose='-v' in sys.argv))
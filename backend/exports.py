@@ -0,0 +1,178 @@
+"""Streaming NDJSON/CSV exports for the admin reporting endpoints.
+
+Rows are read with ``yield_per`` (a server-side cursor on PostgreSQL) and
+encoded chunk by chunk into a generator response, optionally gzip
+compressed on the fly. Only one chunk of rows is in memory at a time,
+whatever the table size. Company CSV uses the same columns as
+`flask import-companies`, so an export can be re-imported.
+"""
+import csv
+import io
+import itertools
+import zlib
+from datetime import datetime, timedelta
+
+from flask import Response, stream_with_context
+
+from helpers import load_company_regions
+from json_provider import dumps
+
+EXPORT_CHUNK_SIZE = 1000
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    """Raised for malformed export query parameters."""
+
+
+# -----------------------------------
+# Query parameter parsing
+# -----------------------------------
+def parse_format(args):
+    fmt = args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(FORMATS)}")
+    return fmt
+
+
+def parse_date(args, name):
+    """Parse an ISO 8601 date or datetime; a bare date means midnight."""
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'{name} must be an ISO 8601 date or datetime')
+
+
+def parse_date_range(args):
+    """Return (start, end) for `from` (inclusive) and `to` (inclusive day or instant)."""
+    start, end = parse_date(args, 'from'), parse_date(args, 'to')
+    if end is not None and len(args['to']) == 10:
+        # `to=2024-05-31` covers the whole day
+        end += timedelta(days=1)
+    elif end is not None:
+        end += timedelta(microseconds=1)
+    return start, end
+
+
+def wants_gzip(args, accept_encodings):
+    flag = args.get('gzip')
+    if flag is not None:
+        return flag not in ('0', 'false', '')
+    return 'gzip' in accept_encodings
+
+
+# -----------------------------------
+# Encoding
+# -----------------------------------
+def chunked(rows, size=EXPORT_CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def encode_ndjson(chunks):
+    for records in chunks:
+        yield ''.join(dumps(record) + '\n' for record in records)
+
+
+def encode_csv(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for records in chunks:
+        writer.writerows([record[column] for column in columns] for record in records)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_stream(pieces, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(name, fmt, records, columns, gzip=False):
+    """Stream ``records`` (an iterable of chunks of dicts) as a download."""
+    if fmt == 'csv':
+        body = encode_csv(records, columns)
+    else:
+        body = encode_ndjson(records)
+    filename = f"{name}-{datetime.utcnow():%Y%m%d}.{fmt}"
+
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Vary': 'Accept-Encoding'}
+    if gzip:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        body = (piece.encode('utf-8') for piece in body)
+    return Response(stream_with_context(body), mimetype=FORMATS[fmt], headers=headers)
+
+
+# -----------------------------------
+# Record builders
+# -----------------------------------
+COMPANY_EXPORT_COLUMNS = ('id', 'name', 'email', 'phone', 'description', 'regions',
+                          'latitude', 'longitude', 'service_radius_km')
+REGION_EXPORT_COLUMNS = ('id', 'name', 'latitude', 'longitude')
+SERVICE_REQUEST_EXPORT_COLUMNS = ('id', 'description', 'status', 'timestamp', 'regionId', 'companyId',
+                                  'contactName', 'contactEmail', 'contactPhone')
+
+
+def company_records(rows, fmt):
+    """Chunks of company dicts; regions are fetched once per chunk."""
+    for chunk in chunked(rows):
+        regions = load_company_regions([row.id for row in chunk])
+        records = []
+        for row in chunk:
+            names = [region['name'] for region in regions[row.id]]
+            records.append({
+                'id': row.id,
+                'name': row.name,
+                'email': row.email,
+                'phone': row.phone,
+                'description': row.description,
+                'regions': ';'.join(names) if fmt == 'csv' else names,
+                'latitude': row.latitude,
+                'longitude': row.longitude,
+                'service_radius_km': row.service_radius_km,
+            })
+        yield records
+
+
+def region_records(rows):
+    for chunk in chunked(rows):
+        yield [{'id': row.id, 'name': row.name, 'latitude': row.latitude, 'longitude': row.longitude}
+               for row in chunk]
+
+
+def service_request_records(rows):
+    for chunk in chunked(rows):
+        yield [
+            {
+                'id': row.id,
+                'description': row.description,
+                'status': row.status,
+                'timestamp': row.timestamp.isoformat() if row.timestamp else None,
+                'regionId': row.region_id,
+                'companyId': row.company_id,
+                'contactName': row.contact_name,
+                'contactEmail': row.contact_email,
+                'contactPhone': row.contact_phone,
+            }
+            for row in chunk
+        ]
@@ -1,12 +1,26 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import orm
 from flask_login import LoginManager
+from flask_migrate import Migrate
 from flask_cors import CORS
+from cache import cache
+from replicas import RoutingSession, db_router
 
-db = SQLAlchemy()
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    # Sends read-only requests to replicas when any are configured
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+db = RoutingSQLAlchemy()
 login_manager = LoginManager()
+migrate = Migrate()
 
 def init_extensions(app):
     db.init_app(app)
+    db_router.init_app(app)
+    migrate.init_app(app, db, render_as_batch=True)
     login_manager.init_app(app)
-    login_manager.init_app(app)
+    cache.init_app(app)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
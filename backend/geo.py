@@ -0,0 +1,344 @@
+"""Company locations, service areas and nearest-company lookups.
+
+A company may have a location (``latitude``/``longitude``) and a service
+radius (``service_radius_km``). Regions carry a centre point. Two spatial
+indexes answer the lookups without scanning every company:
+- points, for "nearest companies" and "companies within a radius"
+- the bounding box of each service area, for "companies serving this point"
+
+SQLite uses R*Tree virtual tables (``company_location`` and
+``company_service_area``, id = company id), kept in sync by triggers.
+PostgreSQL uses GiST expression indexes on the company table. The DDL is
+installed by migration 0007 and, when db.create_all() creates the company
+table, by the metadata after_create hook below.
+
+An index lookup only returns candidates inside a bounding box. The exact
+great-circle distance then decides, so results are correct near the poles
+and across the antimeridian.
+"""
+import hashlib
+import math
+
+from sqlalchemy import event, text
+
+from extensions import db
+from pagination import PaginationError, parse_limit, encode_cursor, decode_cursor
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Half the circumference: a circle this large covers the whole Earth
+MAX_RADIUS_KM = math.pi * EARTH_RADIUS_KM
+# The nearest-company search starts with this radius and widens it, by
+# 2x to 16x per step, until it has a full page
+INITIAL_SEARCH_KM = 10.0
+MIN_SEARCH_GROWTH, MAX_SEARCH_GROWTH = 2, 16
+# Query boxes are padded slightly so rounding never drops a point on the edge
+BOX_PADDING = 1e-6
+
+GEO_FIELDS = ('latitude', 'longitude', 'service_radius_km')
+
+
+def _half_width_sql(latitude, radius):
+    """Longitude half-width, in degrees, of the box around a circle (SQL)."""
+    return (
+        f"(CASE WHEN abs({latitude}) + {radius} / {KM_PER_DEGREE!r} >= 90 "
+        f"OR sin({radius} / {EARTH_RADIUS_KM!r}) >= cos(radians({latitude})) THEN 180.0 "
+        f"ELSE degrees(asin(sin({radius} / {EARTH_RADIUS_KM!r}) / cos(radians({latitude})))) END)"
+    )
+
+
+_HALF_HEIGHT = f"(service_radius_km / {KM_PER_DEGREE!r})"
+_HALF_WIDTH = _half_width_sql('latitude', 'service_radius_km')
+
+_SQLITE_LOCATION = (
+    "INSERT INTO company_location (id, min_lat, max_lat, min_lon, max_lon) "
+    "SELECT id, latitude, latitude, longitude, longitude FROM company "
+    "WHERE {where} AND latitude IS NOT NULL AND longitude IS NOT NULL"
+)
+# Longitudes may run past +-180; lookups also probe the point shifted by 360
+_SQLITE_SERVICE_AREA = (
+    "INSERT INTO company_service_area (id, min_lat, max_lat, min_lon, max_lon) "
+    f"SELECT id, latitude - {_HALF_HEIGHT}, latitude + {_HALF_HEIGHT}, "
+    f"longitude - {_HALF_WIDTH}, longitude + {_HALF_WIDTH} FROM company "
+    "WHERE {where} AND latitude IS NOT NULL AND longitude IS NOT NULL AND service_radius_km IS NOT NULL"
+)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS company_location USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS company_service_area USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    "CREATE TRIGGER IF NOT EXISTS company_geo_company_ai AFTER INSERT ON company "
+    "WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+    f"{_SQLITE_LOCATION.format(where='id = new.id')}; "
+    f"{_SQLITE_SERVICE_AREA.format(where='id = new.id')}; END",
+    "CREATE TRIGGER IF NOT EXISTS company_geo_company_au "
+    "AFTER UPDATE OF latitude, longitude, service_radius_km ON company BEGIN "
+    "DELETE FROM company_location WHERE id = old.id; "
+    "DELETE FROM company_service_area WHERE id = old.id; "
+    f"{_SQLITE_LOCATION.format(where='id = new.id')}; "
+    f"{_SQLITE_SERVICE_AREA.format(where='id = new.id')}; END",
+    "CREATE TRIGGER IF NOT EXISTS company_geo_company_ad AFTER DELETE ON company BEGIN "
+    "DELETE FROM company_location WHERE id = old.id; "
+    "DELETE FROM company_service_area WHERE id = old.id; END",
+    # Backfill companies that predate the index
+    _SQLITE_LOCATION.format(where='id NOT IN (SELECT id FROM company_location)'),
+    _SQLITE_SERVICE_AREA.format(where='id NOT IN (SELECT id FROM company_service_area)'),
+]
+
+_POSTGRESQL_POINT = "point(longitude, latitude)"
+_POSTGRESQL_SERVICE_AREA = (
+    f"box(point(longitude - {_HALF_WIDTH}, latitude - {_HALF_HEIGHT}), "
+    f"point(longitude + {_HALF_WIDTH}, latitude + {_HALF_HEIGHT}))"
+)
+_LOCATED = "latitude IS NOT NULL AND longitude IS NOT NULL"
+_SERVED = f"{_LOCATED} AND service_radius_km IS NOT NULL"
+
+POSTGRESQL_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_company_location ON company USING GIST (({_POSTGRESQL_POINT})) "
+    f"WHERE {_LOCATED}",
+    f"CREATE INDEX IF NOT EXISTS ix_company_service_area ON company USING GIST (({_POSTGRESQL_SERVICE_AREA})) "
+    f"WHERE {_SERVED}",
+]
+
+DDL = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRESQL_DDL}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def install_geo_index(target, connection, tables=(), **kw):
+    # An existing company table predates the location columns until migration
+    # 0007 adds them, together with this DDL
+    if 'company' not in {table.name for table in tables}:
+        return
+    for statement in DDL.get(connection.dialect.name, []):
+        connection.execute(text(statement))
+
+
+def register_sqlite_functions(dbapi_connection):
+    """Provide the math functions the triggers use on SQLite builds without them."""
+    try:
+        dbapi_connection.execute('SELECT asin(0), degrees(0), radians(0), sin(0), cos(0)')
+        return
+    except Exception:
+        pass
+    for name, fn in (('asin', math.asin), ('degrees', math.degrees), ('radians', math.radians),
+                     ('sin', math.sin), ('cos', math.cos)):
+        dbapi_connection.create_function(name, 1, fn, deterministic=True)
+
+
+# -----------------------------------
+# Geometry
+# -----------------------------------
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_boxes(lat, lon, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) boxes covering a circle.
+
+    A circle crossing the antimeridian gives two boxes, one reaching a pole
+    spans every longitude.
+    """
+    half_height = radius_km / KM_PER_DEGREE + BOX_PADDING
+    min_lat, max_lat = max(-90.0, lat - half_height), min(90.0, lat + half_height)
+    angle = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi / 2))
+    if abs(lat) + half_height >= 90 or angle >= math.cos(math.radians(lat)):
+        return [(min_lat, max_lat, -180.0, 180.0)]
+
+    half_width = math.degrees(math.asin(angle / math.cos(math.radians(lat)))) + BOX_PADDING
+    min_lon, max_lon = lon - half_width, lon + half_width
+    if min_lon < -180:
+        return [(min_lat, max_lat, min_lon + 360, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+
+# -----------------------------------
+# Input parsing
+# -----------------------------------
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError
+    return number
+
+
+def parse_location(data, with_radius=True):
+    """Return ({column: value}, error message) for the location fields in ``data``.
+
+    latitude and longitude are set together; null clears a field.
+    """
+    fields = {}
+    if 'latitude' in data or 'longitude' in data:
+        latitude, longitude = data.get('latitude'), data.get('longitude')
+        if latitude is None and longitude is None:
+            fields.update(latitude=None, longitude=None)
+        else:
+            try:
+                latitude, longitude = _number(latitude), _number(longitude)
+            except (TypeError, ValueError):
+                return None, 'latitude and longitude must both be numbers (or both null)'
+            if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+                return None, 'latitude must be between -90 and 90 and longitude between -180 and 180'
+            fields.update(latitude=latitude, longitude=longitude)
+    if with_radius and 'service_radius_km' in data:
+        radius = data['service_radius_km']
+        if radius is not None:
+            try:
+                radius = _number(radius)
+            except (TypeError, ValueError):
+                radius = -1
+            if not 0 < radius <= MAX_RADIUS_KM:
+                return None, f'service_radius_km must be a number between 0 and {MAX_RADIUS_KM:.0f}'
+        fields['service_radius_km'] = radius
+    return fields, None
+
+
+def _float_arg(args, name, low, high, required=True):
+    value = args.get(name)
+    if value in (None, ''):
+        if required:
+            raise PaginationError(f'{name} is required')
+        return None
+    try:
+        number = _number(value)
+    except ValueError:
+        raise PaginationError(f'{name} must be a number')
+    if not low <= number <= high:
+        raise PaginationError(f'{name} must be between {low:g} and {high:g}')
+    return number
+
+
+# -----------------------------------
+# Lookups
+# -----------------------------------
+POINTS_SQL = {
+    'sqlite': (
+        "SELECT c.id, c.latitude, c.longitude FROM company_location AS g JOIN company AS c ON c.id = g.id "
+        "WHERE g.max_lat >= :min_lat AND g.min_lat <= :max_lat AND g.max_lon >= :min_lon AND g.min_lon <= :max_lon"
+    ),
+    'postgresql': (
+        f"SELECT c.id, c.latitude, c.longitude FROM company AS c WHERE {_LOCATED} "
+        f"AND {_POSTGRESQL_POINT} <@ box(point(:min_lon, :min_lat), point(:max_lon, :max_lat))"
+    ),
+}
+SERVING_SQL = {
+    'sqlite': (
+        "SELECT c.id, c.latitude, c.longitude, c.service_radius_km "
+        "FROM company_service_area AS g JOIN company AS c ON c.id = g.id "
+        "WHERE g.min_lat <= :lat AND g.max_lat >= :lat AND g.min_lon <= :lon AND g.max_lon >= :lon"
+    ),
+    'postgresql': (
+        f"SELECT c.id, c.latitude, c.longitude, c.service_radius_km FROM company AS c WHERE {_SERVED} "
+        f"AND {_POSTGRESQL_SERVICE_AREA} @> box(point(:lon, :lat), point(:lon, :lat))"
+    ),
+}
+_IN_REGION = " AND c.id IN (SELECT company_id FROM company_region WHERE region_id = :region_id)"
+
+
+def _companies_in_circle(sql, lat, lon, radius_km, params):
+    """{company_id: distance} for located companies within ``radius_km``."""
+    found = {}
+    for min_lat, max_lat, min_lon, max_lon in bounding_boxes(lat, lon, radius_km):
+        rows = db.session.execute(text(sql), dict(params, min_lat=min_lat, max_lat=max_lat,
+                                                  min_lon=min_lon, max_lon=max_lon))
+        for row in rows:
+            distance = haversine_km(lat, lon, row.latitude, row.longitude)
+            if distance <= radius_km or radius_km >= MAX_RADIUS_KM:
+                found[row.id] = distance
+    return found
+
+
+def _nearest(sql, lat, lon, radius_km, after, limit, params):
+    # Widen the circle until it holds more than a page past the cursor. Each
+    # step is an index lookup, so the cost follows the companies near the
+    # point rather than the size of the table.
+    search = min(radius_km, max(INITIAL_SEARCH_KM, after[0] if after else 0))
+    while True:
+        found = _companies_in_circle(sql, lat, lon, search, params)
+        matches = [(distance, company_id) for company_id, distance in found.items()
+                   if after is None or (distance, company_id) > after]
+        if len(matches) > limit or search >= radius_km:
+            return matches
+        # The circle's area grows with the square of its radius; aim for a
+        # page and a half of matches in the next one
+        growth = math.sqrt(1.5 * (limit + 1) / len(matches)) if matches else MAX_SEARCH_GROWTH
+        search = min(radius_km, search * min(MAX_SEARCH_GROWTH, max(MIN_SEARCH_GROWTH, growth)))
+
+
+def _serving(sql, lat, lon, radius_km, params):
+    # Service-area boxes may extend past +-180, so probe the shifted point too
+    probes = [lon] + ([lon + 360] if lon < 0 else [lon - 360] if lon > 0 else [])
+    matches = {}
+    for probe in probes:
+        for row in db.session.execute(text(sql), dict(params, lat=lat, lon=probe)):
+            distance = haversine_km(lat, lon, row.latitude, row.longitude)
+            if distance <= row.service_radius_km and distance <= radius_km:
+                matches[row.id] = distance
+    return [(distance, company_id) for company_id, distance in matches.items()]
+
+
+def _lookup_digest(lat, lon, serving, radius_km, region_id):
+    # Binds a cursor to its lookup: distances from one point mean nothing for another
+    lookup = f'{lat!r} {lon!r} {serving} {radius_km!r} {region_id}'
+    return hashlib.sha256(lookup.encode()).hexdigest()[:16]
+
+
+def nearby_company_ids(args):
+    """Return ([(company_id, distance_km)], next_cursor) for one page, nearest first.
+
+    ``serving=true`` keeps only companies whose service area covers the point;
+    ``radius_km`` and ``region`` narrow the results further.
+    """
+    dialect = db.engine.dialect.name
+    if dialect not in POINTS_SQL:
+        raise PaginationError(f'Geospatial search is not supported on {dialect}')
+
+    lat = _float_arg(args, 'lat', -90, 90)
+    lon = _float_arg(args, 'lon', -180, 180)
+    radius_km = _float_arg(args, 'radius_km', 0, MAX_RADIUS_KM, required=False)
+    if radius_km == 0:
+        raise PaginationError('radius_km must be greater than 0')
+    radius_km = radius_km or MAX_RADIUS_KM
+    serving = args.get('serving', 'false')
+    if serving not in ('true', 'false'):
+        raise PaginationError('serving must be true or false')
+    limit = parse_limit(args)
+
+    params, region_sql = {}, ''
+    region_id = args.get('region')
+    if region_id:
+        try:
+            params['region_id'] = int(region_id)
+        except ValueError:
+            raise PaginationError('region must be an integer')
+        region_sql = _IN_REGION
+    digest = _lookup_digest(lat, lon, serving, radius_km, params.get('region_id'))
+
+    after = None
+    token = args.get('cursor')
+    if token:
+        cursor = decode_cursor(token)
+        if cursor.get('s') != 'distance' or 'id' not in cursor or 'v' not in cursor:
+            raise PaginationError('Cursor does not match the requested sort')
+        if cursor.get('q') != digest:
+            raise PaginationError('Cursor does not match the location query')
+        after = (cursor['v'], cursor['id'])
+
+    if serving == 'true':
+        matches = [match for match in _serving(SERVING_SQL[dialect] + region_sql, lat, lon, radius_km, params)
+                   if after is None or match > after]
+    else:
+        matches = _nearest(POINTS_SQL[dialect] + region_sql, lat, lon, radius_km, after, limit, params)
+
+    matches.sort()
+    page = matches[:limit]
+    next_cursor = None
+    if len(matches) > limit:
+        next_cursor = encode_cursor({'s': 'distance', 'q': digest, 'v': page[-1][0], 'id': page[-1][1]})
+    return [(company_id, distance) for distance, company_id in page], next_cursor
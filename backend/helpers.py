@@ -1,9 +1,11 @@
 from functools import wraps
 from flask import request, jsonify, current_app
 import jwt
+from sqlalchemy.orm import noload
 
-from models import User
-from extensions import login_manager
+from models import User, Company, Region, company_region
+from extensions import db, login_manager
+from principal_cache import principal_cache, REJECTED
 
 # -----------------------------------
 # Token Authentication Decorator
@@ -21,14 +23,31 @@ def token_required(f):
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
+        # Serve repeat tokens from the principal cache (no decode, no query)
+        cached = principal_cache.lookup(token)
+        if cached == REJECTED:
+            return jsonify({'message': 'Invalid token!'}), 401
+        if cached is not None:
+            return f(principal_cache.attach(cached), *args, **kwargs)
+
         try:
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-            if not current_user:
-                return jsonify({'message': 'Invalid token!'}), 401
-        except Exception:
+            user_id = data['user_id']
+        except (jwt.InvalidTokenError, KeyError):
+            principal_cache.reject(token)
             return jsonify({'message': 'Invalid token!'}), 401
 
+        # Read before the load, so a concurrent commit outdates what we cache.
+        # Database errors propagate: only a bad token or a missing user is
+        # cached as rejected.
+        version = principal_cache.version(user_id)
+        current_user = User.query.get(user_id)
+        if not current_user:
+            principal_cache.reject(token)
+            return jsonify({'message': 'Invalid token!'}), 401
+
+        principal_cache.store(token, current_user, version, data.get('exp'))
+
         return f(current_user, *args, **kwargs)
 
     return decorated
@@ -62,17 +81,93 @@ def format_company(company):
         'phone': company.phone,
         'email': company.email,
         'description': company.description,
+        'approved': company.approved,
+        'latitude': company.latitude,
+        'longitude': company.longitude,
+        'serviceRadiusKm': company.service_radius_km,
         'regions': [
             {'id': region.id, 'name': region.name}
             for region in company.regions
         ]
     }
 
+# -----------------------------------
+# Helper: Batched Company Serialization
+# -----------------------------------
+# Listing endpoints project companies to plain column rows and fetch all of
+# their regions in one extra query, instead of materializing Company objects
+# and walking `company.regions` (one lazy load per company on some paths).
+COMPANY_COLUMNS = (Company.id, Company.name, Company.phone, Company.email, Company.description, Company.approved,
+                   Company.latitude, Company.longitude, Company.service_radius_km)
+
+# Keeps the IN (...) list under SQLite's bound-parameter limit
+REGION_BATCH_SIZE = 500
+
+
+def company_rows(query):
+    """Project a Company query onto the columns used by format_companies."""
+    return query.options(noload(Company.regions)).with_entities(*COMPANY_COLUMNS)
+
+
+def load_company_regions(company_ids):
+    regions_by_company = {company_id: [] for company_id in company_ids}
+    ids = list(regions_by_company)
+    for start in range(0, len(ids), REGION_BATCH_SIZE):
+        batch = ids[start:start + REGION_BATCH_SIZE]
+        rows = db.session.query(
+            company_region.c.company_id, Region.id, Region.name
+        ).join(
+            Region, Region.id == company_region.c.region_id
+        ).filter(
+            company_region.c.company_id.in_(batch)
+        ).order_by(company_region.c.company_id, Region.id)
+        for company_id, region_id, region_name in rows:
+            regions_by_company[company_id].append({'id': region_id, 'name': region_name})
+    return regions_by_company
+
+
+def format_companies(rows):
+    rows = list(rows)
+    regions_by_company = load_company_regions([row.id for row in rows])
+    return [
+        {
+            'id': row.id,
+            'name': row.name,
+            'phone': row.phone,
+            'email': row.email,
+            'description': row.description,
+            'approved': row.approved,
+            'latitude': row.latitude,
+            'longitude': row.longitude,
+            'serviceRadiusKm': row.service_radius_km,
+            'regions': regions_by_company[row.id]
+        }
+        for row in rows
+    ]
+
 # -----------------------------------
 # Helper: Format Region
 # -----------------------------------
 def format_region(region):
     return {
         'id': region.id,
-        'name': region.name
+        'name': region.name,
+        'latitude': region.latitude,
+        'longitude': region.longitude
+    }
+
+# -----------------------------------
+# Helper: Format Service Request
+# -----------------------------------
+def format_service_request(service_request):
+    return {
+        'id': service_request.id,
+        'description': service_request.description,
+        'status': service_request.status,
+        'regionId': service_request.region_id,
+        'companyId': service_request.company_id,
+        'contactName': service_request.contact_name,
+        'contactEmail': service_request.contact_email,
+        'contactPhone': service_request.contact_phone,
+        'timestamp': service_request.timestamp.isoformat() if service_request.timestamp else None
     }
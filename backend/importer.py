@@ -0,0 +1,247 @@
+"""Bulk import of companies, their users and regions from CSV or JSONL.
+
+    flask import-companies registry.csv --default-password changeme
+
+Input rows need name, email, phone and description. Optional fields are
+``regions`` (a list in JSONL, ``;``-separated names in CSV) and
+``password``. Rows are streamed in chunks. Each chunk runs set-based
+existence checks, is inserted with executemany and committed on its own.
+Passwords are hashed in a process pool. Re-running is safe, because
+companies whose email already has a user are skipped. A checkpoint file
+lets an interrupted import resume after the last committed chunk.
+"""
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import click
+from flask.cli import with_appcontext
+
+from cache import cache
+from extensions import db
+from geo import GEO_FIELDS, parse_location
+from company_regions import set_company_regions
+from models import User, Company, Region
+from passwords import hash_password, password_hasher
+
+DEFAULT_CHUNK_SIZE = 1000
+REQUIRED_FIELDS = ('name', 'email', 'phone', 'description')
+
+
+# -----------------------------------
+# Reading input
+# -----------------------------------
+def read_records(path, fmt=None):
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                regions = row.get('regions') or ''
+                row['regions'] = [name.strip() for name in regions.split(';') if name.strip()]
+                for field in GEO_FIELDS:
+                    if row.get(field) == '':
+                        row[field] = None
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def normalize(record, default_password):
+    """Return a cleaned record, or None if it is missing required data."""
+    if any(not str(record.get(field) or '').strip() for field in REQUIRED_FIELDS):
+        return None
+    password = record.get('password') or default_password
+    if not password:
+        return None
+    location, error = parse_location(record)
+    if error:
+        return None
+    return {
+        'name': record['name'].strip(),
+        'email': record['email'].strip().lower(),
+        'phone': str(record['phone']).strip(),
+        'description': record['description'].strip(),
+        'regions': list(dict.fromkeys(record.get('regions') or [])),
+        'password': password,
+        **location,
+    }
+
+
+# -----------------------------------
+# Set-based helpers
+# -----------------------------------
+def existing_emails(emails):
+    rows = db.session.query(User.email).filter(User.email.in_(emails))
+    return {email for email, in rows}
+
+
+def ensure_regions(names, create=True):
+    """Map region names to ids, inserting missing regions if ``create``."""
+    names = set(names)
+    if not names:
+        return {}
+    region_ids = dict(db.session.query(Region.name, Region.id).filter(Region.name.in_(names)))
+    missing = names - set(region_ids)
+    if missing and create:
+        db.session.execute(Region.__table__.insert(), [{'name': name} for name in sorted(missing)])
+        region_ids.update(db.session.query(Region.name, Region.id).filter(Region.name.in_(missing)))
+    return region_ids
+
+
+def import_chunk(records, pool, create_regions=True):
+    """Insert one chunk of normalized records; returns (inserted, skipped)."""
+    by_email = {}
+    for record in records:
+        by_email.setdefault(record['email'], record)
+    skipped = len(records) - len(by_email)
+
+    for email in existing_emails(list(by_email)):
+        del by_email[email]
+        skipped += 1
+    if not by_email:
+        return 0, skipped
+
+    records = list(by_email.values())
+    # Same method and work factor as the auth routes
+    hash_with_policy = partial(hash_password, method=password_hasher.method)
+    hashes = pool.map(hash_with_policy, [r['password'] for r in records], chunksize=16)
+    db.session.execute(User.__table__.insert(), [
+        {'email': r['email'], 'password': pw, 'role': 'company'}
+        for r, pw in zip(records, hashes)
+    ])
+    user_ids = dict(db.session.query(User.email, User.id).filter(User.email.in_(list(by_email))))
+
+    db.session.execute(Company.__table__.insert(), [
+        {
+            'user_id': user_ids[r['email']],
+            'name': r['name'],
+            'phone': r['phone'],
+            'email': r['email'],
+            'description': r['description'],
+            **{field: r.get(field) for field in GEO_FIELDS},
+        }
+        for r in records
+    ])
+    company_ids = dict(db.session.query(Company.user_id, Company.id)
+                       .filter(Company.user_id.in_(list(user_ids.values()))))
+
+    region_ids = ensure_regions(itertools.chain.from_iterable(r['regions'] for r in records), create_regions)
+    set_company_regions({
+        company_ids[user_ids[r['email']]]: [region_ids[name] for name in r['regions'] if name in region_ids]
+        for r in records
+    }, mode='add')
+    return len(records), skipped
+
+
+# -----------------------------------
+# Checkpointing
+# -----------------------------------
+class Checkpoint:
+    """Number of source rows already committed, persisted next to the input."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            return json.load(f).get('rows', 0)
+
+    def save(self, rows):
+        if not self.path:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'rows': rows}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_records(records, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, default_password=None,
+                   checkpoint=None, create_regions=True, progress=None):
+    """Import an iterable of raw records; returns a dict of totals.
+
+    Must be called inside an application context.
+    """
+    checkpoint = checkpoint or Checkpoint(None)
+    done = checkpoint.load()
+    records = iter(records)
+    if done:
+        records = itertools.islice(records, done, None)
+
+    totals = {'rows': done, 'inserted': 0, 'skipped': 0, 'invalid': 0, 'seconds': 0.0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            raw = list(itertools.islice(records, chunk_size))
+            if not raw:
+                break
+            cleaned = [normalize(record, default_password) for record in raw]
+            valid = [record for record in cleaned if record is not None]
+            try:
+                inserted, skipped = import_chunk(valid, pool, create_regions)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            totals['rows'] += len(raw)
+            totals['inserted'] += inserted
+            totals['skipped'] += skipped
+            totals['invalid'] += len(raw) - len(valid)
+            checkpoint.save(totals['rows'])
+            totals['seconds'] = time.perf_counter() - started
+            if progress:
+                progress(totals)
+
+    checkpoint.clear()
+    # Core inserts bypass the session hooks that normally invalidate the cache
+    cache.invalidate('companies', 'regions')
+    totals['seconds'] = time.perf_counter() - started
+    return totals
+
+
+def _rate(totals):
+    processed = totals['inserted'] + totals['skipped'] + totals['invalid']
+    return processed / totals['seconds'] if totals['seconds'] else 0.0
+
+
+@click.command('import-companies')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True)
+@click.option('--workers', type=int, help='Password hashing processes (default: CPU count).')
+@click.option('--default-password', envvar='IMPORT_DEFAULT_PASSWORD',
+              help='Password for rows without one.')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint.')
+@click.option('--no-create-regions', is_flag=True, help='Drop unknown region names instead of creating them.')
+@with_appcontext
+def import_companies_command(path, fmt, chunk_size, workers, default_password, restart, no_create_regions):
+    """Bulk import companies from a CSV or JSONL file."""
+    checkpoint = Checkpoint(path + '.checkpoint')
+    if restart:
+        checkpoint.clear()
+    elif checkpoint.load():
+        click.echo(f'Resuming after {checkpoint.load()} rows')
+
+    def progress(totals):
+        click.echo(f"{totals['rows']} rows: {totals['inserted']} inserted, {totals['skipped']} skipped, "
+                   f"{totals['invalid']} invalid ({_rate(totals):.0f} rows/s)")
+
+    totals = import_records(
+        read_records(path, fmt), chunk_size=chunk_size, workers=workers,
+        default_password=default_password, checkpoint=checkpoint,
+        create_regions=not no_create_regions, progress=progress,
+    )
+    click.echo(f"Done: {totals['inserted']} inserted, {totals['skipped']} skipped, {totals['invalid']} invalid "
+               f"in {totals['seconds']:.1f}s ({_rate(totals):.0f} rows/s)")
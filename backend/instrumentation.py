@@ -0,0 +1,321 @@
+"""Per-request instrumentation and a Prometheus /metrics endpoint.
+
+For every request the middleware records wall time, the number and total
+duration of SQL statements (engine events), JSON serialization time and
+response size as histograms labelled by endpoint. A request that runs the
+same statement more than METRICS_N_PLUS_ONE_THRESHOLD times is logged as a
+likely N+1 and counted.
+
+With PROFILE_SLOW_REQUEST_MS set, a sampling profiler records the stacks of
+threads serving requests, and requests slower than the threshold write their
+samples to PROFILE_DIR in collapsed-stack format ("outer;inner;leaf count").
+flamegraph.pl, inferno and speedscope can read that format.
+
+Metrics live in process memory, so each worker exposes its own series. Sum
+them in Prometheus.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+# -----------------------------------
+# Prometheus metric types
+# -----------------------------------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, ([*counts], total, n)) for labels, (counts, total, n) in self._series.items())
+        for labels, (counts, total, n) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} "
+                             f'{cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {n}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in values)
+        return lines
+
+
+# -----------------------------------
+# Sampling profiler
+# -----------------------------------
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stack of every thread that is inside a request.
+
+    A single daemon thread wakes every ``interval`` seconds, and only threads
+    registered with ``begin`` are sampled. ``end`` returns the Counter of
+    collapsed stacks for the calling thread.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def end(self):
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                idents = [ident for ident in self._active if ident != me]
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            stacks = {ident: _collapse(frames[ident]) for ident in idents if ident in frames}
+            with self._lock:
+                for ident, stack in stacks.items():
+                    samples = self._active.get(ident)
+                    if samples is not None:
+                        samples[stack] += 1
+
+
+def write_collapsed(samples, directory, name):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
+
+
+# -----------------------------------
+# Flask extension
+# -----------------------------------
+class Instrumentation:
+    """Request middleware that feeds the metric registry below."""
+
+    def __init__(self, app=None):
+        self.request_duration = Histogram(
+            'ecowaste_request_duration_seconds', 'Wall time per request.',
+            ('endpoint', 'method', 'status'), DURATION_BUCKETS)
+        self.query_count = Histogram(
+            'ecowaste_request_queries', 'SQL statements executed per request.',
+            ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.query_duration = Histogram(
+            'ecowaste_request_query_duration_seconds', 'Total SQL execution time per request.',
+            ('endpoint',), DURATION_BUCKETS)
+        self.serialization_duration = Histogram(
+            'ecowaste_request_serialization_duration_seconds', 'JSON encoding time per request.',
+            ('endpoint',), DURATION_BUCKETS)
+        self.response_size = Histogram(
+            'ecowaste_response_size_bytes', 'Response body size.',
+            ('endpoint',), SIZE_BUCKETS)
+        self.n_plus_one = CounterMetric(
+            'ecowaste_n_plus_one_total', 'Requests that repeated one SQL statement above the threshold.',
+            ('endpoint',))
+        self.metrics = [self.request_duration, self.query_count, self.query_duration,
+                        self.serialization_duration, self.response_size, self.n_plus_one]
+        self.n_plus_one_threshold = 10
+        self.profiler = None
+        self.profile_threshold = 0
+        self.profile_dir = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', 10)
+        self.profile_threshold = app.config.get('PROFILE_SLOW_REQUEST_MS', 0) / 1000
+        self.profile_dir = app.config.get('PROFILE_DIR')
+        if self.profile_threshold:
+            self.profiler = SamplingProfiler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.json_encoder = _timed_encoder(app.json_encoder)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics_view)
+        app.extensions['instrumentation'] = self
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return self.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    def _before_request(self):
+        if request.endpoint == 'metrics':
+            return
+        g.request_stats = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'query_time': 0.0,
+            'serialization_time': 0.0,
+            'statements': Counter(),
+        }
+        if self.profiler:
+            self.profiler.begin()
+
+    def _after_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats['started']
+        endpoint = request.endpoint or 'unmatched'
+
+        self.request_duration.observe((endpoint, request.method, str(response.status_code)), elapsed)
+        self.query_count.observe((endpoint,), stats['queries'])
+        self.query_duration.observe((endpoint,), stats['query_time'])
+        self.serialization_duration.observe((endpoint,), stats['serialization_time'])
+        # calculate_content_length() would buffer a streamed body into memory
+        size = response.content_length if response.is_streamed else response.calculate_content_length()
+        if size is not None:
+            self.response_size.observe((endpoint,), size)
+
+        if stats['statements']:
+            statement, repeats = stats['statements'].most_common(1)[0]
+            if repeats > self.n_plus_one_threshold:
+                self.n_plus_one.inc((endpoint,))
+                current_app.logger.warning('Possible N+1 in %s: %d x %s', endpoint, repeats,
+                                           ' '.join(statement.split())[:200])
+
+        if self.profiler:
+            samples = self.profiler.end()
+            if samples and elapsed >= self.profile_threshold:
+                name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{elapsed * 1000:.0f}ms.folded"
+                write_collapsed(samples, self.profile_dir, re.sub(r'[^\w.-]', '_', name))
+        return response
+
+    def _teardown_request(self, exc):
+        if self.profiler:
+            self.profiler.end()
+
+
+instrumentation = Instrumentation()
+
+
+def _timed_encoder(base):
+    class TimedJSONEncoder(base):
+        def encode(self, o):
+            started = time.perf_counter()
+            try:
+                return super().encode(o)
+            finally:
+                stats = g.get('request_stats') if has_request_context() else None
+                if stats is not None:
+                    stats['serialization_time'] += time.perf_counter() - started
+
+    return TimedJSONEncoder
+
+
+# -----------------------------------
+# SQL statement accounting
+# -----------------------------------
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    # Dispatch workers and CLI commands run outside a request
+    stats = g.get('request_stats') if has_request_context() else None
+    if stats is None:
+        return
+    stats['queries'] += 1
+    stats['query_time'] += time.perf_counter() - started
+    stats['statements'][statement] += 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_query_timer(context):
+    # after_cursor_execute does not run for a failed statement
+    timers = context.connection.info.get('query_started') if context.connection is not None else None
+    if timers:
+        timers.pop()
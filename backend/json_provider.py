@@ -0,0 +1,61 @@
+"""Pluggable JSON encoding for every jsonify() response.
+
+Flask 2.0 encodes JSON through ``app.json_encoder``. init_json_provider
+installs an encoder backed by orjson when it is importable (JSON_PROVIDER
+'auto' or 'orjson') and keeps Flask's stdlib encoder otherwise ('stdlib').
+The orjson path keeps Flask's behaviour: keys are sorted per
+JSON_SORT_KEYS, and dates, UUIDs, dataclasses and __html__ objects go
+through Flask's ``default()``. Anything orjson rejects, such as non-string
+dict keys or integers wider than 64 bits, falls back to the stdlib encoder.
+Non-ASCII text is emitted as UTF-8 rather than \\u escapes. Pretty-printed
+output (debug mode) always uses the stdlib encoder.
+"""
+import json
+
+from flask import current_app
+from flask.json import JSONEncoder
+
+try:
+    import orjson  # optional dependency
+except ImportError:
+    orjson = None
+
+PROVIDERS = ('auto', 'orjson', 'stdlib')
+
+
+if orjson is not None:
+    _PASSTHROUGH = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    class OrjsonEncoder(JSONEncoder):
+        def encode(self, o):
+            if self.indent is not None:
+                return super().encode(o)
+            option = _PASSTHROUGH | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            try:
+                return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+            except TypeError:
+                return super().encode(o)
+else:
+    OrjsonEncoder = None
+
+
+def dumps(obj):
+    """Compact JSON through the app's encoder, for code outside jsonify (e.g. exports)."""
+    return json.dumps(obj, cls=current_app.json_encoder, separators=(',', ':'), ensure_ascii=False)
+
+
+def init_json_provider(app):
+    """Install the configured encoder; returns the provider name in use."""
+    provider = app.config.get('JSON_PROVIDER', 'auto')
+    if provider not in PROVIDERS:
+        raise ValueError(f'Unknown JSON_PROVIDER: {provider}')
+    if provider == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson but orjson is not installed')
+
+    if provider != 'stdlib' and orjson is not None:
+        app.json_encoder = OrjsonEncoder
+        name = 'orjson'
+    else:
+        name = 'stdlib'
+    app.extensions['json_provider'] = name
+    return name
@@ -0,0 +1,128 @@
+"""add company full-text search index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 20:20:41.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+SQLITE_REGIONS = (
+    "COALESCE((SELECT group_concat(region.name, ' ') FROM company_region "
+    "JOIN region ON region.id = company_region.region_id "
+    "WHERE company_region.company_id = {company_id}), '')"
+)
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS company_search USING fts5("
+    "name, description, regions, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_ai AFTER INSERT ON company BEGIN "
+    "INSERT INTO company_search (rowid, name, description, regions) "
+    f"VALUES (new.id, new.name, new.description, {SQLITE_REGIONS.format(company_id='new.id')}); END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_au AFTER UPDATE OF name, description ON company BEGIN "
+    "UPDATE company_search SET name = new.name, description = new.description WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_ad AFTER DELETE ON company BEGIN "
+    "DELETE FROM company_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_region_ai AFTER INSERT ON company_region BEGIN "
+    f"UPDATE company_search SET regions = {SQLITE_REGIONS.format(company_id='new.company_id')} "
+    "WHERE rowid = new.company_id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_region_ad AFTER DELETE ON company_region BEGIN "
+    f"UPDATE company_search SET regions = {SQLITE_REGIONS.format(company_id='old.company_id')} "
+    "WHERE rowid = old.company_id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_region_au AFTER UPDATE OF name ON region BEGIN "
+    f"UPDATE company_search SET regions = {SQLITE_REGIONS.format(company_id='company_search.rowid')} "
+    "WHERE rowid IN (SELECT company_id FROM company_region WHERE region_id = new.id); END",
+    "INSERT INTO company_search (rowid, name, description, regions) "
+    f"SELECT company.id, company.name, company.description, {SQLITE_REGIONS.format(company_id='company.id')} "
+    "FROM company WHERE company.id NOT IN (SELECT rowid FROM company_search)",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS company_search_region_au",
+    "DROP TRIGGER IF EXISTS company_search_company_region_ad",
+    "DROP TRIGGER IF EXISTS company_search_company_region_ai",
+    "DROP TRIGGER IF EXISTS company_search_company_ad",
+    "DROP TRIGGER IF EXISTS company_search_company_au",
+    "DROP TRIGGER IF EXISTS company_search_company_ai",
+    "DROP TABLE IF EXISTS company_search",
+]
+
+POSTGRESQL_UPGRADE = [
+    "CREATE TABLE IF NOT EXISTS company_search ("
+    "company_id INTEGER PRIMARY KEY REFERENCES company (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_company_search_document ON company_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION company_search_refresh(cid INTEGER) RETURNS VOID AS $$
+        INSERT INTO company_search (company_id, document)
+        SELECT c.id,
+               setweight(to_tsvector('simple', c.name), 'A')
+               || setweight(to_tsvector('simple', COALESCE((
+                      SELECT string_agg(r.name, ' ') FROM company_region cr
+                      JOIN region r ON r.id = cr.region_id WHERE cr.company_id = c.id), '')), 'B')
+               || setweight(to_tsvector('simple', c.description), 'C')
+        FROM company c WHERE c.id = cid
+        ON CONFLICT (company_id) DO UPDATE SET document = EXCLUDED.document
+    $$ LANGUAGE sql""",
+    """CREATE OR REPLACE FUNCTION company_search_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_TABLE_NAME = 'company' THEN
+            PERFORM company_search_refresh(NEW.id);
+        ELSIF TG_TABLE_NAME = 'company_region' THEN
+            PERFORM company_search_refresh(CASE WHEN TG_OP = 'DELETE' THEN OLD.company_id ELSE NEW.company_id END);
+        ELSE
+            PERFORM company_search_refresh(company_id) FROM company_region WHERE region_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS company_search_company ON company",
+    "CREATE TRIGGER company_search_company AFTER INSERT OR UPDATE OF name, description ON company "
+    "FOR EACH ROW EXECUTE FUNCTION company_search_trigger()",
+    "DROP TRIGGER IF EXISTS company_search_company_region ON company_region",
+    "CREATE TRIGGER company_search_company_region AFTER INSERT OR DELETE ON company_region "
+    "FOR EACH ROW EXECUTE FUNCTION company_search_trigger()",
+    "DROP TRIGGER IF EXISTS company_search_region ON region",
+    "CREATE TRIGGER company_search_region AFTER UPDATE OF name ON region "
+    "FOR EACH ROW EXECUTE FUNCTION company_search_trigger()",
+    "SELECT company_search_refresh(id) FROM company "
+    "WHERE id NOT IN (SELECT company_id FROM company_search)",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS company_search_region ON region",
+    "DROP TRIGGER IF EXISTS company_search_company_region ON company_region",
+    "DROP TRIGGER IF EXISTS company_search_company ON company",
+    "DROP FUNCTION IF EXISTS company_search_trigger()",
+    "DROP FUNCTION IF EXISTS company_search_refresh(INTEGER)",
+    "DROP TABLE IF EXISTS company_search",
+]
+
+
+def _run(statements):
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_UPGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRESQL_UPGRADE)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_DOWNGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRESQL_DOWNGRADE)
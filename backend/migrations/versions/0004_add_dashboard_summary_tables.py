@@ -0,0 +1,191 @@
+"""add dashboard summary tables
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 20:12:05.780952
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def _sqlite_counter(name, delta):
+    return (f"INSERT INTO stat_counter (name, value) VALUES ({name}, {delta}) "
+            "ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;")
+
+
+def _sqlite_region(region_id, delta):
+    return (f"INSERT INTO region_stats (region_id, company_count) VALUES ({region_id}, {delta}) "
+            "ON CONFLICT (region_id) DO UPDATE SET company_count = region_stats.company_count + excluded.company_count;")
+
+
+def _sqlite_request(row, delta):
+    status = f"COALESCE({row}.status, 'pending')"
+    return (_sqlite_counter(f"'requests:' || {status}", delta) +
+            " INSERT INTO request_daily_stats (day, status, count) "
+            f"VALUES (date(COALESCE({row}.timestamp, CURRENT_TIMESTAMP)), {status}, {delta}) "
+            "ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;")
+
+
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS stats_company_ai AFTER INSERT ON company BEGIN "
+    f"{_sqlite_counter(repr('companies'), 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_company_ad AFTER DELETE ON company BEGIN "
+    f"{_sqlite_counter(repr('companies'), -1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_region_ai AFTER INSERT ON region BEGIN "
+    f"{_sqlite_counter(repr('regions'), 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_region_ad AFTER DELETE ON region BEGIN "
+    f"{_sqlite_counter(repr('regions'), -1)} DELETE FROM region_stats WHERE region_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS stats_company_region_ai AFTER INSERT ON company_region BEGIN "
+    f"{_sqlite_region('new.region_id', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_company_region_ad AFTER DELETE ON company_region BEGIN "
+    f"{_sqlite_region('old.region_id', -1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_ai AFTER INSERT ON service_request BEGIN "
+    f"{_sqlite_request('new', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_au AFTER UPDATE OF status ON service_request "
+    f"WHEN old.status IS NOT new.status BEGIN {_sqlite_request('old', -1)} {_sqlite_request('new', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_ad AFTER DELETE ON service_request BEGIN "
+    f"{_sqlite_request('old', -1)} END",
+]
+
+POSTGRESQL_TRIGGERS = [
+    """CREATE OR REPLACE FUNCTION stats_trigger() RETURNS TRIGGER AS $$
+    DECLARE
+        delta INTEGER := CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END;
+    BEGIN
+        IF TG_TABLE_NAME IN ('company', 'region') THEN
+            INSERT INTO stat_counter (name, value) VALUES (TG_TABLE_NAME || 's', delta)
+            ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;
+        ELSIF TG_TABLE_NAME = 'company_region' THEN
+            INSERT INTO region_stats (region_id, company_count)
+            VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.region_id ELSE NEW.region_id END, delta)
+            ON CONFLICT (region_id) DO UPDATE SET company_count = region_stats.company_count + excluded.company_count;
+        ELSE
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO stat_counter (name, value) VALUES ('requests:' || COALESCE(OLD.status, 'pending'), -1)
+                ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;
+                INSERT INTO request_daily_stats (day, status, count)
+                VALUES (COALESCE(OLD.timestamp, now())::date, COALESCE(OLD.status, 'pending'), -1)
+                ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO stat_counter (name, value) VALUES ('requests:' || COALESCE(NEW.status, 'pending'), 1)
+                ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;
+                INSERT INTO request_daily_stats (day, status, count)
+                VALUES (COALESCE(NEW.timestamp, now())::date, COALESCE(NEW.status, 'pending'), 1)
+                ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;
+            END IF;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS stats_company ON company",
+    "CREATE TRIGGER stats_company AFTER INSERT OR DELETE ON company "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_region ON region",
+    "CREATE TRIGGER stats_region AFTER INSERT OR DELETE ON region "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_company_region ON company_region",
+    "CREATE TRIGGER stats_company_region AFTER INSERT OR DELETE ON company_region "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_service_request ON service_request",
+    "CREATE TRIGGER stats_service_request AFTER INSERT OR DELETE ON service_request "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_service_request_status ON service_request",
+    "CREATE TRIGGER stats_service_request_status AFTER UPDATE OF status ON service_request "
+    "FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) EXECUTE FUNCTION stats_trigger()",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS stats_company_ai', 'DROP TRIGGER IF EXISTS stats_company_ad',
+    'DROP TRIGGER IF EXISTS stats_region_ai', 'DROP TRIGGER IF EXISTS stats_region_ad',
+    'DROP TRIGGER IF EXISTS stats_company_region_ai', 'DROP TRIGGER IF EXISTS stats_company_region_ad',
+    'DROP TRIGGER IF EXISTS stats_service_request_ai', 'DROP TRIGGER IF EXISTS stats_service_request_au',
+    'DROP TRIGGER IF EXISTS stats_service_request_ad',
+]
+
+POSTGRESQL_DROP = [
+    'DROP TRIGGER IF EXISTS stats_service_request_status ON service_request',
+    'DROP TRIGGER IF EXISTS stats_service_request ON service_request',
+    'DROP TRIGGER IF EXISTS stats_company_region ON company_region',
+    'DROP TRIGGER IF EXISTS stats_region ON region',
+    'DROP TRIGGER IF EXISTS stats_company ON company',
+    'DROP FUNCTION IF EXISTS stats_trigger()',
+]
+
+DAY_EXPRESSIONS = {'sqlite': 'date({column})', 'postgresql': 'CAST({column} AS DATE)'}
+
+
+def rebuild_statements(dialect):
+    day = DAY_EXPRESSIONS.get(dialect, 'CAST({column} AS DATE)').format(column='timestamp')
+    return [
+        "DELETE FROM stat_counter",
+        "DELETE FROM region_stats",
+        "DELETE FROM request_daily_stats",
+        "INSERT INTO stat_counter (name, value) SELECT 'companies', COUNT(*) FROM company",
+        "INSERT INTO stat_counter (name, value) SELECT 'regions', COUNT(*) FROM region",
+        "INSERT INTO stat_counter (name, value) "
+        "SELECT 'requests:' || COALESCE(status, 'pending'), COUNT(*) FROM service_request "
+        "GROUP BY COALESCE(status, 'pending')",
+        "INSERT INTO region_stats (region_id, company_count) "
+        "SELECT region_id, COUNT(*) FROM company_region GROUP BY region_id",
+        "INSERT INTO request_daily_stats (day, status, count) "
+        f"SELECT {day}, COALESCE(status, 'pending'), COUNT(*) FROM service_request "
+        f"GROUP BY {day}, COALESCE(status, 'pending')",
+    ]
+
+
+
+def _run(statements):
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('request_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'status')
+    )
+    op.create_table('stat_counter',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('region_stats',
+    sa.Column('region_id', sa.Integer(), nullable=False),
+    sa.Column('company_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['region_id'], ['region.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('region_id')
+    )
+    # ### end Alembic commands ###
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_TRIGGERS)
+    elif dialect == 'postgresql':
+        _run(POSTGRESQL_TRIGGERS)
+    _run(rebuild_statements(dialect))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_DROP)
+    elif dialect == 'postgresql':
+        _run(POSTGRESQL_DROP)
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('region_stats')
+    op.drop_table('stat_counter')
+    op.drop_table('request_daily_stats')
+    # ### end Alembic commands ###
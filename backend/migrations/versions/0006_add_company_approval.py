@@ -0,0 +1,30 @@
+"""add company approval and service request region index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 20:28:36.890742
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+# Plain ADD/DROP COLUMN rather than a batch rebuild of company, which on
+# SQLite would drop the statistics and search triggers on that table.
+def upgrade():
+    op.add_column('company', sa.Column('approved', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Companies registered before moderation existed are already live
+    op.execute(sa.text('UPDATE company SET approved = :approved').bindparams(approved=True))
+    op.create_index('ix_service_request_region_id', 'service_request', ['region_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_service_request_region_id', table_name='service_request')
+    op.drop_column('company', 'approved')
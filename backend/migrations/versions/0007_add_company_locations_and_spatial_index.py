@@ -0,0 +1,131 @@
+"""add company locations and spatial index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 20:41:40.794478
+
+"""
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+# Copied from geo.py at the time of this revision
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def _half_width_sql(latitude, radius):
+    """Longitude half-width, in degrees, of the box around a circle (SQL)."""
+    return (
+        f"(CASE WHEN abs({latitude}) + {radius} / {KM_PER_DEGREE!r} >= 90 "
+        f"OR sin({radius} / {EARTH_RADIUS_KM!r}) >= cos(radians({latitude})) THEN 180.0 "
+        f"ELSE degrees(asin(sin({radius} / {EARTH_RADIUS_KM!r}) / cos(radians({latitude})))) END)"
+    )
+
+
+_HALF_HEIGHT = f"(service_radius_km / {KM_PER_DEGREE!r})"
+_HALF_WIDTH = _half_width_sql('latitude', 'service_radius_km')
+
+_SQLITE_LOCATION = (
+    "INSERT INTO company_location (id, min_lat, max_lat, min_lon, max_lon) "
+    "SELECT id, latitude, latitude, longitude, longitude FROM company "
+    "WHERE {where} AND latitude IS NOT NULL AND longitude IS NOT NULL"
+)
+# Longitudes may run past +-180; lookups also probe the point shifted by 360
+_SQLITE_SERVICE_AREA = (
+    "INSERT INTO company_service_area (id, min_lat, max_lat, min_lon, max_lon) "
+    f"SELECT id, latitude - {_HALF_HEIGHT}, latitude + {_HALF_HEIGHT}, "
+    f"longitude - {_HALF_WIDTH}, longitude + {_HALF_WIDTH} FROM company "
+    "WHERE {where} AND latitude IS NOT NULL AND longitude IS NOT NULL AND service_radius_km IS NOT NULL"
+)
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS company_location USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS company_service_area USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    "CREATE TRIGGER IF NOT EXISTS company_geo_company_ai AFTER INSERT ON company "
+    "WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN "
+    f"{_SQLITE_LOCATION.format(where='id = new.id')}; "
+    f"{_SQLITE_SERVICE_AREA.format(where='id = new.id')}; END",
+    "CREATE TRIGGER IF NOT EXISTS company_geo_company_au "
+    "AFTER UPDATE OF latitude, longitude, service_radius_km ON company BEGIN "
+    "DELETE FROM company_location WHERE id = old.id; "
+    "DELETE FROM company_service_area WHERE id = old.id; "
+    f"{_SQLITE_LOCATION.format(where='id = new.id')}; "
+    f"{_SQLITE_SERVICE_AREA.format(where='id = new.id')}; END",
+    "CREATE TRIGGER IF NOT EXISTS company_geo_company_ad AFTER DELETE ON company BEGIN "
+    "DELETE FROM company_location WHERE id = old.id; "
+    "DELETE FROM company_service_area WHERE id = old.id; END",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS company_geo_company_ad",
+    "DROP TRIGGER IF EXISTS company_geo_company_au",
+    "DROP TRIGGER IF EXISTS company_geo_company_ai",
+    "DROP TABLE IF EXISTS company_service_area",
+    "DROP TABLE IF EXISTS company_location",
+]
+
+_POSTGRESQL_POINT = "point(longitude, latitude)"
+_POSTGRESQL_SERVICE_AREA = (
+    f"box(point(longitude - {_HALF_WIDTH}, latitude - {_HALF_HEIGHT}), "
+    f"point(longitude + {_HALF_WIDTH}, latitude + {_HALF_HEIGHT}))"
+)
+_LOCATED = "latitude IS NOT NULL AND longitude IS NOT NULL"
+_SERVED = f"{_LOCATED} AND service_radius_km IS NOT NULL"
+
+POSTGRESQL_UPGRADE = [
+    f"CREATE INDEX IF NOT EXISTS ix_company_location ON company USING GIST (({_POSTGRESQL_POINT})) "
+    f"WHERE {_LOCATED}",
+    f"CREATE INDEX IF NOT EXISTS ix_company_service_area ON company USING GIST (({_POSTGRESQL_SERVICE_AREA})) "
+    f"WHERE {_SERVED}",
+]
+
+POSTGRESQL_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_company_service_area",
+    "DROP INDEX IF EXISTS ix_company_location",
+]
+
+
+def _run(statements):
+    for statement in statements:
+        op.execute(sa.text(statement))
+
+
+# Plain ADD/DROP COLUMN rather than a batch rebuild of company, which on
+# SQLite would drop the statistics and search triggers on that table.
+def upgrade():
+    op.add_column('company', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('company', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('company', sa.Column('service_radius_km', sa.Float(), nullable=True))
+    op.add_column('region', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('region', sa.Column('longitude', sa.Float(), nullable=True))
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_UPGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRESQL_UPGRADE)
+
+
+def downgrade():
+    # The triggers and indexes reference the columns, so they go first
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_DOWNGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRESQL_DOWNGRADE)
+
+    op.drop_column('region', 'longitude')
+    op.drop_column('region', 'latitude')
+    op.drop_column('company', 'service_radius_km')
+    op.drop_column('company', 'longitude')
+    op.drop_column('company', 'latitude')
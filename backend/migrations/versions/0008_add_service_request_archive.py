@@ -0,0 +1,85 @@
+"""add service request archive
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 20:55:27.218969
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+# Statistics triggers on the archive, as in stats.py: archived requests keep
+# counting, so moving a request there leaves the dashboard unchanged.
+def _sqlite_request(row, delta):
+    status = f"COALESCE({row}.status, 'pending')"
+    return (f"INSERT INTO stat_counter (name, value) VALUES ('requests:' || {status}, {delta}) "
+            "ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value; "
+            "INSERT INTO request_daily_stats (day, status, count) "
+            f"VALUES (date(COALESCE({row}.timestamp, CURRENT_TIMESTAMP)), {status}, {delta}) "
+            "ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;")
+
+
+TRIGGERS = {
+    'sqlite': [
+        "CREATE TRIGGER IF NOT EXISTS stats_service_request_archive_ai AFTER INSERT ON service_request_archive "
+        f"BEGIN {_sqlite_request('new', 1)} END",
+        "CREATE TRIGGER IF NOT EXISTS stats_service_request_archive_ad AFTER DELETE ON service_request_archive "
+        f"BEGIN {_sqlite_request('old', -1)} END",
+    ],
+    'postgresql': [
+        "DROP TRIGGER IF EXISTS stats_service_request_archive ON service_request_archive",
+        "CREATE TRIGGER stats_service_request_archive AFTER INSERT OR DELETE ON service_request_archive "
+        "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    ],
+}
+
+COLUMNS = ('id, description, status, timestamp, region_id, '
+           'contact_name, contact_email, contact_phone, company_id')
+
+
+def upgrade():
+    op.create_table('service_request_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('region_id', sa.Integer(), nullable=True),
+    sa.Column('contact_name', sa.String(length=100), nullable=True),
+    sa.Column('contact_email', sa.String(length=120), nullable=True),
+    sa.Column('contact_phone', sa.String(length=20), nullable=True),
+    sa.Column('company_id', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id', 'timestamp'),
+    postgresql_partition_by='RANGE (timestamp)'
+    )
+    op.create_index('ix_service_request_archive_company_id_id', 'service_request_archive', ['company_id', 'id'], unique=False)
+    op.create_index('ix_service_request_archive_timestamp', 'service_request_archive', ['timestamp'], unique=False)
+    for statement in TRIGGERS.get(op.get_bind().dialect.name, []):
+        op.execute(sa.text(statement))
+
+
+def downgrade():
+    # Move archived requests back rather than losing them. The archive keeps
+    # ids of deleted companies and regions, which the live table's foreign
+    # keys reject; those are cleared. The archive's delete trigger balances
+    # the statistics that the insert adds.
+    op.execute(sa.text(
+        f"INSERT INTO service_request ({COLUMNS}) "
+        "SELECT id, description, status, timestamp, "
+        "CASE WHEN region_id IN (SELECT id FROM region) THEN region_id END, "
+        "contact_name, contact_email, contact_phone, "
+        "CASE WHEN company_id IN (SELECT id FROM company) THEN company_id END "
+        "FROM service_request_archive"
+    ))
+    op.execute(sa.text("DELETE FROM service_request_archive"))
+    op.drop_index('ix_service_request_archive_timestamp', table_name='service_request_archive')
+    op.drop_index('ix_service_request_archive_company_id_id', table_name='service_request_archive')
+    # Also drops the triggers and, on PostgreSQL, the monthly partitions
+    op.drop_table('service_request_archive')
@@ -4,7 +4,9 @@ from flask_login import UserMixin
 # Association table for many-to-many between Company and Region
 company_region = db.Table('company_region',
     db.Column('company_id', db.Integer, db.ForeignKey('company.id'), primary_key=True),
-    db.Column('region_id', db.Integer, db.ForeignKey('region.id'), primary_key=True)
+    db.Column('region_id', db.Integer, db.ForeignKey('region.id'), primary_key=True),
+    # The primary key covers company -> regions; this covers region -> companies
+    db.Index('ix_company_region_region_id_company_id', 'region_id', 'company_id')
 )
 
 class User(db.Model, UserMixin):
@@ -18,11 +20,17 @@ class User(db.Model, UserMixin):
 
 class Company(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    name = db.Column(db.String(100), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
     phone = db.Column(db.String(20), nullable=False)
-    email = db.Column(db.String(120), nullable=False)
+    email = db.Column(db.String(120), nullable=False, index=True)
     description = db.Column(db.Text, nullable=False)
+    # Set by an admin (see admin_routes.py); new registrations start unapproved
+    approved = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Where the company is based and how far it collects; indexed by geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    service_radius_km = db.Column(db.Float)
 
     user = db.relationship('User', back_populates='company')
 
@@ -36,14 +44,75 @@ class Company(db.Model):
 class Region(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
+    # Centre of the region, e.g. as a default point for /api/companies/nearby
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
 
 class ServiceRequest(db.Model):
+    __table_args__ = (
+        # A company's requests filtered by status, newest (highest id) first
+        db.Index('ix_service_request_company_id_status_id', 'company_id', 'status', 'id'),
+        # A company's requests across all statuses, newest first
+        db.Index('ix_service_request_company_id_id', 'company_id', 'id'),
+        # Platform-wide status dashboards, time-range scans and the dispatch sweep
+        db.Index('ix_service_request_status_timestamp', 'status', 'timestamp'),
+        # Detaching requests from regions removed by the admin bulk delete
+        db.Index('ix_service_request_region_id', 'region_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.Text, nullable=False)
+    # 'queued' until dispatch.py assigns a company, then 'pending'
     status = db.Column(db.String(20), default='pending')
     timestamp = db.Column(db.DateTime, server_default=db.func.now())
 
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    # Where the service is needed and how to reach the requester
+    region_id = db.Column(db.Integer, db.ForeignKey('region.id'))
+    contact_name = db.Column(db.String(100))
+    contact_email = db.Column(db.String(120))
+    contact_phone = db.Column(db.String(20))
+
+    # Empty while the request is queued or unmatched
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'))
 
     # Link back to company
     company = db.relationship('Company', back_populates='service_requests')
+
+# Closed requests moved out of service_request by archive.py. Rows are a
+# snapshot: company_id and region_id may refer to since-deleted rows. On
+# PostgreSQL the table is partitioned by month of `timestamp`, so the
+# partition key is part of the primary key.
+class ServiceRequestArchive(db.Model):
+    __table_args__ = (
+        # A company's archived requests, newest first
+        db.Index('ix_service_request_archive_company_id_id', 'company_id', 'id'),
+        # Date-range reads, the archive boundary and retention purges
+        db.Index('ix_service_request_archive_timestamp', 'timestamp'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    timestamp = db.Column(db.DateTime, primary_key=True)
+    region_id = db.Column(db.Integer)
+    contact_name = db.Column(db.String(100))
+    contact_email = db.Column(db.String(120))
+    contact_phone = db.Column(db.String(20))
+    company_id = db.Column(db.Integer)
+
+# Summary tables kept current by database triggers (see stats.py)
+class StatCounter(db.Model):
+    # 'companies', 'regions' and 'requests:<status>'
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class RegionStats(db.Model):
+    region_id = db.Column(db.Integer, db.ForeignKey('region.id', ondelete='CASCADE'), primary_key=True)
+    company_count = db.Column(db.Integer, nullable=False, default=0)
+
+class RequestDailyStats(db.Model):
+    # Service requests by creation day and current status
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,162 @@
+import base64
+import json
+
+from sqlalchemy import select
+
+from models import Company, company_region
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Sortable columns; Company.id is always appended as the tiebreaker so the
+# (sort value, id) pair is unique and the keyset is stable.
+COMPANY_SORT_KEYS = {
+    'id': Company.id,
+    'name': Company.name,
+    'email': Company.email,
+}
+
+
+class PaginationError(ValueError):
+    """Raised for malformed limit/sort/cursor query parameters."""
+
+
+# -----------------------------------
+# Cursor encoding
+# -----------------------------------
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(payload, dict):
+        raise PaginationError('Invalid cursor')
+    return payload
+
+
+# -----------------------------------
+# Query parameter parsing
+# -----------------------------------
+def is_paginated_request(args):
+    return 'limit' in args or 'cursor' in args
+
+
+def parse_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+
+def parse_sort(args, sort_keys):
+    sort = args.get('sort', 'id')
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    if field not in sort_keys:
+        raise PaginationError(f"sort must be one of: {', '.join(sorted(sort_keys))}")
+    return field, descending
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+# -----------------------------------
+# Company filters
+# -----------------------------------
+def filter_companies(query, args):
+    region_id = args.get('region')
+    if region_id:
+        try:
+            region_id = int(region_id)
+        except ValueError:
+            raise PaginationError('region must be an integer')
+        # IN-subquery rather than a join so a company never appears twice
+        query = query.filter(Company.id.in_(
+            select([company_region.c.company_id]).where(company_region.c.region_id == region_id)
+        ))
+
+    name = args.get('name')
+    if name:
+        query = query.filter(Company.name.ilike(_escape_like(name) + '%', escape='\\'))
+
+    approved = args.get('approved')
+    if approved:
+        if approved not in ('true', 'false'):
+            raise PaginationError('approved must be true or false')
+        query = query.filter(Company.approved.is_(approved == 'true'))
+
+    search = args.get('q')
+    if search:
+        query = query.filter(
+            Company.description.ilike('%' + _escape_like(search) + '%', escape='\\')
+        )
+
+    return query
+
+
+# -----------------------------------
+# Keyset pagination
+# -----------------------------------
+def keyset_paginate(query, args, sort_keys, id_column):
+    """Return one page of ``query`` and the cursor for the next page.
+
+    The query is ordered by ``(sort column, id)`` and resumed after the
+    ``(last_col, last_id)`` pair of the previous page, so every page costs
+    the same regardless of how deep into the listing the client is.
+    """
+    limit = parse_limit(args)
+    field, descending = parse_sort(args, sort_keys)
+    column = sort_keys[field]
+
+    token = args.get('cursor')
+    if token:
+        cursor = decode_cursor(token)
+        if cursor.get('s') != args.get('sort', 'id') or 'id' not in cursor:
+            raise PaginationError('Cursor does not match the requested sort')
+        last_value, last_id = cursor.get('v'), cursor['id']
+        # Written as `col >= v AND (col > v OR id > last_id)` rather than a bare
+        # OR so the planner can still range-scan the index on the sort column.
+        if column is id_column:
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        elif descending:
+            query = query.filter(
+                (column <= last_value) & ((column < last_value) | (id_column < last_id))
+            )
+        else:
+            query = query.filter(
+                (column >= last_value) & ((column > last_value) | (id_column > last_id))
+            )
+
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor({
+            's': args.get('sort', 'id'),
+            'v': getattr(last, column.key),
+            'id': getattr(last, id_column.key),
+        })
+
+    return items, next_cursor
+
+
+def paginate_companies(query, args):
+    query = filter_companies(query, args)
+    return keyset_paginate(query, args, COMPANY_SORT_KEYS, Company.id)
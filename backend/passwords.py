@@ -0,0 +1,97 @@
+"""Password hashing off the request thread, with bounded concurrency.
+
+pbkdf2 is deliberately slow, and a login burst hashing on every request
+thread leaves no CPU for the rest of the API. PasswordHasher runs hashing
+and verification on a small thread pool (PASSWORD_HASH_WORKERS). hashlib
+releases the GIL while it hashes, so other requests keep running. At most
+PASSWORD_HASH_QUEUE_SIZE jobs may wait for a worker. Beyond that, callers
+get HashingBusy straight away instead of queueing behind the burst.
+
+The work factor comes from PASSWORD_HASH_METHOD and
+PASSWORD_HASH_ITERATIONS. A stored hash made with other parameters still
+verifies, and ``needs_rehash`` tells the login route to upgrade it.
+On Linux the workers also run at a lower CPU priority (PASSWORD_HASH_NICE),
+so other request threads are scheduled first when CPUs are short.
+PASSWORD_HASH_WORKERS=0 hashes inline, e.g. for CLI commands.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+
+class HashingBusy(RuntimeError):
+    """Raised when the hashing pool and its queue are full or too slow."""
+
+
+def hash_password(password, method):
+    # Module level so the importer's process pool can pickle it
+    return generate_password_hash(password, method=method)
+
+
+def _lower_priority(niceness):
+    # Linux schedules threads individually, so this only affects the hashing
+    # workers. Elsewhere, or without permission, they keep normal priority.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+        self.timeout = None
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        method = app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+        if method.startswith('pbkdf2:') and method.count(':') == 1:
+            # Spelled out, so needs_rehash can compare it with stored hashes
+            method += f":{app.config.get('PASSWORD_HASH_ITERATIONS') or DEFAULT_PBKDF2_ITERATIONS}"
+        self.method = method
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = self._slots = None
+        if workers:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash',
+                                                initializer=_lower_priority,
+                                                initargs=(app.config.get('PASSWORD_HASH_NICE', 10),))
+            # Running plus waiting jobs
+            self._slots = threading.BoundedSemaphore(workers + app.config.get('PASSWORD_HASH_QUEUE_SIZE', 16))
+        app.extensions['password_hasher'] = self
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('Password hashing queue is full')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy('Password hashing timed out')
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.method)
+
+    def verify(self, stored, password):
+        return self._run(check_password_hash, stored, password)
+
+    def needs_rehash(self, stored):
+        """True if ``stored`` was made with a different method or work factor."""
+        return stored.split('$', 1)[0] != self.method
+
+
+password_hasher = PasswordHasher()
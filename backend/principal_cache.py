@@ -0,0 +1,143 @@
+import hashlib
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from cache import MemoryCache, cache
+from extensions import db
+from models import User
+
+REJECTED = 'rejected'
+
+
+class PrincipalCache:
+    """Bounded TTL cache of verified JWT principals for token_required.
+
+    Entries are keyed by a hash of the raw token and hold a column snapshot
+    of the User, which is re-attached to the request's session without a
+    query. Rejected tokens are cached for a shorter time.
+
+    Each user has a version counter in the response cache backend, bumped
+    once an update or delete of the user commits. With CACHE_BACKEND=redis
+    the counters are shared, so role changes and deleted accounts take
+    effect on the next request in any worker. The default memory backend
+    keeps them per process: other workers serve their cached principal
+    until it expires (AUTH_CACHE_TTL). Callers read the version before
+    loading the user (see token_required), so a load racing a commit is
+    stored under the old version and never served.
+    """
+
+    def __init__(self, max_entries=4096, ttl=60, negative_ttl=10):
+        self.entries = MemoryCache(max_entries, ttl)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.invalidations = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get('AUTH_CACHE_ENABLED', True)
+        self.ttl = app.config.get('AUTH_CACHE_TTL', self.ttl)
+        self.negative_ttl = app.config.get('AUTH_CACHE_NEGATIVE_TTL', self.negative_ttl)
+        self.entries = MemoryCache(app.config.get('AUTH_CACHE_MAX_ENTRIES', 4096), self.ttl)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def version(user_id):
+        if cache.backend is None:
+            return 0
+        return cache.backend.get_counter(f'principal:{user_id}')
+
+    def lookup(self, token):
+        """Return a user snapshot, REJECTED, or None on a miss."""
+        if not self.enabled:
+            return None
+        entry = self.entries.get(self._key(token))
+        if entry == REJECTED:
+            self._count('negative_hits')
+            return REJECTED
+        if entry is None or entry['version'] != self.version(entry['user']['id']):
+            self._count('misses')
+            return None
+        self._count('hits')
+        return entry['user']
+
+    def store(self, token, user, version, expires_at=None):
+        """Cache ``user``, loaded after reading ``version`` from version()."""
+        if not self.enabled:
+            return
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, int(expires_at - time.time()))
+            if ttl <= 0:
+                return
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        entry = {'user': snapshot, 'version': version}
+        self.entries.set(self._key(token), entry, ttl)
+
+    def reject(self, token):
+        if self.enabled:
+            self.entries.set(self._key(token), REJECTED, self.negative_ttl)
+
+    def invalidate_user(self, user_id):
+        if cache.backend is not None:
+            cache.backend.incr(f'principal:{user_id}')
+        self._count('invalidations')
+
+    def _count(self, name):
+        # Shared by the server's request threads and the dispatch workers
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            hits, misses, negative_hits = self.hits, self.misses, self.negative_hits
+            invalidations = self.invalidations
+        lookups = hits + misses + negative_hits
+        return {
+            'hits': hits,
+            'misses': misses,
+            'negativeHits': negative_hits,
+            'invalidations': invalidations,
+            'hitRate': (hits + negative_hits) / lookups if lookups else 0.0
+        }
+
+    @staticmethod
+    def attach(snapshot):
+        """Rebuild a persistent User from a snapshot without emitting SQL."""
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+
+principal_cache = PrincipalCache()
+
+
+# Invalidated at commit, like the response cache (see cache.mark_stale): a
+# flush may still roll back, and other workers must not reload the row
+# before the change is visible to them.
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _collect_stale_principal(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('stale_principals', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stale_principals(session):
+    for user_id in session.info.pop('stale_principals', ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale_principals(session):
+    session.info.pop('stale_principals', None)
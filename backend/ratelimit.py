@@ -0,0 +1,175 @@
+"""Token-bucket rate limiting for the auth endpoints.
+
+Each protected scope has two buckets: one per client IP and one per account
+(e.g. the email being logged into). A request takes one token from each, and
+a bucket refills continuously at its rule's rate. Rules are written
+"<tokens>/<seconds>": "10/60" allows bursts of 10 and one more request every
+6 seconds. An empty bucket answers 429 with Retry-After.
+
+The memory backend is per process. The Redis backend shares buckets across
+workers and takes any client exposing redis-py's ``eval`` (pass ``client`` to
+inject a stand-in such as fakeredis).
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify, current_app
+
+
+def parse_rule(rule):
+    """"10/60" -> (capacity 10, refill 10/60 tokens per second)."""
+    tokens, _, seconds = str(rule).partition('/')
+    capacity, period = int(tokens), float(seconds or 1)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f'Invalid rate limit rule: {rule!r}')
+    return capacity, capacity / period
+
+
+# -----------------------------------
+# Backends
+# -----------------------------------
+class MemoryRateLimitBackend:
+    """Buckets in an LRU-bounded dict; the least recently used are dropped first."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, now=None):
+        """Take one token; returns (allowed, seconds until one is available)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# KEYS[1] bucket; ARGV capacity, rate, now. Stores "tokens updated" and lets
+# the key expire once it would have refilled completely.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens, updated = capacity, now
+local state = redis.call('GET', KEYS[1])
+if state then
+    local sep = string.find(state, ' ')
+    tokens = tonumber(string.sub(state, 1, sep - 1))
+    updated = tonumber(string.sub(state, sep + 1))
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('SET', KEYS[1], string.format('%.6f %.6f', tokens, now), 'EX', math.ceil(capacity / rate) + 1)
+return {allowed, string.format('%.6f', tokens)}
+"""
+
+
+class RedisRateLimitBackend:
+    """Buckets updated atomically by a Lua script, shared by every worker."""
+
+    def __init__(self, client=None, url=None, prefix='ecowaste:ratelimit:'):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def consume(self, key, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        allowed, tokens = self.client.eval(TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, capacity, rate, now)
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+# -----------------------------------
+# Flask extension
+# -----------------------------------
+class RateLimiter:
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATELIMIT_ENABLED', True)
+        backend = app.config.get('RATELIMIT_BACKEND', 'memory')
+        if backend == 'redis':
+            self.backend = RedisRateLimitBackend(url=app.config.get('RATELIMIT_REDIS_URL'))
+        elif backend == 'memory':
+            self.backend = MemoryRateLimitBackend(app.config.get('RATELIMIT_MAX_KEYS', 100000))
+        else:
+            raise ValueError(f'Unknown RATELIMIT_BACKEND: {backend}')
+        self.rules = {}
+        app.extensions['rate_limiter'] = self
+
+    def _rule(self, name):
+        rule = self.rules.get(name)
+        if rule is None:
+            rule = self.rules[name] = parse_rule(current_app.config[name])
+        return rule
+
+    def _take(self, key, rule_name):
+        capacity, rate = self._rule(rule_name)
+        return self.backend.consume(key, capacity, rate)
+
+    def limit(self, scope, account_field=None):
+        """Limit a view per IP (RATELIMIT_<SCOPE>_PER_IP) and, when the JSON body
+        has ``account_field``, per account (RATELIMIT_<SCOPE>_PER_ACCOUNT)."""
+        prefix = 'RATELIMIT_' + scope.upper()
+
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if not self.enabled or self.backend is None:
+                    return f(*args, **kwargs)
+
+                allowed, retry_after = self._take(f'{scope}:ip:{request.remote_addr}', prefix + '_PER_IP')
+                account = None
+                if allowed and account_field:
+                    data = request.get_json(silent=True)
+                    account = data.get(account_field) if isinstance(data, dict) else None
+                if allowed and isinstance(account, str) and account:
+                    # Hashed so raw emails never end up as Redis keys
+                    digest = hashlib.sha256(account.strip().lower().encode()).hexdigest()[:32]
+                    allowed, retry_after = self._take(f'{scope}:account:{digest}', prefix + '_PER_ACCOUNT')
+                if allowed:
+                    return f(*args, **kwargs)
+
+                response = jsonify({'message': 'Too many requests, try again later'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+
+            return decorated
+
+        return decorator
+
+
+limiter = RateLimiter()
@@ -2,10 +2,13 @@
 
 from flask import Blueprint, jsonify
 from models import Region
+from cache import cached_response
+from helpers import format_region
 
 regions_bp = Blueprint('regions', __name__, url_prefix='/api')
 
 @regions_bp.route('/regions', methods=['GET'])
+@cached_response('regions')
 def get_regions():
     regions = Region.query.all()
-    return jsonify([{'id': r.id, 'name': r.name} for r in regions])
+    return jsonify([format_region(r) for r in regions])
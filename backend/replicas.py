@@ -0,0 +1,312 @@
+"""Read/write splitting between the primary database and read replicas.
+
+RoutingSession (the session class behind ``extensions.db``) asks the
+ReplicaRouter for a bind on every statement. A request is routed to a
+replica when all of these hold:
+- it is a GET/HEAD/OPTIONS request, or its view is marked @use_replica
+- its view is not marked @use_primary
+- the client has not written within DB_STICKY_SECONDS
+Everything else goes to the primary. That includes CLI commands and
+background threads, flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE,
+and every statement after the first write of a request.
+
+"Recently wrote" is remembered in a cookie, which works across workers,
+and per process for authenticated clients, keyed by the Authorization
+header. Anonymous clients rely on the cookie alone: keying them by address
+would pin everyone behind a shared NAT or proxy to the primary after a
+single public submission.
+
+A background thread runs DB_REPLICA_HEALTH_QUERY on each replica every
+DB_REPLICA_CHECK_INTERVAL seconds. It is started in each process on its
+first routed statement, so pre-forking servers get one per worker. A
+replica that fails a check, or drops a connection, gets no new requests
+until it passes again. With no healthy replica, reads fall back to the
+primary.
+
+For local testing, SQLite files can stand in for replicas. ``flask
+sync-replicas`` copies the primary into each of them.
+"""
+import hashlib
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import click
+from flask import g, request, has_request_context
+from flask.cli import with_appcontext
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+def is_read(clause):
+    """True if ``clause`` only reads (plain SELECT, not FOR UPDATE)."""
+    if isinstance(clause, TextClause):
+        words = clause.text.split(None, 1)
+        return bool(words) and words[0].upper() in ('SELECT', 'WITH')
+    return bool(getattr(clause, 'is_select', False)) and getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSession(SignallingSession):
+    def get_bind(self, mapper=None, clause=None):
+        replica = db_router.bind_for(None if self._flushing else clause)
+        if replica is not None:
+            return replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+# -----------------------------------
+# Replicas and health checks
+# -----------------------------------
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+
+    def check(self, query):
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text(query))
+        except Exception as e:
+            self.mark(False, e)
+        else:
+            self.mark(True)
+
+    def mark(self, healthy, error=None):
+        if healthy != self.healthy:
+            if healthy:
+                logger.warning('Replica %s is healthy again', self.name)
+            else:
+                logger.warning('Replica %s is unhealthy, reads fall back to other replicas: %s', self.name, error)
+        self.healthy = healthy
+
+
+class HealthMonitor:
+    """Daemon thread checking every replica at a fixed interval."""
+
+    def __init__(self, replicas, query, interval):
+        self.replicas = replicas
+        self.query = query
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for replica in self.replicas:
+                replica.check(self.query)
+
+    def stop(self):
+        self._stop.set()
+
+
+# -----------------------------------
+# Flask extension
+# -----------------------------------
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.replicas = []
+        self.sticky_seconds = 0
+        self.cookie = None
+        self._monitor = None
+        self._monitor_pid = None
+        self._monitor_lock = threading.Lock()
+        self._health_query = 'SELECT 1'
+        self._check_interval = 0
+        self._recent = OrderedDict()
+        self._recent_lock = threading.Lock()
+        self._max_recent = 10000
+        self._next = itertools.count()
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def engines(self):
+        return [replica.engine for replica in self.replicas]
+
+    def init_app(self, app):
+        if self._monitor is not None:
+            self._monitor.stop()
+        for replica in self.replicas:
+            replica.engine.dispose()
+        self._monitor = self._monitor_pid = None
+        self._recent.clear()
+
+        options = app.config.get('SQLALCHEMY_REPLICA_ENGINE_OPTIONS', {})
+        self.replicas = [
+            Replica(f'replica{i}', create_engine(url, **options))
+            for i, url in enumerate(app.config.get('SQLALCHEMY_REPLICA_URIS') or [], start=1)
+        ]
+        for replica in self.replicas:
+            event.listen(replica.engine, 'handle_error', self._on_error(replica))
+        self.sticky_seconds = app.config.get('DB_STICKY_SECONDS', 5)
+        self.cookie = app.config.get('DB_STICKY_COOKIE', 'db_primary_until')
+        self._max_recent = app.config.get('DB_STICKY_MAX_CLIENTS', 10000)
+        self._health_query = app.config.get('DB_REPLICA_HEALTH_QUERY', 'SELECT 1')
+        self._check_interval = app.config.get('DB_REPLICA_CHECK_INTERVAL', 5)
+        if app.extensions.get('replica_router') is not self:
+            app.after_request(self._remember_write)
+        app.extensions['replica_router'] = self
+
+    def _start_monitor(self):
+        """Start the health checks in this process, e.g. in a worker forked after init_app."""
+        pid = os.getpid()
+        if not self._check_interval or self._monitor_pid == pid:
+            return
+        with self._monitor_lock:
+            if self._monitor_pid != pid:
+                self._monitor = HealthMonitor(self.replicas, self._health_query, self._check_interval)
+                self._monitor_pid = pid
+
+    @staticmethod
+    def _on_error(replica):
+        def handle_error(context):
+            # Connection failures only; a bad query says nothing about the replica
+            if context.is_disconnect or context.connection is None:
+                replica.mark(False, context.original_exception)
+        return handle_error
+
+    # Routing
+    def _client_key(self):
+        """Per-process stickiness key, or None for anonymous clients."""
+        identity = request.headers.get('Authorization')
+        return hashlib.sha256(identity.encode()).hexdigest()[:32] if identity else None
+
+    def _sticky(self):
+        """True if this client wrote within the sticky window."""
+        now = time.time()
+        try:
+            if float(request.cookies.get(self.cookie, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        key = self._client_key()
+        if key is None:
+            return False
+        with self._recent_lock:
+            return self._recent.get(key, 0) > now
+
+    def route(self):
+        """'replica' or 'primary' for the rest of the current request."""
+        if 'db_route' not in g:
+            g.db_route = REPLICA if request.method in READ_METHODS and not self._sticky() else PRIMARY
+        return g.db_route
+
+    def pin_primary(self):
+        g.db_route = PRIMARY
+
+    def allow_replica(self):
+        if not g.get('db_wrote'):
+            g.db_route = PRIMARY if self._sticky() else REPLICA
+
+    def bind_for(self, clause):
+        """A replica engine for ``clause``, or None for the primary."""
+        if not self.replicas or not has_request_context():
+            return None
+        self._start_monitor()
+        if not is_read(clause):
+            self.wrote()
+            return None
+        if self.route() != REPLICA:
+            return None
+        replica = g.get('db_replica')
+        if replica is None or not replica.healthy:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            # One replica per request, so its reads see a single snapshot
+            replica = g.db_replica = healthy[next(self._next) % len(healthy)]
+        return replica.engine
+
+    def wrote(self):
+        """Send the rest of this request, and the client's next ones, to the primary."""
+        g.db_route = PRIMARY
+        g.db_wrote = True
+
+    def _remember_write(self, response):
+        if not self.replicas or not g.get('db_wrote') or not self.sticky_seconds:
+            return response
+        until = time.time() + self.sticky_seconds
+        key = self._client_key()
+        if key is not None:
+            with self._recent_lock:
+                self._recent[key] = until
+                self._recent.move_to_end(key)
+                while len(self._recent) > self._max_recent:
+                    self._recent.popitem(last=False)
+        response.set_cookie(self.cookie, f'{until:.3f}', max_age=int(self.sticky_seconds) + 1,
+                            httponly=True, samesite='Lax')
+        return response
+
+
+db_router = ReplicaRouter()
+
+
+def use_primary(f):
+    """Serve a view from the primary, e.g. where freshness matters more than load."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        db_router.pin_primary()
+        return f(*args, **kwargs)
+    return decorated
+
+
+def use_replica(f):
+    """Let a read-only view that is not a GET read from a replica (the sticky window still applies)."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        db_router.allow_replica()
+        return f(*args, **kwargs)
+    return decorated
+
+
+# -----------------------------------
+# Local SQLite replicas
+# -----------------------------------
+def sqlite_path(url):
+    """Filesystem path of an SQLite engine URL, including file: URIs."""
+    path = url.database or ''
+    if path.startswith('file:'):
+        path = path[len('file:'):].split('?', 1)[0]
+    return path
+
+
+@click.command('sync-replicas')
+@with_appcontext
+def sync_replicas_command():
+    """Copy the SQLite primary into each SQLite replica file."""
+    from extensions import db
+
+    primary = db.engine.url
+    if primary.get_backend_name() != 'sqlite':
+        raise click.ClickException('sync-replicas only copies SQLite databases')
+    source = sqlite3.connect(sqlite_path(primary))
+    try:
+        for replica in db_router.replicas:
+            if replica.engine.url.get_backend_name() != 'sqlite':
+                click.echo(f'Skipping {replica.name}: not SQLite')
+                continue
+            replica.engine.dispose()
+            target = sqlite3.connect(sqlite_path(replica.engine.url))
+            try:
+                source.backup(target)
+                # Rollback journal, so read-only connections need no -wal/-shm files
+                target.execute('PRAGMA journal_mode=DELETE')
+            finally:
+                target.close()
+            click.echo(f'Copied {sqlite_path(primary)} to {sqlite_path(replica.engine.url)}')
+    finally:
+        source.close()
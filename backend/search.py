@@ -0,0 +1,180 @@
+"""Full-text company search over name, description and region names.
+
+SQLite uses an FTS5 table (``company_search``, rowid = company id). PostgreSQL
+uses a ``company_search`` table holding a weighted tsvector with a GIN
+index. On both, database triggers keep the index in sync with company,
+company_region and region writes, including Core bulk inserts that bypass
+the ORM. The DDL is installed by migration 0003 and, for databases built
+with db.create_all(), by the metadata after_create hook below.
+"""
+import hashlib
+import re
+
+from sqlalchemy import event, text
+
+from extensions import db
+from pagination import PaginationError, parse_limit, encode_cursor, decode_cursor
+
+# Regions of one company, space separated; correlated on company_search.rowid
+_SQLITE_REGIONS = (
+    "COALESCE((SELECT group_concat(region.name, ' ') FROM company_region "
+    "JOIN region ON region.id = company_region.region_id "
+    "WHERE company_region.company_id = {company_id}), '')"
+)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS company_search USING fts5("
+    "name, description, regions, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_ai AFTER INSERT ON company BEGIN "
+    "INSERT INTO company_search (rowid, name, description, regions) "
+    f"VALUES (new.id, new.name, new.description, {_SQLITE_REGIONS.format(company_id='new.id')}); END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_au AFTER UPDATE OF name, description ON company BEGIN "
+    "UPDATE company_search SET name = new.name, description = new.description WHERE rowid = new.id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_ad AFTER DELETE ON company BEGIN "
+    "DELETE FROM company_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_region_ai AFTER INSERT ON company_region BEGIN "
+    f"UPDATE company_search SET regions = {_SQLITE_REGIONS.format(company_id='new.company_id')} "
+    "WHERE rowid = new.company_id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_company_region_ad AFTER DELETE ON company_region BEGIN "
+    f"UPDATE company_search SET regions = {_SQLITE_REGIONS.format(company_id='old.company_id')} "
+    "WHERE rowid = old.company_id; END",
+    "CREATE TRIGGER IF NOT EXISTS company_search_region_au AFTER UPDATE OF name ON region BEGIN "
+    f"UPDATE company_search SET regions = {_SQLITE_REGIONS.format(company_id='company_search.rowid')} "
+    "WHERE rowid IN (SELECT company_id FROM company_region WHERE region_id = new.id); END",
+    # Backfill companies that predate the index
+    "INSERT INTO company_search (rowid, name, description, regions) "
+    f"SELECT company.id, company.name, company.description, {_SQLITE_REGIONS.format(company_id='company.id')} "
+    "FROM company WHERE company.id NOT IN (SELECT rowid FROM company_search)",
+]
+
+POSTGRESQL_DDL = [
+    "CREATE TABLE IF NOT EXISTS company_search ("
+    "company_id INTEGER PRIMARY KEY REFERENCES company (id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_company_search_document ON company_search USING GIN (document)",
+    """CREATE OR REPLACE FUNCTION company_search_refresh(cid INTEGER) RETURNS VOID AS $$
+        INSERT INTO company_search (company_id, document)
+        SELECT c.id,
+               setweight(to_tsvector('simple', c.name), 'A')
+               || setweight(to_tsvector('simple', COALESCE((
+                      SELECT string_agg(r.name, ' ') FROM company_region cr
+                      JOIN region r ON r.id = cr.region_id WHERE cr.company_id = c.id), '')), 'B')
+               || setweight(to_tsvector('simple', c.description), 'C')
+        FROM company c WHERE c.id = cid
+        ON CONFLICT (company_id) DO UPDATE SET document = EXCLUDED.document
+    $$ LANGUAGE sql""",
+    """CREATE OR REPLACE FUNCTION company_search_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_TABLE_NAME = 'company' THEN
+            PERFORM company_search_refresh(NEW.id);
+        ELSIF TG_TABLE_NAME = 'company_region' THEN
+            PERFORM company_search_refresh(CASE WHEN TG_OP = 'DELETE' THEN OLD.company_id ELSE NEW.company_id END);
+        ELSE
+            PERFORM company_search_refresh(company_id) FROM company_region WHERE region_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS company_search_company ON company",
+    "CREATE TRIGGER company_search_company AFTER INSERT OR UPDATE OF name, description ON company "
+    "FOR EACH ROW EXECUTE FUNCTION company_search_trigger()",
+    "DROP TRIGGER IF EXISTS company_search_company_region ON company_region",
+    "CREATE TRIGGER company_search_company_region AFTER INSERT OR DELETE ON company_region "
+    "FOR EACH ROW EXECUTE FUNCTION company_search_trigger()",
+    "DROP TRIGGER IF EXISTS company_search_region ON region",
+    "CREATE TRIGGER company_search_region AFTER UPDATE OF name ON region "
+    "FOR EACH ROW EXECUTE FUNCTION company_search_trigger()",
+    "SELECT company_search_refresh(id) FROM company "
+    "WHERE id NOT IN (SELECT company_id FROM company_search)",
+]
+
+DDL = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRESQL_DDL}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def install_search_index(target, connection, **kw):
+    for statement in DDL.get(connection.dialect.name, []):
+        connection.execute(text(statement))
+
+
+# -----------------------------------
+# Query building
+# -----------------------------------
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(q):
+    """Split free text into index tokens; every token is prefix-matched."""
+    return [token.lower() for token in TOKEN_RE.findall(q or '')][:16]
+
+
+def _terms_digest(terms):
+    # Binds a cursor to its query: ranks from one query mean nothing for another
+    return hashlib.sha256(' '.join(terms).encode()).hexdigest()[:16]
+
+
+def _sqlite_match(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _postgresql_match(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+# Lower rank sorts first on both backends: bm25() is already "smaller is
+# better", ts_rank() is negated.
+SEARCH_SQL = {
+    'sqlite': (
+        "SELECT rowid AS id, bm25(company_search, 10.0, 1.0, 5.0) AS rank "
+        "FROM company_search WHERE company_search MATCH :match"
+    ),
+    'postgresql': (
+        "SELECT company_id AS id, -ts_rank(document, to_tsquery('simple', :match)) AS rank "
+        "FROM company_search WHERE document @@ to_tsquery('simple', :match)"
+    ),
+}
+MATCH_BUILDERS = {'sqlite': _sqlite_match, 'postgresql': _postgresql_match}
+
+
+def search_company_ids(args):
+    """Return ([(company_id, rank)], next_cursor) for one page of results."""
+    dialect = db.engine.dialect.name
+    if dialect not in SEARCH_SQL:
+        raise PaginationError(f'Full-text search is not supported on {dialect}')
+
+    terms = search_terms(args.get('q'))
+    if not terms:
+        raise PaginationError('q is required')
+    limit = parse_limit(args)
+    params = {'match': MATCH_BUILDERS[dialect](terms), 'limit': limit + 1}
+
+    where = []
+    region_id = args.get('region')
+    if region_id:
+        try:
+            params['region_id'] = int(region_id)
+        except ValueError:
+            raise PaginationError('region must be an integer')
+        where.append('id IN (SELECT company_id FROM company_region WHERE region_id = :region_id)')
+
+    token = args.get('cursor')
+    if token:
+        cursor = decode_cursor(token)
+        if cursor.get('s') != 'rank' or 'id' not in cursor or 'v' not in cursor:
+            raise PaginationError('Cursor does not match the requested sort')
+        if cursor.get('q') != _terms_digest(terms):
+            raise PaginationError('Cursor does not match the search query')
+        params.update(last_rank=cursor['v'], last_id=cursor['id'])
+        where.append('(rank > :last_rank OR (rank = :last_rank AND id > :last_id))')
+
+    sql = f"SELECT id, rank FROM ({SEARCH_SQL[dialect]}) AS matches"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY rank, id LIMIT :limit'
+
+    rows = db.session.execute(text(sql), params).fetchall()
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor({'s': 'rank', 'q': _terms_digest(terms), 'v': page[-1].rank, 'id': page[-1].id})
+    return [(row.id, row.rank) for row in page], next_cursor
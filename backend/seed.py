@@ -1,77 +1,57 @@
 from app import create_app
 from extensions import db
-from models import User, Region, Company
-from werkzeug.security import generate_password_hash
+from models import User
+from importer import ensure_regions, import_records
+from passwords import hash_password, password_hasher
 import random
 
-app = create_app()
-app.app_context().push()
+REGION_NAMES = [
+    'Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret',
+    'Thika', 'Nyeri', 'Machakos', 'Meru', 'Garissa'
+]
+
+# Sample companies with users
+SAMPLE_COMPANIES = [
+    {
+        'name': 'GreenCycle Ltd',
+        'email': 'greencycle@example.com',
+        'phone': '0712345678',
+        'description': 'Recycling and composting services'
+    },
+    # ... (other companies unchanged)
+    {
+        'name': 'KleanEarth Ltd',
+        'email': 'kleanearth@example.com',
+        'phone': '0788987654',
+        'description': 'Zero-waste initiative services'
+    }
+]
 
 def seed():
     # Create admin user
     if not User.query.filter_by(email='admin@ecowaste.com').first():
         admin_user = User(
             email='admin@ecowaste.com',
-            password=generate_password_hash('adminpass', method='pbkdf2:sha256'),
+            password=hash_password('adminpass', password_hasher.method),
             role='admin'
         )
         db.session.add(admin_user)
 
     # Seed regions
-    region_names = [
-        'Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret',
-        'Thika', 'Nyeri', 'Machakos', 'Meru', 'Garissa'
-    ]
-    existing_regions = {region.name for region in Region.query.all()}
-    for name in region_names:
-        if name not in existing_regions:
-            db.session.add(Region(name=name))
+    ensure_regions(REGION_NAMES)
     db.session.commit()
 
-    # Reload regions after commit
-    regions = Region.query.all()
-
-    # Sample companies with users
-    sample_companies = [
-        {
-            'name': 'GreenCycle Ltd',
-            'email': 'greencycle@example.com',
-            'phone': '0712345678',
-            'description': 'Recycling and composting services'
-        },
-        # ... (other companies unchanged)
-        {
-            'name': 'KleanEarth Ltd',
-            'email': 'kleanearth@example.com',
-            'phone': '0788987654',
-            'description': 'Zero-waste initiative services'
-        }
-    ]
-
-    for company_data in sample_companies:
-        if not User.query.filter_by(email=company_data['email']).first():
-            hashed_pw = generate_password_hash('companypass', method='pbkdf2:sha256')
-            user = User(
-                email=company_data['email'],
-                password=hashed_pw,
-                role='company'
-            )
-            db.session.add(user)
-            db.session.flush()
-
-            assigned_regions = random.sample(regions, k=random.choice([1, 2]))
-            company = Company(
-                name=company_data['name'],
-                email=company_data['email'],
-                phone=company_data['phone'],
-                description=company_data['description'],
-                user_id=user.id,
-                regions=assigned_regions
-            )
-            db.session.add(company)
-
-    db.session.commit()
+    # Sample companies with users, each serving one or two random regions
+    import_records(
+        [
+            {**company_data, 'regions': random.sample(REGION_NAMES, k=random.choice([1, 2]))}
+            for company_data in SAMPLE_COMPANIES
+        ],
+        default_password='companypass'
+    )
     print("✅ Database seeded with admin, regions, and sample companies.")
 
 if __name__ == '__main__':
+    app = create_app()
+    app.app_context().push()
     seed()
@@ -0,0 +1,182 @@
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+from models import ServiceRequest, ServiceRequestArchive, Region, Company
+from extensions import db
+from dispatch import dispatcher, QUEUED
+from helpers import token_required, format_service_request
+from pagination import keyset_paginate, parse_limit, PaginationError
+from exports import parse_date_range, ExportError
+from archive import archive_needed, merge_pages
+from replicas import use_primary
+
+service_requests_bp = Blueprint('service_requests', __name__, url_prefix='/api/service-requests')
+
+MAX_BATCH_SIZE = 500
+MAX_TRANSITION_IDS = 1000
+STATUSES = ('queued', 'unmatched', 'pending', 'accepted', 'completed', 'cancelled')
+# Target status -> statuses a request may move to it from
+TRANSITIONS = {
+    'accepted': ('pending',),
+    'completed': ('accepted',),
+    'cancelled': ('pending', 'accepted'),
+}
+# Ids grow in arrival order, so "-id" is newest first
+REQUEST_SORT_KEYS = {'id': ServiceRequest.id}
+ARCHIVE_SORT_KEYS = {'id': ServiceRequestArchive.id}
+CONTACT_FIELDS = (('contact_name', 100), ('contact_email', 120), ('contact_phone', 20))
+
+
+def _parse_submission(data):
+    """Return (fields, error message) for one submitted request."""
+    if not isinstance(data, dict):
+        return None, 'Expected a JSON object'
+    description = str(data.get('description') or '').strip()
+    if not description:
+        return None, 'description is required'
+    region_id = data.get('region_id')
+    if not isinstance(region_id, int) or isinstance(region_id, bool):
+        return None, 'region_id must be an integer'
+
+    fields = {'description': description, 'region_id': region_id}
+    for name, max_length in CONTACT_FIELDS:
+        value = str(data.get(name) or '').strip()
+        if len(value) > max_length:
+            return None, f'{name} must be at most {max_length} characters'
+        fields[name] = value or None
+    if not fields['contact_email'] and not fields['contact_phone']:
+        return None, 'contact_email or contact_phone is required'
+    return fields, None
+
+
+def _company_id(user):
+    return db.session.query(Company.id).filter(Company.user_id == user.id).scalar()
+
+
+# POST one request (object) or a batch (array). Requests are stored as
+# 'queued' and routed to a company in the background; responds 202.
+@service_requests_bp.route('', methods=['POST'])
+def submit_service_requests():
+    data = request.get_json(silent=True)
+    batch = isinstance(data, list)
+    items = data if batch else [data]
+    if not items or len(items) > MAX_BATCH_SIZE:
+        return jsonify({'message': f'Submit between 1 and {MAX_BATCH_SIZE} requests'}), 400
+
+    submissions, errors = [], []
+    for index, item in enumerate(items):
+        fields, error = _parse_submission(item)
+        if error:
+            errors.append({'index': index, 'message': error})
+        else:
+            submissions.append((index, fields))
+
+    region_ids = {fields['region_id'] for _, fields in submissions}
+    known = {region_id for region_id, in db.session.query(Region.id).filter(Region.id.in_(region_ids))}
+    errors.extend(
+        {'index': index, 'message': 'Region not found'}
+        for index, fields in submissions if fields['region_id'] not in known
+    )
+    if errors:
+        if not batch:
+            return jsonify({'message': errors[0]['message']}), 400
+        return jsonify({'message': 'Invalid service requests', 'errors': sorted(errors, key=lambda e: e['index'])}), 400
+
+    now = datetime.utcnow()
+    service_requests = [ServiceRequest(status=QUEUED, timestamp=now, **fields) for _, fields in submissions]
+    db.session.add_all(service_requests)
+    db.session.flush()
+    # Serialize before the commit expires the objects
+    payload = [format_service_request(service_request) for service_request in service_requests]
+    db.session.commit()
+
+    dispatcher.submit([item['id'] for item in payload])
+    if batch:
+        return jsonify({'items': payload}), 202
+    return jsonify(payload[0]), 202
+
+# GET the current company's requests (admins see all), newest first.
+# Accepts `status`, `from`/`to` (ISO dates), `limit` and `cursor`; admins may
+# also pass `company`. Archived requests are included when the filters can
+# match them (see archive.py).
+# Read from the primary: the background dispatcher routes requests after the
+# submitter's sticky window may have passed.
+@service_requests_bp.route('', methods=['GET'])
+@use_primary
+@token_required
+def list_service_requests(current_user):
+    if current_user.role == 'admin':
+        company_id = request.args.get('company')
+    else:
+        company_id = _company_id(current_user)
+        if company_id is None:
+            return jsonify({'message': 'Company profile not found'}), 404
+
+    status = request.args.get('status')
+    if status and status not in STATUSES:
+        return jsonify({'message': f"status must be one of: {', '.join(STATUSES)}"}), 400
+    try:
+        start, end = parse_date_range(request.args)
+    except ExportError as e:
+        return jsonify({'message': str(e)}), 400
+
+    def filtered(model):
+        query = model.query
+        if company_id:
+            query = query.filter(model.company_id == company_id)
+        if status:
+            query = query.filter(model.status == status)
+        if start is not None:
+            query = query.filter(model.timestamp >= start)
+        if end is not None:
+            query = query.filter(model.timestamp < end)
+        return query
+
+    args = request.args.to_dict()
+    args.setdefault('sort', '-id')
+    try:
+        items, next_cursor = keyset_paginate(filtered(ServiceRequest), args, REQUEST_SORT_KEYS, ServiceRequest.id)
+        if archive_needed(status, start):
+            archived = keyset_paginate(filtered(ServiceRequestArchive), args, ARCHIVE_SORT_KEYS,
+                                       ServiceRequestArchive.id)
+            items, next_cursor = merge_pages([(items, next_cursor), archived], args, parse_limit(args))
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    return jsonify({
+        'items': [format_service_request(item) for item in items],
+        'nextCursor': next_cursor
+    }), 200
+
+# PATCH {"ids": [...], "status": "accepted"} moves every listed request that
+# is allowed to make that transition in one UPDATE; the rest are skipped.
+@service_requests_bp.route('/status', methods=['PATCH'])
+@token_required
+def transition_service_requests(current_user):
+    data = request.get_json(silent=True) or {}
+    status = data.get('status')
+    if status not in TRANSITIONS:
+        return jsonify({'message': f"status must be one of: {', '.join(TRANSITIONS)}"}), 400
+    ids = data.get('ids')
+    if (not isinstance(ids, list) or not 0 < len(ids) <= MAX_TRANSITION_IDS
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        return jsonify({'message': f'ids must be a list of 1 to {MAX_TRANSITION_IDS} integers'}), 400
+
+    query = ServiceRequest.query.filter(
+        ServiceRequest.id.in_(set(ids)),
+        ServiceRequest.status.in_(TRANSITIONS[status])
+    )
+    if current_user.role != 'admin':
+        company_id = _company_id(current_user)
+        if company_id is None:
+            return jsonify({'message': 'Company profile not found'}), 404
+        query = query.filter(ServiceRequest.company_id == company_id)
+
+    updated = sorted(request_id for request_id, in query.with_entities(ServiceRequest.id).with_for_update())
+    if updated:
+        query.filter(ServiceRequest.id.in_(updated)).update({'status': status}, synchronize_session=False)
+    db.session.commit()
+    return jsonify({
+        'status': status,
+        'updated': updated,
+        'skipped': sorted(set(ids) - set(updated))
+    }), 200
@@ -0,0 +1,226 @@
+"""Incrementally maintained platform statistics for the admin dashboard.
+
+Database triggers keep three summary tables up to date as rows change:
+stat_counter (company/region totals and service requests per status),
+region_stats (companies per region through company_region) and
+request_daily_stats (requests per creation day and status). Requests
+moved to the archive (see archive.py) still count. Triggers also see Core
+bulk inserts from the importer, so the dashboard reads O(regions + days)
+rows instead of aggregating the base tables.
+
+Migrations 0004 and 0008 install the triggers; databases built with db.create_all()
+get them from the metadata after_create hook below. `flask rebuild-stats`
+recomputes the summaries from scratch.
+"""
+from datetime import date, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, text
+
+from extensions import db
+from models import Region, StatCounter, RegionStats, RequestDailyStats
+
+
+def _sqlite_counter(name, delta):
+    return (f"INSERT INTO stat_counter (name, value) VALUES ({name}, {delta}) "
+            "ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;")
+
+
+def _sqlite_region(region_id, delta):
+    return (f"INSERT INTO region_stats (region_id, company_count) VALUES ({region_id}, {delta}) "
+            "ON CONFLICT (region_id) DO UPDATE SET company_count = region_stats.company_count + excluded.company_count;")
+
+
+def _sqlite_request(row, delta):
+    status = f"COALESCE({row}.status, 'pending')"
+    return (_sqlite_counter(f"'requests:' || {status}", delta) +
+            " INSERT INTO request_daily_stats (day, status, count) "
+            f"VALUES (date(COALESCE({row}.timestamp, CURRENT_TIMESTAMP)), {status}, {delta}) "
+            "ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;")
+
+
+SQLITE_DDL = [
+    "CREATE TRIGGER IF NOT EXISTS stats_company_ai AFTER INSERT ON company BEGIN "
+    f"{_sqlite_counter(repr('companies'), 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_company_ad AFTER DELETE ON company BEGIN "
+    f"{_sqlite_counter(repr('companies'), -1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_region_ai AFTER INSERT ON region BEGIN "
+    f"{_sqlite_counter(repr('regions'), 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_region_ad AFTER DELETE ON region BEGIN "
+    f"{_sqlite_counter(repr('regions'), -1)} DELETE FROM region_stats WHERE region_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS stats_company_region_ai AFTER INSERT ON company_region BEGIN "
+    f"{_sqlite_region('new.region_id', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_company_region_ad AFTER DELETE ON company_region BEGIN "
+    f"{_sqlite_region('old.region_id', -1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_ai AFTER INSERT ON service_request BEGIN "
+    f"{_sqlite_request('new', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_au AFTER UPDATE OF status ON service_request "
+    f"WHEN old.status IS NOT new.status BEGIN {_sqlite_request('old', -1)} {_sqlite_request('new', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_ad AFTER DELETE ON service_request BEGIN "
+    f"{_sqlite_request('old', -1)} END",
+    # Archiving inserts into the archive what it deletes from service_request,
+    # so the request statistics keep covering the whole history
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_archive_ai AFTER INSERT ON service_request_archive BEGIN "
+    f"{_sqlite_request('new', 1)} END",
+    "CREATE TRIGGER IF NOT EXISTS stats_service_request_archive_ad AFTER DELETE ON service_request_archive BEGIN "
+    f"{_sqlite_request('old', -1)} END",
+]
+
+POSTGRESQL_DDL = [
+    """CREATE OR REPLACE FUNCTION stats_trigger() RETURNS TRIGGER AS $$
+    DECLARE
+        delta INTEGER := CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END;
+    BEGIN
+        IF TG_TABLE_NAME IN ('company', 'region') THEN
+            INSERT INTO stat_counter (name, value) VALUES (TG_TABLE_NAME || 's', delta)
+            ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;
+        ELSIF TG_TABLE_NAME = 'company_region' THEN
+            INSERT INTO region_stats (region_id, company_count)
+            VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.region_id ELSE NEW.region_id END, delta)
+            ON CONFLICT (region_id) DO UPDATE SET company_count = region_stats.company_count + excluded.company_count;
+        ELSE
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO stat_counter (name, value) VALUES ('requests:' || COALESCE(OLD.status, 'pending'), -1)
+                ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;
+                INSERT INTO request_daily_stats (day, status, count)
+                VALUES (COALESCE(OLD.timestamp, now())::date, COALESCE(OLD.status, 'pending'), -1)
+                ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO stat_counter (name, value) VALUES ('requests:' || COALESCE(NEW.status, 'pending'), 1)
+                ON CONFLICT (name) DO UPDATE SET value = stat_counter.value + excluded.value;
+                INSERT INTO request_daily_stats (day, status, count)
+                VALUES (COALESCE(NEW.timestamp, now())::date, COALESCE(NEW.status, 'pending'), 1)
+                ON CONFLICT (day, status) DO UPDATE SET count = request_daily_stats.count + excluded.count;
+            END IF;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS stats_company ON company",
+    "CREATE TRIGGER stats_company AFTER INSERT OR DELETE ON company "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_region ON region",
+    "CREATE TRIGGER stats_region AFTER INSERT OR DELETE ON region "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_company_region ON company_region",
+    "CREATE TRIGGER stats_company_region AFTER INSERT OR DELETE ON company_region "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_service_request ON service_request",
+    "CREATE TRIGGER stats_service_request AFTER INSERT OR DELETE ON service_request "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_service_request_status ON service_request",
+    "CREATE TRIGGER stats_service_request_status AFTER UPDATE OF status ON service_request "
+    "FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) EXECUTE FUNCTION stats_trigger()",
+    "DROP TRIGGER IF EXISTS stats_service_request_archive ON service_request_archive",
+    "CREATE TRIGGER stats_service_request_archive AFTER INSERT OR DELETE ON service_request_archive "
+    "FOR EACH ROW EXECUTE FUNCTION stats_trigger()",
+]
+
+DDL = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRESQL_DDL}
+
+DAY_EXPRESSIONS = {'sqlite': 'date({column})', 'postgresql': 'CAST({column} AS DATE)'}
+
+
+# Live and archived requests; both count towards the statistics
+ALL_REQUESTS = ("(SELECT status, timestamp FROM service_request "
+                "UNION ALL SELECT status, timestamp FROM service_request_archive) AS requests")
+
+
+def rebuild_statements(dialect):
+    day = DAY_EXPRESSIONS.get(dialect, 'CAST({column} AS DATE)').format(column='timestamp')
+    return [
+        "DELETE FROM stat_counter",
+        "DELETE FROM region_stats",
+        "DELETE FROM request_daily_stats",
+        "INSERT INTO stat_counter (name, value) SELECT 'companies', COUNT(*) FROM company",
+        "INSERT INTO stat_counter (name, value) SELECT 'regions', COUNT(*) FROM region",
+        "INSERT INTO stat_counter (name, value) "
+        f"SELECT 'requests:' || COALESCE(status, 'pending'), COUNT(*) FROM {ALL_REQUESTS} "
+        "GROUP BY COALESCE(status, 'pending')",
+        "INSERT INTO region_stats (region_id, company_count) "
+        "SELECT region_id, COUNT(*) FROM company_region GROUP BY region_id",
+        "INSERT INTO request_daily_stats (day, status, count) "
+        f"SELECT {day}, COALESCE(status, 'pending'), COUNT(*) FROM {ALL_REQUESTS} "
+        f"GROUP BY {day}, COALESCE(status, 'pending')",
+    ]
+
+
+def rebuild_stats(connection):
+    for statement in rebuild_statements(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def install_stats_triggers(target, connection, **kw):
+    for statement in DDL.get(connection.dialect.name, []):
+        connection.execute(text(statement))
+    # First start on a database that predates the summary tables
+    if connection.execute(text('SELECT COUNT(*) FROM stat_counter')).scalar() == 0:
+        rebuild_stats(connection)
+
+
+# -----------------------------------
+# Dashboard reads
+# -----------------------------------
+def _period_start(day, trend):
+    return day - timedelta(days=day.weekday()) if trend == 'week' else day
+
+
+def request_trend(trend='day', periods=30):
+    """Requests created per day/week for the last ``periods`` buckets, oldest first."""
+    step = timedelta(weeks=1) if trend == 'week' else timedelta(days=1)
+    last = _period_start(date.today(), trend)
+    first = last - step * (periods - 1)
+
+    buckets = {}
+    current = first
+    while current <= last:
+        buckets[current] = {'period': current.isoformat(), 'total': 0, 'byStatus': {}}
+        current += step
+
+    rows = db.session.query(
+        RequestDailyStats.day, RequestDailyStats.status, RequestDailyStats.count
+    ).filter(RequestDailyStats.day >= first)
+    for day, status, count in rows:
+        bucket = buckets.get(_period_start(day, trend))
+        if bucket is None or not count:
+            continue
+        bucket['total'] += count
+        bucket['byStatus'][status] = bucket['byStatus'].get(status, 0) + count
+    return list(buckets.values())
+
+
+def dashboard_stats(trend='day', periods=30):
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value))
+    companies_per_region = db.session.query(
+        Region.name, RegionStats.company_count
+    ).join(
+        RegionStats, RegionStats.region_id == Region.id
+    ).filter(RegionStats.company_count > 0).order_by(Region.name)
+
+    requests_by_status = {
+        name.split(':', 1)[1]: value
+        for name, value in counters.items()
+        if name.startswith('requests:') and value
+    }
+    return {
+        'totalCompanies': counters.get('companies', 0),
+        'totalRegions': counters.get('regions', 0),
+        'companiesPerRegion': [
+            {'regionName': name, 'count': count} for name, count in companies_per_region
+        ],
+        'totalRequests': sum(requests_by_status.values()),
+        'requestsByStatus': requests_by_status,
+        'requestTrend': request_trend(trend, periods),
+    }
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Recompute the dashboard summary tables from the base tables."""
+    with db.engine.begin() as connection:
+        rebuild_stats(connection)
+    click.echo('Statistics rebuilt.')
@@ -0,0 +1,110 @@
+"""Synthetic dataset generator for benchmarks, scaled up from seed.py.
+
+Rows are written with chunked Core executemany inserts so that a million
+companies can be generated in minutes. Every user shares one precomputed
+password hash (SYNTHETIC_PASSWORD) because hashing per row would dominate.
+"""
+import random
+
+from sqlalchemy import text
+
+from extensions import db
+from models import User, Company, Region, ServiceRequest, company_region
+from passwords import hash_password, password_hasher
+from seed import REGION_NAMES, SAMPLE_COMPANIES
+
+SYNTHETIC_PASSWORD = 'benchpass'
+ADMIN_EMAIL = 'admin@ecowaste.com'
+SERVICES = [
+    'recycling', 'composting', 'e-waste collection', 'plastics recovery',
+    'scrap metal', 'medical waste disposal', 'zero-waste consulting', 'glass recycling'
+]
+STATUSES = ['pending', 'accepted', 'completed', 'cancelled']
+# Region centres are spread over this box (roughly Kenya); companies sit
+# near the centre of their first region
+BOUNDS = {'lat': (-4.7, 5.0), 'lon': (33.9, 41.9)}
+SERVICE_RADIUS_KM = (5, 50)
+
+
+def _insert_chunks(table, rows, chunk_size):
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(table.insert(), rows[start:start + chunk_size])
+
+
+def seed_synthetic(n_companies, n_regions=None, regions_per_company=(1, 3),
+                   requests_per_company=0, chunk_size=5000, random_seed=42):
+    """Populate an empty database; returns a dict of row counts.
+
+    Must be called inside an application context.
+    """
+    rng = random.Random(random_seed)
+    n_regions = n_regions or max(len(REGION_NAMES), min(500, n_companies // 200))
+    password = hash_password(SYNTHETIC_PASSWORD, password_hasher.method)
+
+    region_names = REGION_NAMES + [f'Zone {i}' for i in range(n_regions - len(REGION_NAMES))]
+    centres = {
+        i: (rng.uniform(*BOUNDS['lat']), rng.uniform(*BOUNDS['lon'])) for i in range(1, n_regions + 1)
+    }
+    _insert_chunks(Region.__table__, [
+        {'id': i, 'name': name, 'latitude': centres[i][0], 'longitude': centres[i][1]}
+        for i, name in enumerate(region_names[:n_regions], start=1)
+    ], chunk_size)
+    db.session.execute(User.__table__.insert(), {
+        'id': 1, 'email': ADMIN_EMAIL, 'password': password, 'role': 'admin'
+    })
+
+    counts = {'regions': n_regions, 'companies': 0, 'companyRegions': 0, 'serviceRequests': 0}
+    request_id = 1
+    for start in range(0, n_companies, chunk_size):
+        users, companies, links, requests = [], [], [], []
+        for i in range(start, min(start + chunk_size, n_companies)):
+            template = SAMPLE_COMPANIES[i % len(SAMPLE_COMPANIES)]
+            company_id, user_id = i + 1, i + 2
+            email = f'company{company_id}@example.com'
+            users.append({'id': user_id, 'email': email, 'password': password, 'role': 'company'})
+            k = min(n_regions, rng.randint(*regions_per_company))
+            region_ids = rng.sample(range(1, n_regions + 1), k)
+            latitude, longitude = centres[region_ids[0]]
+            companies.append({
+                'id': company_id,
+                'user_id': user_id,
+                'name': f"{template['name'].replace(' Ltd', '')} {company_id} Ltd",
+                'phone': template['phone'],
+                'email': email,
+                'description': f"{template['description']}, {rng.choice(SERVICES)}",
+                'latitude': latitude + rng.gauss(0, 0.2),
+                'longitude': longitude + rng.gauss(0, 0.2),
+                'service_radius_km': rng.uniform(*SERVICE_RADIUS_KM),
+            })
+            for region_id in region_ids:
+                links.append({'company_id': company_id, 'region_id': region_id})
+            for _ in range(requests_per_company):
+                requests.append({
+                    'id': request_id,
+                    'company_id': company_id,
+                    'description': f'Pickup: {rng.choice(SERVICES)}',
+                    'status': rng.choice(STATUSES),
+                })
+                request_id += 1
+
+        db.session.execute(User.__table__.insert(), users)
+        db.session.execute(Company.__table__.insert(), companies)
+        db.session.execute(company_region.insert(), links)
+        if requests:
+            db.session.execute(ServiceRequest.__table__.insert(), requests)
+        db.session.commit()
+        counts['companies'] += len(companies)
+        counts['companyRegions'] += len(links)
+        counts['serviceRequests'] += len(requests)
+
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        # Explicit ids don't advance the serial sequences
+        for table in ('region', 'user', 'company', 'service_request'):
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 1))"
+            ))
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return counts
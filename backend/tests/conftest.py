@@ -0,0 +1,107 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import jwt
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """App on a fresh in-memory SQLite database, with background work inline."""
+    for name, value in {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'AUTO_CREATE_TABLES': True,
+        'CACHE_ENABLED': False,
+        'AUTH_CACHE_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'DISPATCH_BACKEND': 'sync',
+        'PASSWORD_HASH_WORKERS': 0,
+        'SQLALCHEMY_REPLICA_URIS': [],
+    }.items():
+        monkeypatch.setattr(config.Config, name, value)
+
+    from app import create_app
+    from extensions import db
+
+    app = create_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_statements(app):
+    """Context manager collecting the SQL statements run inside it."""
+    from extensions import db
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith('PRAGMA'):
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+    return counter
+
+
+def auth_headers(app, user):
+    token = jwt.encode({'user_id': user.id}, app.config['SECRET_KEY'], algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+def add_companies(count, regions, start=0):
+    """Add ``count`` companies linked to two of ``regions`` each; returns them."""
+    from extensions import db
+    from models import User, Company
+
+    companies = []
+    for i in range(start, start + count):
+        user = User(email=f'company{i}@example.com', password='x', role='company')
+        db.session.add(user)
+        db.session.flush()
+        company = Company(
+            user_id=user.id, name=f'Company {i:05d}', phone='0700000000', email=f'company{i}@example.com',
+            description='recycling', regions=[regions[i % len(regions)], regions[(i + 1) % len(regions)]],
+        )
+        db.session.add(company)
+        companies.append(company)
+    db.session.commit()
+    return companies
+
+
+def add_regions(count, start=0):
+    from extensions import db
+    from models import Region
+
+    regions = [Region(name=f'Region {i}') for i in range(start, start + count)]
+    db.session.add_all(regions)
+    db.session.commit()
+    return regions
+
+
+def add_admin():
+    from extensions import db
+    from models import User
+
+    admin = User(email='admin@example.com', password='x', role='admin')
+    db.session.add(admin)
+    db.session.commit()
+    return admin
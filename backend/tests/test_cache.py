@@ -0,0 +1,33 @@
+from cache import cache, cached_response
+from conftest import add_regions
+
+
+def test_fill_raced_by_a_write_is_not_served_as_fresh(app, client):
+    app.config['CACHE_ENABLED'] = True
+    cache.backend.clear()
+    renders = []
+
+    @app.route('/test/raced')
+    @cached_response('regions')
+    def raced():
+        renders.append(len(renders))
+        if len(renders) == 1:
+            # A write commits while the first miss is still rendering
+            cache.invalidate('regions')
+        return {'render': len(renders)}
+
+    assert client.get('/test/raced').get_json() == {'render': 1}
+    assert client.get('/test/raced').get_json() == {'render': 2}
+    assert client.get('/test/raced').get_json() == {'render': 2}
+
+
+def test_region_write_invalidates_cached_catalog(app, client):
+    app.config['CACHE_ENABLED'] = True
+    cache.backend.clear()
+    region, = add_regions(1)
+    assert [r['name'] for r in client.get('/api/regions').get_json()] == ['Region 0']
+
+    region.name = 'Renamed'
+    from extensions import db
+    db.session.commit()
+    assert [r['name'] for r in client.get('/api/regions').get_json()] == ['Renamed']
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import add_admin, add_companies, add_regions, auth_headers
+
+LISTINGS = [
+    '/api/companies',
+    '/api/companies?region=1',
+    '/api/companies?limit=100',
+    '/api/companies?limit=100&sort=name',
+]
+
+
+def statements_for(client, count_statements, url, headers=None):
+    with count_statements() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', LISTINGS)
+def test_public_listing_queries_do_not_grow_with_companies(client, count_statements, url):
+    regions = add_regions(5)
+    add_companies(10, regions)
+    small = statements_for(client, count_statements, url)
+
+    add_companies(90, regions, start=10)
+    large = statements_for(client, count_statements, url)
+    assert large == small
+
+
+@pytest.mark.parametrize('url', ['/api/admin/companies', '/api/admin/companies?limit=100'])
+def test_admin_listing_queries_do_not_grow_with_companies(app, client, count_statements, url):
+    headers = auth_headers(app, add_admin())
+    regions = add_regions(5)
+    add_companies(10, regions)
+    small = statements_for(client, count_statements, url, headers)
+
+    add_companies(90, regions, start=10)
+    large = statements_for(client, count_statements, url, headers)
+    assert large == small
@@ -0,0 +1,90 @@
+import pytest
+
+from company_regions import UnknownRegions, check_region_ids, set_company_regions
+from conftest import add_admin, add_companies, add_regions, auth_headers
+from extensions import db
+from models import Company, Region, company_region
+
+# Current links, one executemany DELETE and one executemany INSERT
+WRITE_BUDGET = 3
+
+
+def links(company_id):
+    return {region_id for region_id, in db.session.query(company_region.c.region_id)
+            .filter(company_region.c.company_id == company_id)}
+
+
+@pytest.mark.parametrize('mode', ['replace', 'add'])
+def test_statement_count_does_not_grow_with_the_region_list(app, count_statements, mode):
+    regions = add_regions(450)
+    company, = add_companies(1, regions)
+    company_id, region_ids = company.id, [region.id for region in regions]
+    counts = []
+    # Disjoint from the current links, so replace both deletes and inserts
+    for wanted in (region_ids[-10:], region_ids[:400]):
+        with count_statements() as statements:
+            set_company_regions({company_id: wanted}, mode)
+        counts.append(len(statements))
+        assert set(wanted) <= links(company_id)
+    assert counts[0] == counts[1] <= WRITE_BUDGET
+
+
+def test_replace_writes_only_the_difference(app, count_statements):
+    regions = add_regions(5)
+    company, = add_companies(1, regions)
+    company_id, spare_id = company.id, regions[4].id
+    before = links(company_id)
+    with count_statements() as statements:
+        assert set_company_regions({company_id: sorted(before)}) == (0, 0)
+    assert [s for s in statements if s.lstrip().upper().startswith(('INSERT', 'DELETE'))] == []
+
+    target = sorted(before - {min(before)}) + [spare_id]
+    added, removed = set_company_regions({company_id: target})
+    assert links(company_id) == set(target)
+    assert (added, removed) == (len(set(target) - before), len(before - set(target)))
+
+
+def test_unknown_region_ids_are_listed(app):
+    add_regions(3)
+    with pytest.raises(UnknownRegions) as error:
+        check_region_ids([1, 999, 2, 777])
+    assert error.value.ids == [777, 999]
+
+
+def test_profile_reports_unknown_regions(app, client):
+    company, = add_companies(1, add_regions(3))
+    response = client.put('/api/companies/profile', json={'region_ids': [1, 999]},
+                          headers=auth_headers(app, company.user))
+    assert response.status_code == 400
+    assert response.get_json()['unknownRegionIds'] == [999]
+
+
+def test_admin_update_reports_unknown_regions(app, client):
+    company, = add_companies(1, add_regions(3))
+    response = client.put(f'/api/admin/companies/{company.id}', json={'region_ids': [2, 888]},
+                          headers=auth_headers(app, add_admin()))
+    assert response.status_code == 400
+    assert response.get_json()['unknownRegionIds'] == [888]
+
+
+def test_admin_bulk_assignment_reports_unknown_regions(app, client):
+    company, = add_companies(1, add_regions(3))
+    before = links(company.id)
+    response = client.put('/api/admin/companies/bulk/regions', json={'ids': [company.id], 'region_ids': [1, 555]},
+                          headers=auth_headers(app, add_admin()))
+    assert response.status_code == 400
+    assert response.get_json()['unknownRegionIds'] == [555]
+    assert links(company.id) == before
+
+
+def test_import_links_regions_by_name(app):
+    from importer import import_records
+
+    add_regions(2)
+    record = {'name': 'Imported', 'email': 'imported@example.com', 'phone': '1', 'description': 'd',
+              'password': 'secret', 'regions': ['Region 0', 'Region 0', 'Unknown']}
+    totals = import_records([record], workers=1, create_regions=False)
+    assert totals['inserted'] == 1
+    company = Company.query.filter_by(email='imported@example.com').one()
+    assert [region.name for region in company.regions] == ['Region 0']
+    assert Region.query.filter_by(name='Unknown').count() == 0
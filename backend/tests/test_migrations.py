@@ -0,0 +1,94 @@
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAD = '0008'
+SHIPPED = os.path.join(BACKEND, 'instance', 'ecowaste.db')
+
+
+def flask(database, *args, **env):
+    """Run the flask CLI against ``database`` with otherwise default settings."""
+    environ = {name: value for name, value in os.environ.items()
+               if name not in ('AUTO_CREATE_TABLES', 'DATABASE_URL', 'DATABASE_REPLICA_URLS')}
+    environ.update(env, DATABASE_URL=f'sqlite:///{database}', SQLALCHEMY_SILENCE_UBER_WARNING='1')
+    result = subprocess.run([sys.executable, '-m', 'flask', *args], cwd=BACKEND, env=environ,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+@pytest.fixture
+def shipped(tmp_path):
+    """Copy of the bundled database, which predates the migrations."""
+    database = tmp_path / 'ecowaste.db'
+    shutil.copy(SHIPPED, database)
+    return database
+
+
+def count(database, table):
+    return sqlite3.connect(database).execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+
+def revision(database):
+    return sqlite3.connect(database).execute('SELECT version_num FROM alembic_version').fetchone()[0]
+
+
+@pytest.mark.parametrize('env', [{}, {'AUTO_CREATE_TABLES': '1'}])
+def test_upgrade_builds_a_new_database(tmp_path, env):
+    database = tmp_path / 'new.db'
+    flask(database, 'db', 'upgrade', **env)
+    assert revision(database) == HEAD
+
+
+def test_upgrade_adopts_the_bundled_database(shipped):
+    rows = {table: count(shipped, table) for table in ('user', 'company', 'region', 'company_region')}
+    flask(shipped, 'db', 'upgrade')
+    assert revision(shipped) == HEAD
+    assert {table: count(shipped, table) for table in rows} == rows
+
+
+def test_create_all_skips_geo_ddl_on_an_existing_company_table(tmp_path):
+    database = tmp_path / 'old.db'
+    connection = sqlite3.connect(database)
+    connection.executescript(
+        'CREATE TABLE user (id INTEGER PRIMARY KEY, email VARCHAR(120) NOT NULL UNIQUE, '
+        'password VARCHAR(200) NOT NULL, role VARCHAR(20) NOT NULL);'
+        'CREATE TABLE company (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), '
+        'name VARCHAR(100) NOT NULL, phone VARCHAR(20) NOT NULL, email VARCHAR(120) NOT NULL, '
+        'description TEXT NOT NULL);'
+    )
+    connection.close()
+    # Loading the app runs create_all; the company table has no location columns yet
+    flask(database, 'routes', AUTO_CREATE_TABLES='1')
+    names = {name for name, in sqlite3.connect(database).execute('SELECT name FROM sqlite_master')}
+    assert 'company_location' not in names and 'company_geo_company_ai' not in names
+
+
+def serve(monkeypatch, database):
+    import config
+    from app import create_app
+
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{database}')
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_REPLICA_URIS', [])
+    monkeypatch.setattr(config.Config, 'DISPATCH_BACKEND', 'sync')
+    return create_app().test_client()
+
+
+def test_upgraded_bundled_database_serves_the_company_listing(shipped, monkeypatch, caplog):
+    flask(shipped, 'db', 'upgrade')
+    client = serve(monkeypatch, shipped)
+    response = client.get('/api/companies')
+    assert response.status_code == 200
+    assert len(response.get_json()) == count(shipped, 'company')
+    assert 'flask db upgrade' not in caplog.text
+
+
+def test_serving_an_outdated_database_warns(shipped, monkeypatch, caplog):
+    client = serve(monkeypatch, shipped)
+    client.get('/api/regions')
+    assert 'Database schema is at revision none, the latest is 0008' in caplog.text
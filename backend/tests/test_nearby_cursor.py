@@ -0,0 +1,37 @@
+import pytest
+
+from conftest import add_companies, add_regions
+from extensions import db
+
+NAIROBI = {'lat': -1.29, 'lon': 36.82}
+
+
+def nearby(client, **params):
+    return client.get('/api/companies/nearby', query_string=params)
+
+
+@pytest.fixture
+def located(app):
+    for i, company in enumerate(add_companies(25, add_regions(3))):
+        company.latitude, company.longitude = -1.29 + i * 0.01, 36.82
+        company.service_radius_km = 50
+    db.session.commit()
+
+
+@pytest.mark.parametrize('serving', ['false', 'true'])
+def test_cursor_pages_through_the_same_lookup(client, located, serving):
+    first = nearby(client, limit=10, serving=serving, **NAIROBI).get_json()
+    second = nearby(client, limit=10, serving=serving, cursor=first['nextCursor'], **NAIROBI)
+    assert second.status_code == 200
+    ids = [c['id'] for c in first['items']] + [c['id'] for c in second.get_json()['items']]
+    assert len(ids) == len(set(ids)) == 20
+
+
+@pytest.mark.parametrize('change', [
+    {'lat': -1.3}, {'lon': 36.9}, {'serving': 'true'}, {'radius_km': 100}, {'region': 1},
+])
+def test_cursor_replayed_with_another_lookup_is_rejected(client, located, change):
+    cursor = nearby(client, limit=10, **NAIROBI).get_json()['nextCursor']
+    response = nearby(client, limit=10, cursor=cursor, **{**NAIROBI, **change})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Cursor does not match the location query'
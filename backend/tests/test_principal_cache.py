@@ -0,0 +1,84 @@
+import jwt
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Query
+
+from cache import cache
+from conftest import add_admin, auth_headers
+from extensions import db
+from principal_cache import REJECTED, principal_cache
+
+STATS = '/api/admin/auth-cache'
+
+
+@pytest.fixture
+def cached_auth(app):
+    app.config['AUTH_CACHE_ENABLED'] = True
+    principal_cache.init_app(app)
+    cache.backend.clear()
+    yield
+    principal_cache.enabled = False
+
+
+def test_demotion_takes_effect_at_commit(app, client, cached_auth):
+    admin = add_admin()
+    headers = auth_headers(app, admin)
+    assert client.get(STATS, headers=headers).status_code == 200
+
+    admin.role = 'company'
+    db.session.flush()
+    # Flushed but not committed: nothing is invalidated yet
+    assert principal_cache.version(admin.id) == 0
+    db.session.commit()
+    assert principal_cache.version(admin.id) == 1
+    assert client.get(STATS, headers=headers).status_code == 403
+
+
+def test_rolled_back_update_does_not_invalidate(app, client, cached_auth):
+    admin = add_admin()
+    admin.role = 'company'
+    db.session.flush()
+    db.session.rollback()
+    assert principal_cache.version(admin.id) == 0
+
+
+def test_load_racing_a_commit_is_not_served(app, client, cached_auth):
+    admin = add_admin()
+    headers = auth_headers(app, admin)
+    token = headers['Authorization'].split()[1]
+
+    # A request read the version, then loaded the row just before a commit
+    version = principal_cache.version(admin.id)
+    principal_cache.store(token, admin, version)
+    admin.role = 'company'
+    db.session.commit()
+
+    assert principal_cache.lookup(token) is None
+    assert client.get(STATS, headers=headers).status_code == 403
+
+
+def test_versions_live_in_the_shared_backend(app, cached_auth):
+    admin = add_admin()
+    admin.role = 'company'
+    db.session.commit()
+    assert cache.backend.get_counter(f'principal:{admin.id}') == 1
+
+
+def test_database_error_does_not_reject_a_valid_token(app, client, cached_auth, monkeypatch):
+    headers = auth_headers(app, add_admin())
+
+    def unavailable(query, ident):
+        raise OperationalError('SELECT', {}, Exception('database is locked'))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Query, 'get', unavailable)
+        assert client.get(STATS, headers=headers).status_code == 500
+    assert client.get(STATS, headers=headers).status_code == 200
+
+
+def test_invalid_tokens_are_cached_as_rejected(app, client, cached_auth):
+    forged = jwt.encode({'user_id': 1}, 'not-the-secret', algorithm='HS256')
+    unknown = jwt.encode({'user_id': 999}, app.config['SECRET_KEY'], algorithm='HS256')
+    for token in (forged, unknown):
+        assert client.get(STATS, headers={'Authorization': f'Bearer {token}'}).status_code == 401
+        assert principal_cache.lookup(token) == REJECTED
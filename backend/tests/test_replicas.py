@@ -0,0 +1,138 @@
+import pytest
+from sqlalchemy import event
+
+import config
+from cache import cache
+from conftest import add_companies, add_regions, auth_headers
+from extensions import db
+from models import Region
+from replicas import db_router
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """Patches the config for an SQLite primary and one replica file; returns a factory for the app."""
+    replica = tmp_path / 'replica.db'
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_REPLICA_URIS', [f'sqlite:///file:{replica}?mode=ro&uri=true'])
+    monkeypatch.setattr(config.Config, 'DB_REPLICA_CHECK_INTERVAL', 0)
+    for name, value in {
+        'AUTO_CREATE_TABLES': True,
+        'CACHE_ENABLED': False,
+        'AUTH_CACHE_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        'DISPATCH_BACKEND': 'sync',
+        'PASSWORD_HASH_WORKERS': 0,
+    }.items():
+        monkeypatch.setattr(config.Config, name, value)
+
+    def make_app():
+        from app import create_app
+
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        return app
+
+    yield make_app
+    if db_router._monitor is not None:
+        db_router._monitor.stop()
+    for engine in db_router.engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def seeded(replicated):
+    app = replicated()
+    with app.app_context():
+        company, = add_companies(1, add_regions(3))
+        headers = auth_headers(app, company.user)
+    assert app.test_cli_runner().invoke(args=['sync-replicas']).exit_code == 0
+    return app, headers
+
+
+@pytest.fixture
+def reads():
+    """Context-free counter of statements per engine: 'primary' or 'replica'."""
+    counts = {}
+
+    def listen(engine, name):
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *args: counts.__setitem__(name, counts.get(name, 0) + 1))
+
+    def attach(app):
+        with app.app_context():
+            listen(db.engine, 'primary')
+        for engine in db_router.engines:
+            listen(engine, 'replica')
+        return counts
+
+    return attach
+
+
+def test_anonymous_submission_does_not_pin_other_anonymous_clients(seeded, reads):
+    app, _ = seeded
+    counts = reads(app)
+    response = app.test_client().post('/api/service-requests', json={
+        'description': 'Skip pickup', 'region_id': 1, 'contact_email': 'a@example.com'})
+    assert response.status_code == 202
+    assert db_router.cookie in response.headers.get('Set-Cookie', '')
+
+    counts.clear()
+    assert app.test_client().get('/api/regions').status_code == 200
+    assert counts.get('replica') and not counts.get('primary')
+
+
+def test_authenticated_writer_stays_on_the_primary_without_the_cookie(seeded, reads):
+    app, headers = seeded
+    counts = reads(app)
+    assert app.test_client().put('/api/companies/profile', json={'name': 'Renamed'},
+                                 headers=headers).status_code == 200
+
+    counts.clear()
+    response = app.test_client().get('/api/companies/profile', headers=headers)
+    assert response.get_json()['name'] == 'Renamed'
+    assert counts.get('primary') and not counts.get('replica')
+
+
+def test_cached_response_misses_fill_from_the_primary(seeded, reads):
+    app, _ = seeded
+    app.config['CACHE_ENABLED'] = True
+    cache.backend.clear()
+    with app.app_context():
+        # Committed on the primary only: the replica lags behind
+        Region.query.get(1).name = 'Renamed'
+        db.session.commit()
+
+    counts = reads(app)
+    names = [region['name'] for region in app.test_client().get('/api/regions').get_json()]
+    assert 'Renamed' in names
+    assert counts.get('primary') and not counts.get('replica')
+
+    counts.clear()
+    assert app.test_client().get('/api/regions').status_code == 200
+    assert not counts
+
+
+def test_health_monitor_starts_in_each_serving_process(replicated, monkeypatch):
+    monkeypatch.setattr(config.Config, 'DB_REPLICA_CHECK_INTERVAL', 60)
+    app = replicated()
+    assert db_router._monitor is None
+
+    app.test_client().get('/api/regions')
+    monitor = db_router._monitor
+    assert monitor is not None and monitor._thread.is_alive()
+    app.test_client().get('/api/regions')
+    assert db_router._monitor is monitor
+
+    # A worker forked after create_app inherits the router but not the thread
+    db_router._monitor_pid = -1
+    app.test_client().get('/api/regions')
+    assert db_router._monitor is not monitor and db_router._monitor._thread.is_alive()
+    monitor.stop()
+
+
+def test_sticky_cookie_hook_is_registered_once(replicated):
+    app = replicated()
+    db_router.init_app(app)
+    assert app.after_request_funcs[None].count(db_router._remember_write) == 1
@@ -0,0 +1,22 @@
+from conftest import add_companies, add_regions
+
+
+def search(client, **params):
+    return client.get('/api/companies/search', query_string=params)
+
+
+def test_cursor_pages_through_the_same_query(client):
+    add_companies(25, add_regions(3))
+    first = search(client, q='recycling', limit=10).get_json()
+    second = search(client, q='recycling', limit=10, cursor=first['nextCursor'])
+    assert second.status_code == 200
+    ids = [c['id'] for c in first['items']] + [c['id'] for c in second.get_json()['items']]
+    assert len(ids) == len(set(ids)) == 20
+
+
+def test_cursor_replayed_with_another_query_is_rejected(client):
+    add_companies(25, add_regions(3))
+    cursor = search(client, q='recycling', limit=10).get_json()['nextCursor']
+    response = search(client, q='region', limit=10, cursor=cursor)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Cursor does not match the search query'